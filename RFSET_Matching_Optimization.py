@@ -5,9 +5,78 @@ Created on Wed Nov 27 14:32:11 2019
 @author: feynman
 """
 
+import copy
 import numpy as np
-from scipy.optimize import minimize_scalar
-import matplotlib.pylab as plt
+from instrumentation import instrumentation
+from junction_models import getModel
+from results import Design, DesignBatch, RECORD_INPUTS, RECORD_QUANTITIES
+
+# Derived quantities computed by the classes, in the order they are evaluated
+QUANTITIES = ('Z1', 'Ic', 'LJ', 'L', 'fp', 'fn', 'th_Zres', 'Zres', 'th_Q', 'Q')
+
+GOODNESS_THRESHOLD = 0.035 # Matching is successful when |Zres - th_Zres|/th_Zres < 0.035 %
+
+# Quantities and design parameters of the analytic jacobian
+JACOBIAN_QUANTITIES = ('fp', 'fn', 'Zres', 'Q')
+JACOBIAN_PARAMETERS = ('A', 'a', 'l', 'C', 'flux_quanta')
+
+_DOWNSTREAM = {} # (class, name) -> quantities to invalidate when name changes
+
+class _Parameter:
+    '''
+    Input parameter of the model. Setting it drops from the instance every
+    cached quantity that depends on it, directly or not.
+    The optional convert function is applied to the values being set.
+    The value is kept in the instance __dict__ and the descriptor has no
+    __get__, so reading a parameter is a plain attribute lookup.
+    '''
+
+    def __init__(self, convert=None):
+        self.convert = convert
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __set__(self, obj, value):
+        if self.convert is not None:
+            value = self.convert(value)
+        obj.__dict__[self.name] = value
+        for q in type(obj)._downstream(self.name):
+            obj.__dict__.pop(q, None)
+
+class _Quantity:
+    '''
+    Derived quantity, computed on first access by calling the method of the
+    instance named "method" with the parameters in "args", then cached.
+    "uses" lists the parameters and quantities the method reads from the
+    instance: together with "args" they are the dependencies of the quantity.
+    The value is cached in the instance __dict__: the descriptor has no
+    __set__, so once computed the quantity is read as a plain attribute and
+    __get__ only runs on a cache miss.
+    '''
+
+    def __init__(self, method, args=(), uses=()):
+        self.method = method
+        self.args = args
+        self.dependencies = args + uses
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        inputs, args = obj.__dict__, self.args
+        method = getattr(obj, self.method)
+        # positional calls for the usual arities, method(*args) costs several times more
+        if len(args) == 1:
+            value = method(inputs[args[0]])
+        elif len(args) == 2:
+            value = method(inputs[args[0]], inputs[args[1]])
+        else:
+            value = method(*[inputs[arg] for arg in args])
+        inputs[self.name] = value
+        return value
 
 class SQUID_ImpedanceMatching:
     '''
@@ -16,22 +85,502 @@ class SQUID_ImpedanceMatching:
     C. Altimiras, O. Parlavecchio, P. Joyez, D. Vion, P. Roche, D. Esteve
     and F. Portier, "Tunable microwave impedance matching to a high impedance
     source using a Josephson metamaterial", Appl. Phys. Lett, 103, 212601 (2013)
+
+    The derived quantities are cached; setting one of the parameters (e.g.
+    tuner.flux_quanta = x) only invalidates the quantities downstream of it,
+    following the dependency graph
+    flux_quanta, A -> Ic -> LJ -> L -> fn, Zres -> Q
+    and they are recomputed when next read. With a scalar junction area the
+    quantities are all computed on construction, as a single design is always
+    read whole; with an array of areas they are computed lazily.
+
+    The junction physics is taken from the registry of junction_models: the
+    class uses junction_model unless a model is passed to the constructor.
     '''
+
+    junction_model = 'INRIM' # Junction model used by default
+
+    ZL = _Parameter()          # Load impedance in ohm
+    l = _Parameter()           # SQUID array length in m
+    a = _Parameter()           # Distance between neighbouring SQUIDs in m
+    RN = _Parameter()          # SQUIDs 15 mK tunnel resistance in ohm
+    Delta = _Parameter()       # Superconducting gap in eV
+    CJ = _Parameter()          # SQUID capacitance in F/um^2
+    A = _Parameter()           # Single Junctin area in um^2
+    C = _Parameter()           # SQUID array lineic capacitance in pF/m
+    Z0 = _Parameter()          # Characteristic impedance in ohm
+    n = _Parameter()           # Number of resonance frequency
+    flux_quanta = _Parameter() # Cosine argument in the Ic equation
+    temperature = _Parameter() # Temperature in K
+    model = _Parameter(getModel) # Junction model, name or JunctionModel
+
+    Z1 = _Quantity('_cpwImpedance', args=('ZL',), uses=('Z0',))
+    Ic = _Quantity('_criticalCurrent', args=('A',), uses=('flux_quanta', 'temperature', 'model'))
+    LJ = _Quantity('_SQUID_Inductance', uses=('Ic',))
+    L = _Quantity('_SQUID_LineicInductance', args=('a',), uses=('LJ',)) #- 30e-6
+    fp = _Quantity('_JosephsonPlasmaFreq', args=('CJ', 'A'), uses=('LJ',))
+    fn = _Quantity('_resonanceFreq', args=('C', 'l'), uses=('L',))
+    th_Zres = _Quantity('_teoreticalZres', uses=('Z1',))
+    Zres = _Quantity('_actualZres', args=('C',), uses=('L',))
+    th_Q = _Quantity('_teoreticalQ', uses=('Z1', 'Z0'))
+    Q = _Quantity('_actualQ', uses=('Zres', 'Z0'))
     
-    def __init__(self, ZL, l, a, RN, Delta, CJ, A, C, Z0=50., n=1, flux_quanta=0):
-        self.Z0 = Z0 # Characteristic impedance, default 50 ohm
-        self.flux_quanta = flux_quanta # Number of flux quanta (default = 0)
-        self.Z1 = self._cpwImpedance(ZL)
-        self.Ic = self._criticalCurrent(A)
-        self.LJ = self._SQUID_Inductance()
-        self.L = self._SQUID_LineicInductance(a) #- 30e-6
-        self.fp = self._JosephsonPlasmaFreq(CJ, A)
-        self.fn = self._resonanceFreq(C, l)
-        self.th_Zres = self._teoreticalZres()
-        self.Zres = self._actualZres(C)
-        self.th_Q = self._teoreticalQ()
-        self.Q = self._actualQ()
+    def __init__(self, ZL, l, a, RN, Delta, CJ, A, C, Z0=50., n=1, flux_quanta=0, model=None, temperature=0):
+        # Nothing is cached yet, so the parameters are stored without going
+        # through _Parameter.__set__ and its invalidation
+        d = self.__dict__
+        d['model'] = getModel(model if model is not None else self.junction_model)
+        d['Z0'] = Z0                   # Characteristic impedance, default 50 ohm
+        d['flux_quanta'] = flux_quanta # Number of flux quanta (default = 0)
+        d['temperature'] = temperature # Temperature in K (default = 0)
+        d['ZL'] = ZL
+        d['l'] = l
+        d['a'] = a
+        d['RN'] = RN
+        d['Delta'] = Delta
+        d['CJ'] = CJ
+        d['A'] = A
+        d['C'] = C
+        d['n'] = n
+        # A single junction area is a single design, or a pitch sweep read
+        # whole: every quantity is computed here, in the order of the
+        # dependency graph, for far less than a descriptor miss each. Arrays
+        # of areas, as fromDesign passes, are left lazy
+        if not isinstance(A, np.ndarray):
+            d['Z1'] = self._cpwImpedance(ZL)
+            d['Ic'] = self._criticalCurrent(A)
+            d['LJ'] = self._SQUID_Inductance()
+            d['L'] = self._SQUID_LineicInductance(a)
+            d['fp'] = self._JosephsonPlasmaFreq(CJ, A)
+            d['fn'] = self._resonanceFreq(C, l)
+            d['th_Zres'] = self._teoreticalZres()
+            d['Zres'] = self._actualZres(C)
+            d['th_Q'] = self._teoreticalQ()
+            d['Q'] = self._actualQ()
+
+    def __setattr__(self, name, value):
+        if isinstance(getattr(type(self), name, None), _Quantity):
+            raise AttributeError("%s is a derived quantity, set its dependencies %s instead"
+                                 % (name, getattr(type(self), name).dependencies))
+        object.__setattr__(self, name, value)
+
+    @classmethod
+    def dependencyGraph(cls):
+        '''
+        Direct dependencies of every derived quantity of the class
+        --------------------------------
+        Parameters:
+        None
+        --------------------------------
+        Returns:
+        graph : dict quantity name -> tuple of parameter and quantity names
+        '''
+        graph = {}
+        for klass in reversed(cls.__mro__):
+            for name, attr in vars(klass).items():
+                if isinstance(attr, _Quantity):
+                    graph[name] = attr.dependencies
+        return graph
+
+    @classmethod
+    def _downstream(cls, name):
+        '''
+        Quantities depending, directly or not, on the parameter or quantity name
+        --------------------------------
+        Parameters:
+        name : str Parameter or quantity name
+        --------------------------------
+        Returns:
+        downstream : tuple of quantity names
+        '''
+        key = (cls, name)
+        if key not in _DOWNSTREAM:
+            graph = cls.dependencyGraph()
+            downstream = []
+            stack = [name]
+            while stack:
+                dep = stack.pop()
+                for q, deps in graph.items():
+                    if dep in deps and q not in downstream:
+                        downstream.append(q)
+                        stack.append(q)
+            _DOWNSTREAM[key] = tuple(downstream)
+        return _DOWNSTREAM[key]
+
+    @classmethod
+    def batch(cls, ZL, l, a, CJ, A, C, Z0=50., flux_quanta=0, model=None, temperature=0):
+        '''
+        Evaluates the model on whole arrays of design points in one call.
+        All the parameters can be scalars or numpy arrays, they are broadcast
+        against each other and every derived quantity is returned as an array
+        with the broadcast shape. The calculation is done by a single instance
+        of the class, so the junction model of child classes is used.
+        Normal resistance and superconducting gap are not needed by the model:
+        the gap of the electrodes is a property of the junction model.
+        --------------------------------
+        Parameters:
+        ZL          : float or array Load impedance in ohm
+        l           : float or array SQUID array length in m
+        a           : float or array Distance between neighbouring SQUIDs in m
+        CJ          : float or array SQUID capacitance in F/um^2
+        A           : float or array Single Junctin area in um^2
+        C           : float or array SQUID array lineic capacitance in pF/m
+        Z0          : float Characteristic impedance, default 50 ohm
+        flux_quanta : float or array Cosine argument in the Ic equation
+        model       : str or JunctionModel, default junction_model of the class
+        temperature : float or array Temperature in K
+        --------------------------------
+        Returns:
+        res : dict of arrays, one for each name in QUANTITIES
+        '''
+        ZL, l, a, CJ, A, C, flux_quanta, temperature = np.broadcast_arrays(
+            *[np.asarray(x, dtype=float) for x in (ZL, l, a, CJ, A, C, flux_quanta, temperature)])
+        # Ic = 0 at half-integer flux or above Tc gives LJ = inf, fn = fp = 0 and Zres = inf
+        with np.errstate(divide='ignore'):
+            tuner = cls(ZL, l, a, None, None, CJ, A, C, Z0=Z0, flux_quanta=flux_quanta, model=model,
+                        temperature=temperature)
+            return {q: getattr(tuner, q) for q in QUANTITIES}
+
+    @classmethod
+    def batchModels(cls, models, ZL, l, a, A, C, Z0=50., flux_quanta=0, CJ=None, temperature=0):
+        '''
+        Evaluates the same design points with several junction models side
+        by side, e.g. different oxidations. The results of every model are
+        stacked along a new first axis.
+        --------------------------------
+        Parameters:
+        models      : list of str or JunctionModel
+        ZL, l, a, A, C, Z0, flux_quanta, temperature : as in batch
+        CJ          : float or array SQUID capacitance in F/um^2, default the
+                      capacitance of each model
+        --------------------------------
+        Returns:
+        res : dict of arrays with shape (len(models),) + broadcast shape
+        '''
+        res = []
+        for model in models:
+            model = getModel(model)
+            res.append(cls.batch(ZL, l, a, model.cj if CJ is None else CJ, A, C, Z0=Z0,
+                                 flux_quanta=flux_quanta, model=model, temperature=temperature))
+        return {q: np.stack([r[q] for r in res]) for q in QUANTITIES}
+
+    @classmethod
+    def matchedArea(cls, ZL, a, C, CJ=0., Z0=50., flux_quanta=0, bounds=(0.0025, 5), xatol=1e-10, maxiter=500,
+                    model=None, temperature=0):
+        '''
+        Finds the junction area that makes Zres equal to th_Zres for whole
+        arrays of design points. Zres does not depend on the array length,
+        so the number of SQUIDs is not needed.
+        If the junction model is invertible and the class provides
+        _junctionArea, the inverse of its _criticalCurrent, the area is found
+        analytically; otherwise the matching condition is solved as a
+        vectorized bisection of Zres - th_Zres inside bounds.
+        --------------------------------
+        Parameters:
+        ZL          : float or array Load impedance in ohm
+        a           : float or array Distance between neighbouring SQUIDs in m
+        C           : float or array SQUID array lineic capacitance in pF/m
+        CJ          : float or array SQUID capacitance in F/um^2
+        Z0          : float Characteristic impedance, default 50 ohm
+        flux_quanta : float or array Cosine argument in the Ic equation
+        bounds      : tuple Junction area bracket in um^2
+        xatol       : float Absolute tolerance on the junction area in um^2
+        maxiter     : int Maximum number of bisection steps
+        model       : str or JunctionModel, default junction_model of the class
+        temperature : float or array Temperature in K
+        --------------------------------
+        Returns:
+        res : dict of arrays with the junction area 'A' in um^2, the 'residual'
+              Zres - th_Zres in ohm, the matching 'goodness' in % and 'success'
+        '''
+        lo, hi = bounds
+        model = getModel(model if model is not None else cls.junction_model)
+        analytic = cls._hasAnalyticArea() and model.invertible
+        def residual(A):
+            res = cls.batch(ZL, 1., a, CJ, A, C, Z0=Z0, flux_quanta=flux_quanta, model=model,
+                            temperature=temperature)
+            return res['Zres'] - res['th_Zres']
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if analytic:
+                # Zres scales as Ic^(-1/2): rescale Ic of a reference area to hit th_Zres
+                ZL, a, CJ, C, flux_quanta, temperature = np.broadcast_arrays(
+                    *[np.asarray(x, dtype=float) for x in (ZL, a, CJ, C, flux_quanta, temperature)])
+                tuner = cls(ZL, 1., a, None, None, CJ, 1., C, Z0=Z0, flux_quanta=flux_quanta, model=model,
+                            temperature=temperature)
+                A = tuner._junctionArea(tuner.Ic*(tuner.Zres/tuner.th_Zres)**2)
+                A = np.clip(np.nan_to_num(A, nan=hi, posinf=hi), lo, hi)
+            else:
+                A = _bracketedRoot(residual, lo, hi, xatol, maxiter)
+            res = cls.batch(ZL, 1., a, CJ, A, C, Z0=Z0, flux_quanta=flux_quanta, model=model, temperature=temperature)
+            delta = res['Zres'] - res['th_Zres']
+            goodness = abs(delta)/res['th_Zres']*100
+        if instrumentation.enabled:
+            instrumentation.count('matchedArea')
+            instrumentation.event('matchedArea', model=model.name, points=int(goodness.size),
+                                  method='analytic' if analytic else 'bisection',
+                                  max_goodness=float(np.max(goodness, initial=0.)),
+                                  failures=int(np.count_nonzero(~(goodness < GOODNESS_THRESHOLD))))
+        return {'A': np.broadcast_to(A, delta.shape), 'residual': delta,
+                'goodness': goodness, 'success': goodness < GOODNESS_THRESHOLD}
+
+    @classmethod
+    def continuedArea(cls, ZL, a, C, CJ=0., Z0=50., flux_quanta=0, axis=0, bounds=(0.0025, 5),
+                      tolerance=GOODNESS_THRESHOLD, maxiter=20, model=None, temperature=0):
+        '''
+        Solves the matching condition by continuation along one axis of a
+        sweep, e.g. the distance between neighbouring SQUIDs: every point is
+        seeded with the solution of the previous one, extrapolated from the
+        last two, and refined by secant steps on log(Zres/th_Zres) vs log(A),
+        which is a straight line for linear critical current laws. A point is
+        done as soon as its goodness is below tolerance; points that do not
+        converge in maxiter steps are solved by bisection over the full bounds.
+        The other axes of the sweep are solved together at every step.
+        --------------------------------
+        Parameters:
+        ZL, a, C, CJ, Z0, flux_quanta, model, temperature : as in matchedArea
+        axis      : int Continuation axis of the broadcast design points
+        bounds    : tuple Junction area bracket in um^2
+        tolerance : float Goodness in % at which a point is accepted
+        maxiter   : int Maximum number of secant steps per point
+        --------------------------------
+        Returns:
+        res : dict of arrays as matchedArea, plus the number of model
+              'evaluations' spent on every point
+        '''
+        lo, hi = bounds
+        model = getModel(model if model is not None else cls.junction_model)
+        ZL, a, CJ, C, flux_quanta, temperature = (np.moveaxis(x, axis, 0) for x in np.broadcast_arrays(
+            *[np.asarray(x, dtype=float) for x in (ZL, a, CJ, C, flux_quanta, temperature)]))
+        shape = ZL.shape
+        # Continuation axis first, all the other ones flattened
+        ZL, a, CJ, C, flux_quanta, temperature = (x.reshape(len(x), -1)
+                                                  for x in (ZL, a, CJ, C, flux_quanta, temperature))
+        A = np.empty(ZL.shape)
+        evaluations = np.zeros(ZL.shape, dtype=np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for k in range(len(ZL)):
+                def mismatch(x, sel):
+                    res = cls.batch(ZL[k][sel], 1., a[k][sel], CJ[k][sel], x, C[k][sel], Z0=Z0,
+                                    flux_quanta=flux_quanta[k][sel], model=model, temperature=temperature[k][sel])
+                    return np.log(res['Zres']/res['th_Zres'])
+                if k == 0:
+                    seed, step = np.full(ZL[k].shape, np.sqrt(lo*hi)), 1.
+                elif k == 1:
+                    seed, step = A[0], 1e-2
+                else:
+                    seed, step = A[k-1]**2/A[k-2], np.maximum(abs(np.log(A[k-1]/A[k-2])), 1e-6)
+                A[k], evaluations[k] = _seededRoot(mismatch, seed, step, lo, hi, tolerance, maxiter)
+            res = cls.batch(ZL, 1., a, CJ, A, C, Z0=Z0, flux_quanta=flux_quanta, model=model, temperature=temperature)
+            delta = res['Zres'] - res['th_Zres']
+            goodness = abs(delta)/res['th_Zres']*100
+        if instrumentation.enabled:
+            instrumentation.count('continuation evaluations', int(evaluations.sum()))
+            instrumentation.event('continuedArea', model=model.name, points=int(goodness.size),
+                                  evaluations=int(evaluations.sum()),
+                                  failures=int(np.count_nonzero(~(goodness < GOODNESS_THRESHOLD))))
+        moved = lambda x: np.moveaxis(x.reshape(shape), 0, axis)
+        return {'A': moved(A), 'residual': moved(delta), 'goodness': moved(goodness),
+                'success': moved(goodness < GOODNESS_THRESHOLD), 'evaluations': moved(evaluations)}
+
+    @classmethod
+    def _hasAnalyticArea(cls):
+        '''
+        Tells whether the class defining the critical current also defines its
+        inverse _junctionArea, so that the matched area has a closed form
+        --------------------------------
+        Parameters:
+        None
+        --------------------------------
+        Returns:
+        analytic : bool
+        '''
+        for klass in cls.__mro__:
+            if '_criticalCurrent' in vars(klass):
+                return '_junctionArea' in vars(klass)
+        return False
     
+    def tuningCurve(self, flux_quanta, floor=1e-12):
+        '''
+        Calculates the flux dependent quantities of the design on an
+        arbitrarily dense flux grid. Everything is computed once at zero flux
+        and rescaled by the critical current modulation m = Ic(flux)/Ic(0):
+        Ic and 1/LJ scale as m, fp and fn as m^(1/2), Zres and Q as m^(-1/2).
+        Near half-integer flux the modulation is clipped to floor, so that
+        Ic -> 0 gives very large but finite Zres and Q instead of inf or NaN.
+        If the design parameters are arrays, the flux grid is added as
+        trailing dimensions of the results.
+        --------------------------------
+        Parameters:
+        flux_quanta : float or array Cosine argument in the Ic equation
+        floor       : float Smallest critical current modulation
+        --------------------------------
+        Returns:
+        res : dict of arrays 'flux_quanta', 'Ic', 'LJ', 'L', 'fp', 'fn', 'Zres', 'Q'
+        '''
+        flux_quanta = np.asarray(flux_quanta, dtype=float)
+        ref = self._copy(flux_quanta=0.)
+        m = np.maximum(self._fluxModulation(flux_quanta)/self._fluxModulation(0.), floor)
+        sqrt_m = np.sqrt(m)
+        def base(x):
+            # flux independent values broadcast against the flux grid
+            return np.asarray(x)[(...,) + (None,)*flux_quanta.ndim]
+        return {'flux_quanta': flux_quanta,
+                'Ic': base(ref.Ic)*m,
+                'LJ': base(ref.LJ)/m,
+                'L': base(ref.L)/m,
+                'fp': base(ref.fp)*sqrt_m,
+                'fn': base(ref.fn)*sqrt_m,
+                'Zres': base(ref.Zres)/sqrt_m,
+                'Q': base(ref.Q)/sqrt_m}
+
+    def jacobian(self, quantities=JACOBIAN_QUANTITIES):
+        '''
+        Analytic derivatives of fp, fn, Zres and Q with respect to junction
+        area, distance between neighbouring SQUIDs, array length, lineic
+        capacitance and flux, vectorized over the design parameters. All the
+        quantities are power laws of LJ, a, l, C and A, so the derivatives
+        follow from their logarithmic derivatives and from the derivatives of
+        the critical current given by the junction model. The values used are
+        the cached ones, so values and derivatives cost a single evaluation.
+        --------------------------------
+        Parameters:
+        quantities : list of names in JACOBIAN_QUANTITIES
+        --------------------------------
+        Returns:
+        jac : dict {quantity: {parameter: derivative}} with parameters in
+              JACOBIAN_PARAMETERS; derivatives in SI units per um^2 (A), per m
+              (a, l), per pF/m (C) and per radian (flux_quanta)
+        '''
+        A, a, l, C = (np.asarray(x, dtype=float) for x in (self.A, self.a, self.l, self.C))
+        dIc_dA, dIc_dflux = self._criticalCurrentDerivatives(A)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # d ln(LJ) = -d ln(Ic)
+            LJ_A, LJ_flux = -dIc_dA/self.Ic, -dIc_dflux/self.Ic
+            # d ln(q)/d x; fn = 1/(2 pi l sqrt(LJ C/a)), Zres = sqrt(LJ/(a C)), Q ~ Zres,
+            # fp = 1/(2 pi sqrt(LJ CJ 2A))
+            log = {'fp': {'A': -LJ_A/2 - 1/(2*A), 'a': 0., 'l': 0., 'C': 0., 'flux_quanta': -LJ_flux/2},
+                   'fn': {'A': -LJ_A/2, 'a': 1/(2*a), 'l': -1/l, 'C': -1/(2*C), 'flux_quanta': -LJ_flux/2},
+                   'Zres': {'A': LJ_A/2, 'a': -1/(2*a), 'l': 0., 'C': -1/(2*C), 'flux_quanta': LJ_flux/2}}
+            log['Q'] = log['Zres']
+            jac = {}
+            for q in quantities:
+                value = getattr(self, q)
+                jac[q] = {x: value*log[q][x] for x in JACOBIAN_PARAMETERS}
+        return jac
+
+    @classmethod
+    def batchJacobian(cls, ZL, l, a, CJ, A, C, Z0=50., flux_quanta=0, model=None, temperature=0):
+        '''
+        Evaluates the model and its analytic jacobian on whole arrays of
+        design points in one call, see batch and jacobian
+        --------------------------------
+        Parameters:
+        as in batch
+        --------------------------------
+        Returns:
+        res : dict of arrays, one for each name in QUANTITIES
+        jac : dict {quantity: {parameter: array}} as returned by jacobian
+        '''
+        ZL, l, a, CJ, A, C, flux_quanta, temperature = np.broadcast_arrays(
+            *[np.asarray(x, dtype=float) for x in (ZL, l, a, CJ, A, C, flux_quanta, temperature)])
+        with np.errstate(divide='ignore'):
+            tuner = cls(ZL, l, a, None, None, CJ, A, C, Z0=Z0, flux_quanta=flux_quanta, model=model,
+                        temperature=temperature)
+            res = {q: getattr(tuner, q) for q in QUANTITIES}
+        jac = tuner.jacobian()
+        return res, {q: {x: np.broadcast_to(d, ZL.shape) for x, d in derivatives.items()}
+                     for q, derivatives in jac.items()}
+
+    def asDesigns(self):
+        '''
+        Packs the inputs and derived quantities of the instance, evaluated
+        on its broadcast design parameters, in a compact batch
+        --------------------------------
+        Parameters:
+        None
+        --------------------------------
+        Returns:
+        batch : results.DesignBatch of the flattened broadcast shape
+        '''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            columns = {name: getattr(self, name) for name in RECORD_INPUTS + RECORD_QUANTITIES}
+            columns['goodness'] = abs(self.Zres - self.th_Zres)/self.th_Zres*100
+        columns['success'] = columns['goodness'] < GOODNESS_THRESHOLD
+        return DesignBatch.fromColumns(self.model.name, **columns)
+
+    def asDesign(self):
+        '''
+        The design of an instance with scalar parameters as an immutable
+        record, see results.Design
+        '''
+        batch = self.asDesigns()
+        if len(batch) != 1:
+            raise ValueError("The instance holds %i designs, use asDesigns()" % len(batch))
+        return batch[0]
+
+    @classmethod
+    def batchDesigns(cls, ZL, l, a, CJ, A, C, Z0=50., flux_quanta=0, model=None, temperature=0):
+        '''
+        Evaluates the model on whole arrays of design points, as batch, and
+        returns them as a compact batch of records
+        --------------------------------
+        Parameters:
+        as in batch
+        --------------------------------
+        Returns:
+        batch : results.DesignBatch of the flattened broadcast shape
+        '''
+        ZL, l, a, CJ, A, C, flux_quanta, temperature = np.broadcast_arrays(
+            *[np.asarray(x, dtype=float) for x in (ZL, l, a, CJ, A, C, flux_quanta, temperature)])
+        with np.errstate(divide='ignore'):
+            tuner = cls(ZL, l, a, None, None, CJ, A, C, Z0=Z0, flux_quanta=flux_quanta, model=model,
+                        temperature=temperature)
+            return tuner.asDesigns()
+
+    @classmethod
+    def fromDesign(cls, design, model=None):
+        '''
+        Instance holding one or many designs. The quantities stored in the
+        records are put in the cache, so the junction model is not evaluated
+        again until a parameter is changed, and the others are derived from
+        them when read. model must be the one the records come from.
+        --------------------------------
+        Parameters:
+        design : results.Design or results.DesignBatch
+        model  : str or JunctionModel, default junction_model of the class
+        --------------------------------
+        Returns:
+        tuner : instance with scalar parameters for a Design, 1D arrays for a DesignBatch
+        '''
+        model = getModel(model if model is not None else cls.junction_model)
+        if model.name != design.model:
+            raise ValueError("The designs come from the junction model %r, not %r" % (design.model, model.name))
+        columns = design.asdict() if isinstance(design, Design) else {name: getattr(design, name)
+                                                                      for name in RECORD_INPUTS + RECORD_QUANTITIES}
+        tuner = cls(columns['ZL'], columns['l'], columns['a'], None, None, columns['CJ'], columns['A'],
+                    columns['C'], Z0=columns['Z0'], flux_quanta=columns['flux_quanta'], model=model,
+                    temperature=columns['temperature'])
+        for q in RECORD_QUANTITIES:
+            tuner.__dict__[q] = columns[q]
+        return tuner
+
+    def _copy(self, **inputs):
+        '''
+        Copies the instance keeping the cached quantities that do not depend
+        on the parameters changed in inputs
+        --------------------------------
+        Parameters:
+        inputs : parameters to change in the copy, e.g. flux_quanta=0.
+        --------------------------------
+        Returns:
+        new : instance of the same class
+        '''
+        new = copy.copy(self)
+        for name, value in inputs.items():
+            setattr(new, name, value)
+        return new
+
     def _cpwImpedance(self, ZL):
         '''
         Calculates the impedance the coplanar tuner should have to match ZL to Z0
@@ -75,8 +624,8 @@ class SQUID_ImpedanceMatching:
     
     def _criticalCurrent(self, A):
         '''
-        Calculates the critical current of the SQUID according to INRIM
-        experimental law
+        Calculates the critical current of the SQUID according to the junction
+        model (INRIM experimental law by default)
         --------------------------------
         Parameters:
         A           : SQUID junction area in um^2
@@ -84,8 +633,49 @@ class SQUID_ImpedanceMatching:
         Returns:
         Ic : float Critical current in A
         '''
-        Ic = 8.47475*A*1e-6*abs(np.cos(self.flux_quanta))
+        Ic = self.model.Ic(A, self.flux_quanta, self.temperature)
         return Ic
+
+    def _criticalCurrentDerivatives(self, A):
+        '''
+        Derivatives of _criticalCurrent with respect to the junction area and
+        to the flux; classes overriding _criticalCurrent override this too
+        --------------------------------
+        Parameters:
+        A : SQUID junction area in um^2
+        --------------------------------
+        Returns:
+        dIc_dA    : float Derivative in A/um^2
+        dIc_dflux : float Derivative in A/rad
+        '''
+        return self.model.IcDerivatives(A, self.flux_quanta, self.temperature)
+
+    def _junctionArea(self, Ic):
+        '''
+        Inverse of _criticalCurrent: junction area giving the critical current Ic
+        --------------------------------
+        Parameters:
+        Ic : float Critical current in A
+        --------------------------------
+        Returns:
+        A : float SQUID junction area in um^2
+        '''
+        A = self.model.junctionArea(Ic, self.flux_quanta, self.temperature)
+        return A
+
+    def _fluxModulation(self, flux_quanta):
+        '''
+        Calculates the critical current of the SQUID normalized to the one of
+        its two junctions in parallel without applied flux
+        --------------------------------
+        Parameters:
+        flux_quanta : float or array Cosine argument in the Ic equation
+        --------------------------------
+        Returns:
+        m : float or array Critical current modulation
+        '''
+        m = self.model.fluxModulation(flux_quanta)
+        return m
     
     def _SQUID_Inductance(self):
         '''
@@ -176,42 +766,124 @@ class SQUID_ImpedanceMatching:
 class SQUID_ImpedanceMatching2(SQUID_ImpedanceMatching): # Facendo così SQUID_ImpedanceMatching2 diventa figlia di
                                                          # SQUID_ImpedanceMatching e ne eredita tutti i metodi
     '''
-    This class allow doing the same calculation as its parent, but with a different oxidation of the Junctions
+    This class allow doing the same calculation as its parent, but with a different oxidation of the Junctions,
+    according to S. V. Lotkhov, E. M. Tolkacheva, D. V. Balashov, M. I. Khabipov, F.-I. Buchholz and A. B. Zorin
+    "Low hysteretic behavior of Al/AlOx/Al Josephson junctions"
+    Applied Physics Letters, 89, 132115 (2006)
     '''
+
+    junction_model = 'Lotkhov' # Critical current of 10*A uA with junction area A in um^2
     
-    def __init__(self, ZL, l, a, RN, Delta, CJ, A, C, Z0=50., n=1, flux_quanta=0):
-        SQUID_ImpedanceMatching.__init__(self, ZL, l, a, RN, Delta, CJ, A, C, Z0, n, flux_quanta) # In questo modo faccio
-                                                                                                  # tutto quello che c'è in __init__
-                                                                                                  # di SQUID_ImpedanceMatching
+    def __init__(self, ZL, l, a, RN, Delta, CJ, A, C, Z0=50., n=1, flux_quanta=0, model=None, temperature=0):
+        SQUID_ImpedanceMatching.__init__(self, ZL, l, a, RN, Delta, CJ, A, C, Z0, n, flux_quanta, model, temperature) # In questo modo faccio
+                                                                                                                      # tutto quello che c'è in __init__
+                                                                                                                      # di SQUID_ImpedanceMatching
         #self.parameters = ['gamma1', 'a1'] # Posso ridefinire cose di una classe dalla classe figlia e quello
                                            # che non ridefinisco rimane com'è
-                                           
-    def _criticalCurrent(self, A):
-        '''
-        Calculates the critical current of the SQUID according to
-        S. V. Lotkhov, E. M. Tolkacheva, D. V. Balashov, M. I. Khabipov, F.-I. Buchholz and A. B. Zorin
-        "Low hysteretic behavior of Al/AlOx/Al Josephson junctions"
-        Applied Physics Letters, 89, 132115 (2006)
-        --------------------------------
-        Parameters:
-        A : SQUID junction area in um^2
-        --------------------------------
-        Returns:
-        Ic : float Critical current in A
-        '''
-        Ic = 10*A*1e-6*abs(np.cos(self.flux_quanta))
-        return Ic
 
 #----------------------------------------------------------------------------------------------------------
+
+def _bracketedRoot(func, lo, hi, xatol=1e-10, maxiter=500):
+    '''
+    Vectorized bisection: finds for every element the root of func inside
+    [lo, hi]. Where func does not change sign the end point with the smallest
+    |func| is returned, as a bounded minimization of |func| would do.
+    --------------------------------
+    Parameters:
+    func    : callable taking and returning arrays of the same shape
+    lo, hi  : float Bracket
+    xatol   : float Absolute tolerance on the root
+    maxiter : int Maximum number of bisection steps
+    --------------------------------
+    Returns:
+    x : array of roots
+    '''
+    f_lo = func(lo)
+    f_hi = func(hi)
+    shape = np.broadcast(f_lo, f_hi).shape
+    x_lo = np.full(shape, float(lo))
+    x_hi = np.full(shape, float(hi))
+    ends = np.where(abs(f_lo) <= abs(f_hi), float(lo), float(hi))
+    bracketed = np.sign(f_lo) != np.sign(f_hi)
+    f_lo = np.broadcast_to(f_lo, shape)
+    iterations = 0
+    while iterations < maxiter and not np.all(x_hi - x_lo < xatol):
+        x_mid = (x_lo + x_hi)/2
+        f_mid = func(x_mid)
+        left = np.sign(f_mid) == np.sign(f_lo)
+        x_lo = np.where(left, x_mid, x_lo)
+        f_lo = np.where(left, f_mid, f_lo)
+        x_hi = np.where(left, x_hi, x_mid)
+        iterations += 1
+    instrumentation.count('bisection iterations', iterations)
+    instrumentation.event('bisection', iterations=iterations, evaluations=iterations + 2, points=int(np.size(x_lo)))
+    x = (x_lo + x_hi)/2
+    return np.where(bracketed, x, ends)
                                            
-def f(A, N, ZL, a, Delta, CJ, C):
+def _seededRoot(func, x0, step, lo, hi, tolerance, maxiter=20, xatol=1e-10):
+    '''
+    Vectorized secant search of the roots of func, a decreasing function of
+    log(x), starting from the guesses x0. An element is accepted as soon as
+    100*|exp(func) - 1| < tolerance, or when it reaches lo or hi with the root
+    beyond them; the ones not accepted after maxiter steps are solved by
+    _bracketedRoot over [lo, hi].
+    --------------------------------
+    Parameters:
+    func      : callable func(x, sel) evaluating the elements selected by the
+                boolean mask sel at x, an array with sel.sum() elements
+    x0        : array Starting guesses
+    step      : float or array First secant step in log(x)
+    lo, hi    : float Bracket
+    tolerance : float Acceptance threshold in %
+    maxiter   : int Maximum number of secant steps
+    xatol     : float Absolute tolerance of the fall back bisection
+    --------------------------------
+    Returns:
+    x           : array of roots
+    evaluations : int array Number of evaluations of func for every element
+    '''
+    accepted = lambda g: 100*abs(np.expm1(g)) < tolerance
+    u_lo, u_hi = np.log(lo), np.log(hi)
+    u = np.clip(np.log(x0), u_lo, u_hi)
+    every = np.ones(u.shape, dtype=bool)
+    g = func(np.exp(u), every)
+    evaluations = np.ones(u.shape, dtype=np.int64)
+    solved = accepted(g)
+    active = ~solved & np.isfinite(g)
+    # First step: Zres decreases with the area, so Zres > th_Zres asks for a larger area
+    u_prev, g_prev = u, g
+    u = np.where(active, np.clip(u + np.where(g > 0, 1., -1.)*step, u_lo, u_hi), u)
+    for i in range(maxiter):
+        if not np.any(active):
+            break
+        g = np.array(g_prev)
+        g[active] = func(np.exp(u[active]), active)
+        evaluations[active] += 1
+        # At a bound with the root beyond it the bound is the answer, as in _bracketedRoot
+        done = active & (accepted(g) | ((u == u_hi) & (g > 0)) | ((u == u_lo) & (g < 0)))
+        solved |= done
+        active &= ~done
+        u_next = u - g*(u - u_prev)/(g - g_prev)
+        active &= np.isfinite(u_next) & (u_next != u)
+        u_prev, g_prev = np.where(active, u, u_prev), np.where(active, g, g_prev)
+        u = np.where(active, np.clip(u_next, u_lo, u_hi), np.where(solved, u, u_prev))
+    x = np.exp(u)
+    failed = ~solved
+    if np.any(failed):
+        x[failed] = _bracketedRoot(lambda y: func(y, failed), lo, hi, xatol)
+        evaluations[failed] += min(int(np.ceil(np.log2((hi - lo)/xatol))), 500) + 2
+    return x, evaluations
+
+def f(A, N, ZL, a, Delta, CJ, C, cls=SQUID_ImpedanceMatching):
     l = N*a               # SQUID array length in m
     R_N = 33.81 / A       # SQIDs room temperature tunnel resistance
                           # according to V. Ambegaokar, A. Baratoff, "Tunneling
                           # between superconductors", 1963
     RN = R_N + R_N*17/100 # SQUIDs 15 mK tunnel resistance
     #print(a)
-    tuner = SQUID_ImpedanceMatching(ZL, l, a, RN, Delta, CJ, A, C)
+    if instrumentation.enabled:
+        instrumentation.count('f')
+    tuner = cls(ZL, l, a, RN, Delta, CJ, A, C)
     return abs(tuner.Zres - tuner.th_Zres)
 
 
@@ -245,10 +917,10 @@ if __name__== "__main__":
         resFreq = []
         junctionArea = []
         #print("!!!!!!!!!!!!!!!!!", N)
-        for a in d:
+        match = SQUID_ImpedanceMatching.matchedArea(ZL, np.array(d)*1e-6, C, CJ, bounds=(0.0025, 5), xatol=1e-10)
+        for i, a in enumerate(d):
             a = a*1e-6 # Transform the distance between neighbouring SQUIDs in m
-            res = minimize_scalar(f, bounds=(0.0025, 5), args=(N, ZL, a, Delta, CJ, C), method='bounded', options={'xatol': 1e-10, 'maxiter': 500, 'disp': 0})
-            A = res.x   # Single Junctin area in um^2 coming from minimization
+            A = match['A'][i]   # Single Junctin area in um^2 coming from the matching solver
             junctionArea.append(A)
             
             l = N*a     # SQUID array length in m
@@ -267,19 +939,8 @@ if __name__== "__main__":
             #print("Goodness: ", a, A, goodness, "%", success)
         firtsResonanceFreq.append(resFreq)
 
-    fig, axis = plt.subplots(1,3, squeeze = True, figsize=(10,5))
-    ax = axis[0]
-    ax.set_ylabel('Junction Area / um^2')
-    #ax.set_xlabel('Distance between neighbouring SQUIDs / um')
-    ax.plot(d, junctionArea)
-    for i, N in enumerate(squids):
-        ax = axis[i+1]
-        ax.set_title("Number of SQUIDs = %i" %N)
-        ax.set_ylabel('First rersonance Frequency / GHz')
-        if i == 0:
-            ax.set_xlabel('Distance between neighbouring SQUIDs / um')
-        ax.plot(d, firtsResonanceFreq[i])
-    fig.tight_layout()
+    import plotting # matplotlib is only imported here, the physics above stays headless
+    plotting.matchingCurves(d, junctionArea, squids, firtsResonanceFreq)
 
     '''
     #Se voglio vedere i singoli valori mi basta calcolare un "tuner" passandogli i
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 21:14:52 2026
+
+@author: feynman
+"""
+
+import numpy as np
+from RFSET_Matching_Optimization import SQUID_ImpedanceMatching
+from junction_models import getModel
+
+# Adaptive sampling of a map over distance between neighbouring SQUIDs and
+# flux. The rectangle starts as a coarse grid of cells; every cell is tested
+# by evaluating the model at its centre and at the midpoints of its edges and
+# comparing with the bilinear interpolation of its corners. The refinement is
+# anisotropic: a cell is halved along a if the midpoints of its edges along a
+# have a relative error above the tolerance, along flux if the ones of its
+# edges along flux have, and along both if only the centre has. fn and Zres
+# are steep in flux near the nodes of Ic and smooth in a, so most cells are
+# only split along flux. The test points are nodes of the children, so no
+# evaluation is wasted. The tolerance is thus an estimate of the error from
+# the midpoints and centre, not a bound, and it is only tested on cells wider
+# than one lattice step: where max_level stops the refinement (leaves one
+# lattice step wide along a or flux, e.g. around the nodes of Ic) the error
+# can be larger. measuredError() checks it against func on random points of
+# the tested leaves. The nodes live on an integer lattice 2^max_level times
+# finer than the initial grid, so nodes shared by neighbouring cells are
+# evaluated once. All the new nodes of a level are evaluated in one vectorized
+# call. Interpolation is bilinear inside the leaf cells, the same
+# approximation whose error the refinement controls. A corner of a leaf lying
+# inside the edge of a larger neighbour (hanging node) takes the value of the
+# neighbour along that edge, so the interpolant is continuous across levels.
+# The children of a cell are numbered consecutively, and the leaf of a point
+# is found by descending the cell hierarchy from the initial grid.
+
+class AdaptiveMap:
+    '''
+    Anisotropic quadtree refinement of quantities of a design over (a, flux).
+    func(a, flux) takes arrays of distances in m and cosine arguments and
+    returns a dict of arrays, among which the refined quantities; every
+    returned array is kept at the nodes of the mesh.
+    '''
+
+    def __init__(self, func, a_bounds, flux_bounds, quantities=('fn', 'Zres'), tolerance=1e-3,
+                 initial=(4, 8), max_level=6):
+        self.func = func
+        self.a_bounds = a_bounds
+        self.flux_bounds = flux_bounds
+        self.quantities = tuple(quantities)
+        self.tolerance = tolerance
+        self.initial = initial       # initial number of cells along a and flux
+        self.max_level = max_level   # maximum number of splits of an initial cell
+        self.evaluations = 0
+        self._index = {}             # lattice node (I, J) -> position in the node arrays
+        self._nodes = np.empty((0, 2), dtype=np.int64)
+        self._values = {}
+        self.leaves = np.empty((0, 4), dtype=np.int64) # (I, J, size along a, size along flux) of the leaf cells
+        self._cells = np.empty((0, 4), dtype=np.int64) # every cell of the hierarchy, as the leaves
+        self._first = np.empty(0, dtype=np.int64)      # first child of every cell, -1 for the leaves
+        self._leafNumber = np.empty(0, dtype=np.int64) # position of every cell in leaves, -1 for the others
+
+    @property
+    def lattice(self):
+        '''
+        Number of lattice intervals along a and flux
+        '''
+        return self.initial[0]*2**self.max_level, self.initial[1]*2**self.max_level
+
+    def coordinates(self, nodes):
+        '''
+        Distance in m and cosine argument of lattice nodes
+        --------------------------------
+        Parameters:
+        nodes : int array (n, 2) Lattice coordinates
+        --------------------------------
+        Returns:
+        a, flux : arrays (n,)
+        '''
+        (a0, a1), (f0, f1) = self.a_bounds, self.flux_bounds
+        na, nf = self.lattice
+        return a0 + (a1 - a0)*nodes[:, 0]/na, f0 + (f1 - f0)*nodes[:, 1]/nf
+
+    def _evaluate(self, nodes):
+        # Positions of the lattice nodes, evaluating the ones not seen yet
+        nodes = np.unique(nodes, axis=0)
+        new = np.array([(i, j) not in self._index for i, j in nodes.tolist()], dtype=bool)
+        if np.any(new):
+            nodes_new = nodes[new]
+            a, flux = self.coordinates(nodes_new)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                res = self.func(a, flux)
+            for name, value in res.items():
+                value = np.broadcast_to(value, a.shape)
+                self._values[name] = np.concatenate([self._values.get(name, np.empty(0)), value])
+            for k, (i, j) in enumerate(nodes_new.tolist(), start=len(self._nodes)):
+                self._index[i, j] = k
+            self._nodes = np.concatenate([self._nodes, nodes_new])
+            self.evaluations += len(nodes_new)
+
+    def _positions(self, I, J):
+        return np.array([self._index[i, j] for i, j in zip(I.tolist(), J.tolist())], dtype=np.int64)
+
+    def run(self):
+        '''
+        Refines the mesh until every cell is within tolerance or at max_level
+        --------------------------------
+        Parameters:
+        None
+        --------------------------------
+        Returns:
+        self
+        '''
+        step = 2**self.max_level
+        I, J = np.meshgrid(np.arange(self.initial[0])*step, np.arange(self.initial[1])*step, indexing='ij')
+        cells = np.stack([I.ravel(), J.ravel(), np.full(I.size, step), np.full(I.size, step)], axis=-1)
+        offsets = [(di, dj) for di in (0, 1, 2) for dj in (0, 1, 2)]
+        ids = np.arange(len(cells))
+        tree, parents = [cells], []
+        while len(cells):
+            testable = (cells[:, 2] >= 2) | (cells[:, 3] >= 2)
+            cells, ids = cells[testable], ids[testable]
+            if not len(cells):
+                break
+            # 3x3 nodes of every cell: corners, edge midpoints and centre. Along
+            # a direction of size 1 the midpoints collapse on the corners and
+            # their error is zero
+            I, J, ha, hf = cells[:, 0], cells[:, 1], cells[:, 2]//2, cells[:, 3]//2
+            self._evaluate(np.concatenate([np.stack([I + di*ha, J + dj*hf], axis=-1) for di, dj in offsets]))
+            grid = {(di, dj): self._positions(I + di*ha, J + dj*hf) for di, dj in offsets}
+            error = {'a': np.zeros(len(cells)), 'flux': np.zeros(len(cells)), 'centre': np.zeros(len(cells))}
+            for q in self.quantities:
+                v = {k: self._values[q][p] for k, p in grid.items()}
+                predicted = {'a': {(1, 0): (v[0, 0] + v[2, 0])/2, (1, 2): (v[0, 2] + v[2, 2])/2},
+                             'flux': {(0, 1): (v[0, 0] + v[0, 2])/2, (2, 1): (v[2, 0] + v[2, 2])/2},
+                             'centre': {(1, 1): (v[0, 0] + v[0, 2] + v[2, 0] + v[2, 2])/4}}
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    for direction, points in predicted.items():
+                        for k, p in points.items():
+                            e = np.where(v[k] == p, 0., abs(v[k] - p)/abs(v[k]))
+                            error[direction] = np.maximum(error[direction], np.where(np.isnan(e), np.inf, e))
+            steep_a, steep_flux = error['a'] > self.tolerance, error['flux'] > self.tolerance
+            twisted = (error['centre'] > self.tolerance) & ~steep_a & ~steep_flux
+            split_a = (ha > 0) & (steep_a | twisted)
+            split_flux = (hf > 0) & (steep_flux | twisted)
+            split = split_a | split_flux
+            cells, ids, split_a, split_flux = cells[split], ids[split], split_a[split], split_flux[split]
+            # halve the split directions, keep the others. The 1, 2 or 4
+            # children of a cell follow each other, along flux first
+            total = sum(len(c) for c in tree)
+            count = (1 + split_a)*(1 + split_flux)
+            first = total + np.cumsum(count) - count
+            parent = np.repeat(np.arange(len(cells)), count)
+            rank = total + np.arange(len(parent)) - first[parent]
+            di, dj = rank//(1 + split_flux[parent]), rank % (1 + split_flux[parent])
+            sa = np.where(split_a, cells[:, 2]//2, cells[:, 2])[parent]
+            sf = np.where(split_flux, cells[:, 3]//2, cells[:, 3])[parent]
+            parents.append((ids, first))
+            cells = np.stack([cells[parent, 0] + di*sa, cells[parent, 1] + dj*sf, sa, sf], axis=-1)
+            ids = total + np.arange(len(cells))
+            tree.append(cells)
+        self._cells = np.concatenate(tree)
+        self._first = np.full(len(self._cells), -1, dtype=np.int64)
+        for ids, first in parents:
+            self._first[ids] = first
+        leaf = self._first < 0
+        self.leaves = self._cells[leaf]
+        self._leafNumber = np.full(len(self._cells), -1, dtype=np.int64)
+        self._leafNumber[leaf] = np.arange(len(self.leaves))
+        return self
+
+    def _leaf(self, x, y):
+        '''
+        Leaf cell of points, descending the cell hierarchy
+        --------------------------------
+        Parameters:
+        x, y : arrays (n,) Lattice coordinates, extrapolating outside the map
+        --------------------------------
+        Returns:
+        k : int array (n,) Positions in leaves
+        '''
+        step = 2**self.max_level
+        n0, n1 = self.initial
+        k = (np.clip(x//step, 0, n0 - 1).astype(np.int64)*n1 + np.clip(y//step, 0, n1 - 1).astype(np.int64))
+        inner = np.flatnonzero(self._first[k] >= 0)
+        while len(inner):
+            cell, child = self._cells[k[inner]], self._cells[self._first[k[inner]]]
+            split_flux = child[:, 3] < cell[:, 3]
+            di = (child[:, 2] < cell[:, 2]) & (x[inner] >= cell[:, 0] + child[:, 2])
+            dj = split_flux & (y[inner] >= cell[:, 1] + child[:, 3])
+            k[inner] = self._first[k[inner]] + di*(1 + split_flux) + dj
+            inner = inner[self._first[k[inner]] >= 0]
+        return self._leafNumber[k]
+
+    def _leafCorners(self, quantity):
+        '''
+        Values of a quantity at the corners of the leaves, with the hanging
+        nodes constrained to the edge of the larger neighbour they lie on
+        --------------------------------
+        Parameters:
+        quantity : str Name of an array returned by func
+        --------------------------------
+        Returns:
+        values : array (4, number of leaves) at the corners (0, 0), (1, 0),
+                 (0, 1) and (1, 1) of every leaf
+        '''
+        I, J, sa, sf = self.leaves.T
+        corners = np.stack([self._positions(I + di*sa, J + dj*sf) for di, dj in ((0, 0), (1, 0), (0, 1), (1, 1))])
+        nodes = np.unique(corners)
+        P = self._nodes[nodes]
+        # a corner is hanging if a leaf around it does not have it as corner
+        na, nf = self.lattice
+        host = np.full(len(nodes), -1, dtype=np.int64)
+        for si in (-0.5, 0.5):
+            for sj in (-0.5, 0.5):
+                x, y = P[:, 0] + si, P[:, 1] + sj
+                k = self._leaf(x, y)
+                inside = (x > 0) & (x < na) & (y > 0) & (y < nf)
+                corner = (((P[:, 0] == I[k]) | (P[:, 0] == I[k] + sa[k]))
+                          & ((P[:, 1] == J[k]) | (P[:, 1] == J[k] + sf[k])))
+                host = np.where((host < 0) & inside & ~corner, k, host)
+        hanging = host >= 0
+        nodes, P, host = nodes[hanging], P[hanging], host[hanging]
+        u, v = (P[:, 0] - I[host])/sa[host], (P[:, 1] - J[host])/sf[host]
+        values = np.array(self._values[quantity], dtype=float)
+        # the corners of the host are coarser along the edge, so every pass
+        # settles the hanging nodes of one more level
+        for _ in range(2*self.max_level + 1):
+            c = values[corners[:, host]]
+            values[nodes] = (1 - u)*(1 - v)*c[0] + u*(1 - v)*c[1] + (1 - u)*v*c[2] + u*v*c[3]
+        return values[corners]
+
+    def mesh(self):
+        '''
+        Non uniform mesh of the evaluated nodes, triangulated for plotting
+        (e.g. matplotlib plot_trisurf or tricontourf) and interpolation
+        --------------------------------
+        Parameters:
+        None
+        --------------------------------
+        Returns:
+        res : dict with the node coordinates 'a' in m and 'flux', every array
+              returned by func at the nodes and the Delaunay 'triangles' (n, 3)
+        '''
+        a, flux = self.coordinates(self._nodes)
+        res = {'a': a, 'flux': flux}
+        res.update(self._values)
+        res['triangles'] = self._delaunay().simplices
+        return res
+
+    def _delaunay(self):
+        from scipy.spatial import Delaunay
+        return Delaunay(self._nodes/np.array(self.lattice, dtype=float))
+
+    def measuredError(self, samples=10**4, seed=0):
+        '''
+        Maximum relative interpolation error, against func on random points
+        of the leaves wider than one lattice step along a and flux, where the
+        refinement tested the tolerance
+        --------------------------------
+        Parameters:
+        samples : int Number of random points, spread uniformly over the leaves
+        seed    : seed of numpy.random.default_rng
+        --------------------------------
+        Returns:
+        error : dict with the maximum relative error of every refined quantity
+        '''
+        rng = np.random.default_rng(seed)
+        I, J, sa, sf = self.leaves.T
+        tested = np.flatnonzero((sa > 1) & (sf > 1))
+        if not len(tested):
+            return {q: 0. for q in self.quantities}
+        area = (sa*sf)[tested].astype(float)
+        k = rng.choice(tested, samples, p=area/area.sum())
+        x, y = I[k] + rng.uniform(0, 1, samples)*sa[k], J[k] + rng.uniform(0, 1, samples)*sf[k]
+        (a0, a1), (f0, f1) = self.a_bounds, self.flux_bounds
+        na, nf = self.lattice
+        a, flux = a0 + (a1 - a0)*x/na, f0 + (f1 - f0)*y/nf
+        with np.errstate(divide='ignore', invalid='ignore'):
+            res = self.func(a, flux)
+            return {q: float(np.max(abs(self.interpolator(q)(a, flux) - res[q])/abs(res[q])))
+                    for q in self.quantities}
+
+    def interpolator(self, quantity):
+        '''
+        Bilinear interpolation of a quantity inside the leaf cells of the
+        mesh, continuous across cells of different size
+        --------------------------------
+        Parameters:
+        quantity : str Name of an array returned by func
+        --------------------------------
+        Returns:
+        f : callable f(a, flux) taking arrays of distances in m and cosine
+            arguments inside the bounds of the map
+        '''
+        na, nf = self.lattice
+        I, J, sa, sf = self.leaves.T
+        corners = self._leafCorners(quantity)
+        (a0, a1), (f0, f1) = self.a_bounds, self.flux_bounds
+        def f(a, flux):
+            x, y = np.broadcast_arrays((np.asarray(a, dtype=float) - a0)/(a1 - a0)*na,
+                                       (np.asarray(flux, dtype=float) - f0)/(f1 - f0)*nf)
+            k = self._leaf(x.ravel(), y.ravel()).reshape(x.shape)
+            u, v = (x - I[k])/sa[k], (y - J[k])/sf[k]
+            return ((1 - u)*(1 - v)*corners[0, k] + u*(1 - v)*corners[1, k]
+                    + (1 - u)*v*corners[2, k] + u*v*corners[3, k])
+        return f
+
+def designMap(ZL, N, C, a_bounds, flux_bounds, CJ=None, model='INRIM', Z0=50., cls=SQUID_ImpedanceMatching,
+              **options):
+    '''
+    Adaptive map of the matched design vs distance between neighbouring
+    SQUIDs and flux: at every distance the junction area is matched at zero
+    flux, as in calculation.py, then the design is evaluated at the flux
+    --------------------------------
+    Parameters:
+    ZL          : float Load impedance in ohm
+    N           : int Number of SQUIDs
+    C           : float SQUID array lineic capacitance in pF/m
+    a_bounds    : (a0, a1) Distances between neighbouring SQUIDs in m
+    flux_bounds : (f0, f1) Cosine arguments in the Ic equation
+    CJ          : float SQUID capacitance in F/um^2, default the one of the model
+    model       : str or JunctionModel
+    Z0          : float Characteristic impedance in ohm
+    cls         : SQUID_ImpedanceMatching or child class
+    options     : quantities, tolerance, initial and max_level of AdaptiveMap
+    --------------------------------
+    Returns:
+    amap : AdaptiveMap already run, with 'A' and QUANTITIES at the nodes
+    '''
+    model = getModel(model)
+    CJ = model.cj if CJ is None else CJ
+    def func(a, flux):
+        A = cls.matchedArea(ZL, a, C, CJ, Z0=Z0, model=model)['A']
+        res = cls.batch(ZL, N*a, a, CJ, A, C, Z0=Z0, flux_quanta=flux, model=model)
+        res['A'] = A
+        return res
+    return AdaptiveMap(func, a_bounds, flux_bounds, **options).run()
+
+
+
+if __name__== "__main__":
+    import time
+
+    # Resonance map of calculation.py: 3-10 um and 0-6.25 rad
+    start = time.perf_counter()
+    amap = designMap(100e3, 20, 84.3, (3e-6, 10e-6), (0, 6.25), model='Lotkhov', tolerance=1e-3)
+    elapsed = time.perf_counter() - start
+    na, nf = amap.lattice
+    print("%i model evaluations in %.2f s, %i leaf cells (uniform grid of the same resolution: %i points)"
+          % (amap.evaluations, elapsed, len(amap.leaves), (na + 1)*(nf + 1)))
+
+    # Interpolation error on random points away from the nodes of Ic
+    rng = np.random.default_rng(0)
+    a, flux = rng.uniform(3e-6, 10e-6, 10**5), rng.uniform(0, 6.25, 10**5)
+    far = abs(np.cos(flux)) > 0.05
+    A = SQUID_ImpedanceMatching.matchedArea(100e3, a, 84.3, getModel('Lotkhov').cj, model='Lotkhov')['A']
+    fn = SQUID_ImpedanceMatching.batch(100e3, 20*a, a, getModel('Lotkhov').cj, A, 84.3, flux_quanta=flux,
+                                       model='Lotkhov')['fn']
+    error = abs(amap.interpolator('fn')(a, flux) - fn)/fn
+    print("fn interpolation error: %.2e max, %.2e median (|cos(flux)| > 0.05)"
+          % (error[far].max(), np.median(error[far])))
+
+    # The tolerance holds where the refinement could test it
+    measured = amap.measuredError()
+    print("measured error of the leaves wider than one lattice step: %s, within tolerance %s"
+          % (", ".join("%s %.2e" % item for item in measured.items()),
+             all(e <= amap.tolerance for e in measured.values())))
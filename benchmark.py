@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 11:20:52 2026
+
+@author: feynman
+"""
+
+import argparse
+import inspect
+import json
+import platform
+import sys
+import time
+import numpy as np
+from scipy.optimize import minimize_scalar
+from RFSET_Matching_Optimization import SQUID_ImpedanceMatching, SQUID_ImpedanceMatching2
+from RFSET_Matching_Optimization import f as objective
+try:
+    from RFSET_Matching_Optimization import QUANTITIES
+except ImportError: # trees before the lazy quantities
+    QUANTITIES = ('Z1', 'Ic', 'LJ', 'L', 'fp', 'fn', 'th_Zres', 'Zres', 'th_Q', 'Q')
+
+# Benchmark of the hot paths of the matching calculation. Every case is run at
+# several grid sizes for both junction oxidations and timed as the best of a few
+# repetitions. Cases marked as scalar evaluate one design point at a time in
+# Python, as the scripts used to do, and are skipped above max_scalar_points.
+#
+# python benchmark.py --output bench.json                   # run and save the results
+# python benchmark.py --baseline bench.json                 # compare with stored results
+# python benchmark.py --baseline bench.json --tolerance 0.5 # allow 50 % slowdowns
+#
+# benchmark_reference.json holds the results of the current tree on the
+# machine it names; compare with it before and after touching a hot path.
+# benchmark_baseline.json holds the results of the original eager classes
+# (commit 2fa997a) on the same machine, so the current tree is also measured
+# against the code it replaced. The script runs on such older trees too,
+# skipping the cases whose API they lack:
+#
+# git worktree add ../baseline 2fa997a && cp benchmark.py ../baseline
+# cd ../baseline && python benchmark.py --output ../package/benchmark_baseline.json
+
+MODELS = {'SQUID_ImpedanceMatching': (SQUID_ImpedanceMatching, 4.46741e-14, 33.81),
+          'SQUID_ImpedanceMatching2': (SQUID_ImpedanceMatching2, 7.5e-14, 22.0)}
+
+SIZES = (10, 10**3, 10**6)
+
+ZL = 100e3                   # Impedance to be matched in ohms
+Delta = 180e-6               # Superconducting gap in eV
+C = 84.3                     # cpw lineic capacitance in pF/m
+N = 20                       # Number of SQUIDs
+
+def _pitches(n):
+    return np.linspace(3e-6, 10e-6, n)
+
+# The objective takes the class as last argument since it times the child class
+_OBJECTIVE_CLASS = 'cls' in inspect.signature(objective).parameters
+
+def _objectiveArgs(SQUIDmatch):
+    return (SQUIDmatch,) if _OBJECTIVE_CLASS else ()
+
+#----------------------------------------------------------------------------------------------------------
+# Cases: each one takes the model parameters and the number of design points
+# and returns a function running the case once
+
+def caseConstruction(SQUIDmatch, CJ, coeff_R_N, n):
+    a = _pitches(n)
+    def run():
+        for x in a:
+            tuner = SQUIDmatch(ZL, N*x, x, None, Delta, CJ, 0.01, C)
+            for q in QUANTITIES:
+                getattr(tuner, q)
+    return run
+
+def caseBatch(SQUIDmatch, CJ, coeff_R_N, n):
+    a = _pitches(n)
+    def run():
+        SQUIDmatch.batch(ZL, N*a, a, CJ, 0.01, C)
+    return run
+
+def caseObjective(SQUIDmatch, CJ, coeff_R_N, n):
+    # objective of the scalar optimization, RFSET_Matching_Optimization.f
+    a = _pitches(n)
+    def run():
+        for x in a:
+            objective(0.01, N, ZL, x, Delta, CJ, C, *_objectiveArgs(SQUIDmatch))
+    return run
+
+def caseMinimizeScalar(SQUIDmatch, CJ, coeff_R_N, n):
+    a = _pitches(n)
+    def run():
+        for x in a:
+            minimize_scalar(objective, bounds=(0.0025, 5), args=(N, ZL, x, Delta, CJ, C) + _objectiveArgs(SQUIDmatch), method='bounded',
+                            options={'xatol': 1e-10, 'maxiter': 500, 'disp': 0})
+    return run
+
+def caseMatchedArea(SQUIDmatch, CJ, coeff_R_N, n):
+    a = _pitches(n)
+    def run():
+        SQUIDmatch.matchedArea(ZL, a, C, CJ)
+    return run
+
+def caseContinuation(SQUIDmatch, CJ, coeff_R_N, n):
+    # 2-D sweep solved by continuation along 100 pitches, the load impedances
+    # of the other axis are solved together
+    a = _pitches(min(n, 100))
+    loads = np.linspace(25.8e3, 1e6, max(n//len(a), 1))[:, None]
+    def run():
+        SQUIDmatch.continuedArea(loads, a, C, CJ, axis=1)
+    return run
+
+def casePitchSweep(SQUIDmatch, CJ, coeff_R_N, n):
+    # Pitch loop of calculation.py: matched area and all the derived quantities
+    a = _pitches(n)
+    def run():
+        A = SQUIDmatch.matchedArea(ZL, a, C, CJ)['A']
+        SQUIDmatch.batch(ZL, N*a, a, CJ, A, C)
+    return run
+
+def caseFluxMap(SQUIDmatch, CJ, coeff_R_N, n):
+    # Resonance frequency vs pitch and flux as in calculation.py, 8 pitches
+    a = _pitches(8)
+    flux = np.linspace(0, 6.25, max(n//8, 1))
+    def run():
+        A = SQUIDmatch.matchedArea(ZL, a, C, CJ)['A']
+        tuner = SQUIDmatch(ZL, N*a, a, None, Delta, CJ, A, C)
+        tuner.tuningCurve(flux)['fn']
+    return run
+
+def caseFluxMapScalar(SQUIDmatch, CJ, coeff_R_N, n):
+    a = _pitches(8)
+    flux = np.linspace(0, 6.25, max(n//8, 1))
+    A = SQUIDmatch.matchedArea(ZL, a, C, CJ)['A']
+    def run():
+        for x, y in zip(a, A):
+            for phi in flux:
+                SQUIDmatch(ZL, N*x, x, None, Delta, CJ, y, C, flux_quanta=phi).fn
+    return run
+
+# name -> (case, scalar)
+CASES = {'construction': (caseConstruction, True),
+         'batch': (caseBatch, False),
+         'objective': (caseObjective, True),
+         'minimize_scalar': (caseMinimizeScalar, True),
+         'matched_area': (caseMatchedArea, False),
+         'continuation': (caseContinuation, False),
+         'pitch_sweep': (casePitchSweep, False),
+         'flux_map': (caseFluxMap, False),
+         'flux_map_scalar': (caseFluxMapScalar, True)}
+
+# name -> class methods the case needs beyond the constructor
+REQUIRES = {'batch': ('batch',),
+            'matched_area': ('matchedArea',),
+            'continuation': ('continuedArea',),
+            'pitch_sweep': ('matchedArea', 'batch'),
+            'flux_map': ('matchedArea', 'tuningCurve'),
+            'flux_map_scalar': ('matchedArea',)}
+
+def available(case, SQUIDmatch):
+    '''
+    Whether the tree the benchmark runs on has what the case needs
+    '''
+    if case in ('objective', 'minimize_scalar') and not _OBJECTIVE_CLASS:
+        return SQUIDmatch is SQUID_ImpedanceMatching
+    return all(hasattr(SQUIDmatch, name) for name in REQUIRES.get(case, ()))
+
+#----------------------------------------------------------------------------------------------------------
+
+def checkInvalidation(SQUIDmatch, CJ, coeff_R_N):
+    '''
+    Checks the lazy evaluation the scalar cases rely on: setting a parameter
+    of an instance with all its quantities computed must drop exactly the
+    quantities downstream of it (e.g. flux_quanta keeps Z1, th_Zres and th_Q
+    and drops Ic ... Q), and the recomputed quantities must equal the ones of
+    a new instance
+    --------------------------------
+    Parameters:
+    SQUIDmatch, CJ, coeff_R_N : model, as in MODELS
+    --------------------------------
+    Returns:
+    errors : list of str, empty when the invalidation is correct
+    '''
+    if not hasattr(SQUIDmatch, '_downstream'): # eager classes
+        return []
+    a = 5e-6
+    inputs = {'ZL': ZL, 'l': N*a, 'a': a, 'RN': None, 'Delta': Delta, 'CJ': CJ, 'A': 0.01, 'C': C}
+    changes = {'ZL': 50e3, 'l': 2*N*a, 'a': 2*a, 'CJ': 2*CJ, 'A': 0.02, 'C': 2*C, 'Z0': 75.,
+               'flux_quanta': 0.3, 'temperature': 0.5}
+    errors = []
+    for name, value in changes.items():
+        tuner = SQUIDmatch(**inputs)
+        for q in QUANTITIES:
+            getattr(tuner, q)
+        setattr(tuner, name, value)
+        dropped = [q for q in QUANTITIES if q not in vars(tuner)]
+        if set(dropped) != set(SQUIDmatch._downstream(name)):
+            errors.append("%s: setting %s dropped %s instead of %s"
+                          % (SQUIDmatch.__name__, name, dropped, list(SQUIDmatch._downstream(name))))
+        fresh = SQUIDmatch(**dict(inputs, **{name: value}))
+        for q in QUANTITIES:
+            if not np.isclose(getattr(tuner, q), getattr(fresh, q), rtol=1e-12):
+                errors.append("%s: %s is stale after setting %s" % (SQUIDmatch.__name__, q, name))
+    return errors
+
+def runBenchmarks(cases=None, models=None, sizes=SIZES, repeat=3, max_scalar_points=10**4):
+    '''
+    Runs the benchmark cases available on the tree
+    --------------------------------
+    Parameters:
+    cases             : list of case names, default all the CASES
+    models            : list of model names, default all the MODELS
+    sizes             : list of numbers of design points
+    repeat            : int Number of repetitions, the best time is kept
+    max_scalar_points : int Largest size run by the scalar cases
+    --------------------------------
+    Returns:
+    results : list of dict with case, model, size, seconds and seconds per point
+    '''
+    results = []
+    for case in cases or CASES:
+        make, scalar = CASES[case]
+        for model in models or MODELS:
+            if not available(case, MODELS[model][0]):
+                continue
+            for n in sizes:
+                if scalar and n > max_scalar_points:
+                    continue
+                run = make(*MODELS[model], n)
+                best = np.inf
+                for i in range(repeat):
+                    start = time.perf_counter()
+                    run()
+                    best = min(best, time.perf_counter() - start)
+                results.append({'case': case, 'model': model, 'size': n,
+                                'seconds': best, 'per_point': best/n})
+    return results
+
+def compare(results, baseline, tolerance=0.25):
+    '''
+    Compares results with a stored baseline
+    --------------------------------
+    Parameters:
+    results   : list of dict returned by runBenchmarks
+    baseline  : list of dict returned by runBenchmarks
+    tolerance : float Allowed relative slowdown
+    --------------------------------
+    Returns:
+    report : list of dict with the baseline time, the ratio and the regression flag
+    '''
+    reference = {(r['case'], r['model'], r['size']): r['seconds'] for r in baseline}
+    report = []
+    for r in results:
+        key = (r['case'], r['model'], r['size'])
+        if key not in reference:
+            continue
+        ratio = r['seconds']/reference[key]
+        report.append(dict(r, baseline=reference[key], ratio=ratio, regression=ratio > 1 + tolerance))
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the SQUID array impedance matching calculation")
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), help="cases to run, default all")
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), help="models to run, default all")
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(SIZES), help="numbers of design points")
+    parser.add_argument('--repeat', type=int, default=3, help="repetitions, the best time is kept")
+    parser.add_argument('--max-scalar-points', type=int, default=10**4, help="largest size for scalar cases")
+    parser.add_argument('--output', help="JSON file where the results are written")
+    parser.add_argument('--baseline', help="JSON file with the results to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    errors = [e for model in args.models or MODELS for e in checkInvalidation(*MODELS[model])]
+    for e in errors:
+        print(e)
+    if errors:
+        return 1
+    results = runBenchmarks(args.cases, args.models, args.sizes, args.repeat, args.max_scalar_points)
+    document = {'python': platform.python_version(), 'numpy': np.__version__,
+                'machine': platform.machine(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=1)
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        for r in compare(results, baseline, args.tolerance):
+            regressions += r['regression']
+            print("%-16s %-25s %8i %12.6f s  x%6.2f %s" % (r['case'], r['model'], r['size'], r['seconds'],
+                                                       r['ratio'], "REGRESSION" if r['regression'] else ""))
+    else:
+        for r in results:
+            print("%-16s %-25s %8i %12.6f s  %10.3e s/point" % (r['case'], r['model'], r['size'],
+                                                             r['seconds'], r['per_point']))
+    return 1 if regressions else 0
+
+if __name__== "__main__":
+    sys.exit(main())
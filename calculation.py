@@ -6,21 +6,12 @@ Created on Wed Feb 12 16:36:26 2020
 """
 
 #import numpy as np
-from scipy.optimize import minimize_scalar
-import matplotlib.pylab as plt
-from mpl_toolkits import mplot3d
 import numpy as np
-import csv
-
-def f(A, N, ZL, a, Delta, CJ, C):
-    l = N*a               # SQUID array length in m
-    R_N = coeff_R_N / A   # SQIDs room temperature tunnel resistance
-                          # according to V. Ambegaokar, A. Baratoff, "Tunneling
-                          # between superconductors", 1963
-    RN = R_N + R_N*17/100 # SQUIDs 15 mK tunnel resistance
-
-    tuner = SQUIDmatch(ZL, l, a, RN, Delta, CJ, A, C)
-    return abs(tuner.Zres - tuner.th_Zres)
+from results import RESULT_DTYPE, saveResults
+from design_cache import DesignCache, matchedDesigns
+from instrumentation import instrumentation
+from junction_models import getModel
+from RFSET_Matching_Optimization import SQUID_ImpedanceMatching as SQUIDmatch
 
 
     
@@ -32,152 +23,123 @@ if __name__== "__main__":
     d = list(range(3, 11, 1))    # Distance between neighbouring SQUIDs in um
     Delta = 180e-6               # Superconducting gap in eV
     C = 84.3                     # cpw lineic capacitance in pF/m
+    instrument = False           # Record call counts and time per stage, the report is
+                                 # printed at the end and the log saved next to the results
+    cache_path = None            # e.g. "RFSET_designs.npz": matched designs already computed are
+                                 # read from this cache instead of being optimized again. The
+                                 # matching of the linear models is analytic, so it is off by default
+    if instrument:
+        instrumentation.enable()
 
-    line = []
-    line.append("# ZL = " + str(ZL) + " ohm" + "\n")
-    line.append("# Number of SQUIDS = " + str(squids) + "\n")
-    line.append("# Superconducting gap Delta = " + str(Delta) + " eV" + "\n")
-    line.append("# CPW lineic capacitance = " + str(C) + " pF/m" + "\n")
+    metadata = {}
+    metadata['ZL'] = ZL                   # ohm
+    metadata['Number of SQUIDS'] = squids
+    metadata['Delta'] = Delta             # Superconducting gap in eV
+    metadata['C'] = C                     # CPW lineic capacitance in pF/m
                 
-    # Choose what oxidation do you want to consider in the calculation
+    # Choose what oxidation do you want to consider in the calculation: it is
+    # the name of a junction model in junction_models.MODELS, the two oxidations
+    # are 'INRIM' and 'Lotkhov'
     
-    oxidation = 1
+    junction_model = 'Lotkhov'
     
-    if oxidation == 0:
-        from RFSET_Matching_Optimization import SQUID_ImpedanceMatching as SQUIDmatch
-        
-        CJ = 4.46741e-14      # SQUID capacitance in F/um^2 according to L. Wang, "Fabrication
-                              # stability of josephson junctions for superconducting qubits"
-        coeff_R_N = 33.81     # SQIDs room temperature tunnel resistance
-                              # according to V. Ambegaokar, A. Baratoff, "Tunneling
-                              # between superconductors", 1963
-        line.append("# Normal resistance at room temperature = " + str(coeff_R_N) + "/A ohm with junctin area A in um^2" + "\n")
-        line.append("# Critical current = 8.47475*A uA with junctin area A in um^2" + "\n")
-        line.append("# Junction capacitance = " + str(CJ) + "*A F with junctin area A in um^2" + "\n")
-    else:
-        from RFSET_Matching_Optimization import SQUID_ImpedanceMatching2 as SQUIDmatch
-        
-        CJ = 7.5e-14          # SQUID capacitance in F/um^2 according to S. V. Lotkhov, E. M. Tolkacheva,
-                              # D. V. Balashov, M. I. Khabipov, F.-I. Buchholz and A. B. Zorin
-                              # "Low hysteretic behavior of Al/AlOx/Al Josephson junctions"
-                              # Applied Physics Letters, 89, 132115 (2006)
-        coeff_R_N = 22.0      # SQIDs room temperature tunnel resistance
-                              # according to the same paper
-                              
-        line.append("# Normal resistance at room temperature = " + str(coeff_R_N) + "/A ohm with junctin area A in um^2" + "\n")
-        line.append("# Critical current = 10.0*A uA with junctin area A in um^2" + "\n")
-        line.append("# Junction capacitance = " + str(CJ) + "*A F with junctin area A in um^2" + "\n")
-    line.append("#\n")
-    line.append("# Distance between neighbouring SQUIDs / um"+"\t"+"Junctin area / um^2"+"\t"+"IC / A"+"\t"+"Normal Resistance T amb / ohm"+"\t"+"Normal Resistance at mK / ohm"+"\t"+"Junction Capacitance / F"+"\t"+"SQUID Inductance Lj / H"+"\t"+"SQUID Array Lineic Inductance / H/m"+"\t"+"Plasma Frequency / Hz"+"\t"+"Resoance Frequency / Hz"+"\t"+"Z1 / ohm"+"\t"+"Theoretical Zres / ohm"+"\t"+"Actual Zres / ohm"+"\t"+"Theoretical Q / ohm"+"\t"+"Actual Q / ohm"+"\t"+"Minimization godness / %"+"\t"+"Minimization success"+"\n")
-                
-    linenumber = list(range(len(line)))
+    model = getModel(junction_model)
+    CJ = model.cj                 # SQUID capacitance in F/um^2
+    coeff_R_N = model.coeff_R_N   # SQIDs room temperature tunnel resistance coefficient in ohm*um^2
+    metadata['junction model'] = junction_model
+    metadata['reference'] = model.reference
+    metadata['Critical current'] = model.description()
+    metadata['Normal resistance at room temperature'] = str(coeff_R_N) + "/A ohm with junctin area A in um^2"
+    metadata['Junction capacitance'] = str(CJ) + "*A F with junctin area A in um^2"
+    metadata['coeff_R_N'] = coeff_R_N
+    metadata['CJ'] = CJ
 
-    filename = "RFSET_Matching_ox"+str(oxidation)+"_ZL"+str(ZL)+"_N"+str(squids)+".txt"
-    text_file = open(filename, "w")
-    for i in linenumber:
-        text_file.write(line[i])
-    text_file.close()
-    
-    junctionArea = []
-    ic = []
-    normalResistanceTamb = []
-    normalResistance_mK = []
-    junctionCapacitance = []
-    SQUIDInductance = []
-    SQUIDArrayLineicInductance = []
-    plasmaFrequency = []
-    resonanceFrequency = []
-    z1 = []
-    theoreticalZres = []
-    actualZres = []
-    theoreticalQ = []
-    actualQ = []
-    gd = []
-    success = []
+    # Results are stored in a record array with one row per distance and saved
+    # in binary form, use results.loadResults to read them back
+    filename = "RFSET_Matching_"+junction_model+"_ZL"+str(ZL)+"_N"+str(squids)+".npy"
+    results = np.zeros(len(d), dtype=RESULT_DTYPE)
     
     # Being A the parameter of the optimization, it is in um^2 and can vary
-    # betwen teh value defined in "bounds"
-    for a in d:
+    # betwen teh value defined in "bounds". The matched areas for all the
+    # distances are found in a single call
+    cache = DesignCache(cache_path) if cache_path else None
+    with instrumentation.stage('optimization'):
+        match = matchedDesigns(squids, np.array(d)*1e-6, ZL, C, CJ, model, bounds=(0.0025, 5), xatol=1e-10,
+                               cache=cache, cls=SQUIDmatch)
+    if cache is not None:
+        instrumentation.event('cache', hits=cache.hits, misses=cache.misses)
+        cache.close()
+    for i, a in enumerate(d):
         a = a*1e-6 # Transform the distance between neighbouring SQUIDs in m
-        res = minimize_scalar(f, bounds=(0.0025, 5), args=(squids, ZL, a, Delta, CJ, C), method='bounded', options={'xatol': 1e-10, 'maxiter': 500, 'disp': 0})
-        A = res.x   # Single Junctin area in um^2 coming from minimization
-        junctionArea.append(A)
+        A = match['A'][i]   # Single Junctin area in um^2 coming from the matching solver
         
         l = squids*a     # SQUID array length in m
         R_N = coeff_R_N / A
         RN = R_N + R_N*17/100 # SQUIDs 15 mK tunnel resistance
         
-        tuner = SQUIDmatch(ZL, l, a, RN, Delta, CJ, A, C)
-        goodness = (abs(tuner.Zres-tuner.th_Zres)/tuner.th_Zres)*100
+        with instrumentation.stage('construction'):
+            tuner = SQUIDmatch(ZL, l, a, RN, Delta, CJ, A, C, model=model)
+            goodness = (abs(tuner.Zres-tuner.th_Zres)/tuner.th_Zres)*100
+        instrumentation.event('design', distance=d[i], A=A, goodness=goodness)
 
-        if goodness < 0.035:
-            success.append(True)
-        else:
-            success.append(False)
-            
-        ic.append(tuner.Ic)
-        normalResistanceTamb.append(R_N)
-        normalResistance_mK.append(RN)
-        junctionCapacitance.append(CJ*A)
-        SQUIDInductance.append(tuner.LJ)
-        SQUIDArrayLineicInductance.append(tuner.L)
-        plasmaFrequency.append(tuner.fp)
-        resonanceFrequency.append(tuner.fn)
-        z1.append(tuner.Z1)
-        theoreticalZres.append(tuner.th_Zres)
-        actualZres.append(tuner.Zres)
-        theoreticalQ.append(tuner.th_Q)
-        actualQ.append(tuner.Q)
-        gd.append(goodness)
-        #print("Goodness: ", a, A, goodness, "%", success)
+        row = results[i]
+        row['distance'] = d[i]
+        row['A'] = A
+        row['Ic'] = tuner.Ic
+        row['RN_Tamb'] = R_N
+        row['RN_mK'] = RN
+        row['CJ'] = CJ*A
+        row['LJ'] = tuner.LJ
+        row['L'] = tuner.L
+        row['fp'] = tuner.fp
+        row['fn'] = tuner.fn
+        row['Z1'] = tuner.Z1
+        row['th_Zres'] = tuner.th_Zres
+        row['Zres'] = tuner.Zres
+        row['th_Q'] = tuner.th_Q
+        row['Q'] = tuner.Q
+        row['goodness'] = goodness
+        row['success'] = goodness < 0.035
+        #print("Goodness: ", a, A, goodness, "%", row['success'])
         
-    with open(filename, 'a', newline='') as f:
-        writer = csv.writer(f, delimiter='\t')
-        writer.writerows(zip(d,junctionArea,ic,normalResistanceTamb,normalResistance_mK,junctionCapacitance,SQUIDInductance,SQUIDArrayLineicInductance,plasmaFrequency,resonanceFrequency,z1,theoreticalZres,actualZres,theoreticalQ,actualQ,gd,success))
-    f.close()
+    with instrumentation.stage('writer'):
+        saveResults(filename, results, metadata)
        
     # Make a 3D plot of Resonance Frequency vs Distance between neighbouring SQUIDs and Number of flux quanta
     
     n_flux_quanta = [x * 0.25 for x in range(0, 26)] # it's the cosine argument in the Ic equation
 
-    resonance_vs_fluxquanta = []
+    resonance_vs_fluxquanta = np.empty((len(d), len(n_flux_quanta)))
     
-    for a in d:
-        A = junctionArea[d.index(a)]
+    for i, a in enumerate(d):
+        A = results['A'][i]
         R_N = coeff_R_N / A
         RN = R_N + R_N*17/100
         a = a*1e-6
         l = squids*a
         
-        resonance = []
-        
-        for flux in n_flux_quanta:
-            tuner = SQUIDmatch(ZL, l, a, RN, Delta, CJ, A, C, flux_quanta=flux)
-            resonance.append(tuner.fn)
-        resonance_vs_fluxquanta.append(resonance)
+        # Flux independent quantities are computed once, fn is rescaled for every flux
+        with instrumentation.stage('flux map'):
+            tuner = SQUIDmatch(ZL, l, a, RN, Delta, CJ, A, C, model=model)
+            resonance = tuner.tuningCurve(n_flux_quanta)['fn']
+        resonance_vs_fluxquanta[i] = resonance
         
     y = np.array(d)
     x = np.array(n_flux_quanta)
     
     X, Y = np.meshgrid(x, y)
-    Z = np.array(resonance_vs_fluxquanta)/1e9
+    Z = resonance_vs_fluxquanta/1e9
+
+    if instrument:
+        print(instrumentation.summary())
+        instrumentation.writeLog(filename.replace(".npy", ".log.jsonl"))
     
-    fig = plt.figure(num=None, figsize=(10, 10), dpi=80, facecolor='w', edgecolor='k')
-    ax = plt.axes(projection='3d')
-    #ax.contour3D(X, Y, Z, 50, cmap='binary')
-    ax.plot_surface(X, Y, Z, rstride=1, cstride=1, cmap='viridis', edgecolor='none')
-    ax.set_ylabel('Distance between neighbouring SQUIDs / um')
-    ax.set_xlabel('Cosine argument in the Ic equation / radians')
-    ax.set_zlabel('Resonance Frequency / GHz');
-    ax.view_init(45, 35)
-    ax.ticklabel_format(axis="z", style="plain", scilimits=(0,0))
+    import plotting # matplotlib is only imported when the figures are drawn
+    plotting.fluxMap(X, Y, Z)
     
     # Plot Resonance Frequency vs number of flux quanta for fixed values of the other parameters by slicing the previous 3D plot
     # at a fixed distance between neighbouring SQUIDs in um
     
     distance = 7 # chosen distance between neighbouring SQUIDs in um
     slice = d.index(distance)
-    fig1 = plt.figure()
-    ax1 = plt.plot(n_flux_quanta,Z[slice,:])
-    plt.ylabel('Resonance Frequency / GHz')
-    plt.xlabel('Cosine argument in the Ic equation / radians')
\ No newline at end of file
+    plotting.fluxSlice(n_flux_quanta, Z[slice,:])
\ No newline at end of file
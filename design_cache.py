@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 18:05:47 2026
+
+@author: feynman
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+from RFSET_Matching_Optimization import SQUID_ImpedanceMatching, QUANTITIES, GOODNESS_THRESHOLD
+from junction_models import getModel
+
+# Persistent cache of matched designs. Every design point is addressed by
+# everything its matching depends on: the sha256 digest of the state shared by
+# a sweep (class, junction model with all its parameters, Z0, bounds and
+# tolerance) followed by the bytes of N, a, ZL, C, CJ and flux, so the keys of
+# a whole sweep are built with array operations. The gap is the one of the
+# model, already covered by its parameters.
+# The cache is saved next to the results, so it survives between runs.
+
+KEY_DTYPE = np.dtype('V80') # 32 bytes of sha256 digest + 6 float64
+
+DESIGN_DTYPE = np.dtype([('A', 'f8')] + [(q, 'f8') for q in QUANTITIES] + [('goodness', 'f8'), ('success', '?')])
+
+def designKeys(cls, model, N, a, ZL, C, CJ, Z0=50., flux_quanta=0., bounds=(0.0025, 5), xatol=1e-10):
+    '''
+    Content addresses of design points
+    --------------------------------
+    Parameters:
+    cls         : SQUID_ImpedanceMatching or child class
+    model       : str or JunctionModel
+    N, a, ZL, C, CJ, flux_quanta : float or array, broadcast against each other
+    Z0, bounds, xatol : as in SQUID_ImpedanceMatching.matchedArea
+    --------------------------------
+    Returns:
+    keys : array with KEY_DTYPE, one per design point of the flattened broadcast shape
+    '''
+    model = getModel(model)
+    state = json.dumps({'class': cls.__name__, 'model': type(model).__name__,
+                        'parameters': {k: repr(v) for k, v in sorted(vars(model).items())},
+                        'Z0': repr(float(Z0)), 'bounds': [repr(float(b)) for b in bounds],
+                        'xatol': repr(float(xatol))}, sort_keys=True)
+    points = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (N, a, ZL, C, CJ, flux_quanta)])
+    points = np.stack([p.ravel() for p in points], axis=-1) + 0. # -0. and 0. give the same key
+    keys = np.empty((len(points), KEY_DTYPE.itemsize), dtype=np.uint8)
+    keys[:, :32] = np.frombuffer(hashlib.sha256(state.encode()).digest(), dtype=np.uint8)
+    keys[:, 32:] = points.view(np.uint8)
+    return keys.view(KEY_DTYPE)[:, 0]
+
+class DesignCache:
+    '''
+    On-disk, content addressed cache of matched designs with LRU eviction.
+    The entries are kept in memory as arrays sorted by key, so whole sweeps
+    are looked up with one searchsorted, and saved in a .npz file by save()
+    or on close. Every lookup marks the entries found as recently used; when
+    the cache grows beyond max_entries the least recently used are evicted.
+    '''
+
+    def __init__(self, path='designs.npz', max_entries=10**6):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.keys = np.empty(0, dtype=KEY_DTYPE)        # sorted
+        self.records = np.empty(0, dtype=DESIGN_DTYPE)
+        self.used = np.empty(0, dtype=np.int64)         # clock of the last use
+        self._clock = 0
+        if os.path.exists(path):
+            with np.load(path) as data:
+                if data['keys'].dtype == KEY_DTYPE: # caches with older keys are started afresh
+                    self.keys, self.records, self.used = data['keys'], data['records'], data['used']
+            self._clock = int(self.used.max(initial=0))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _find(self, keys):
+        pos = np.searchsorted(self.keys, keys)
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == keys[found]
+        return pos, found
+
+    def get(self, keys):
+        '''
+        Looks up design points and marks the ones found as recently used
+        --------------------------------
+        Parameters:
+        keys : array with KEY_DTYPE Content addresses, see designKeys
+        --------------------------------
+        Returns:
+        found   : bool array (len(keys),)
+        records : array with DESIGN_DTYPE (len(keys),), valid where found
+        '''
+        keys = np.asarray(keys, dtype=KEY_DTYPE)
+        pos, found = self._find(keys)
+        records = np.zeros(len(keys), dtype=DESIGN_DTYPE)
+        records[found] = self.records[pos[found]]
+        self._clock += 1
+        self.used[pos[found]] = self._clock
+        self.hits += int(found.sum())
+        self.misses += int((~found).sum())
+        return found, records
+
+    def put(self, keys, records):
+        '''
+        Stores design points, then evicts the least recently used entries
+        beyond max_entries
+        --------------------------------
+        Parameters:
+        keys    : array with KEY_DTYPE Content addresses
+        records : array with DESIGN_DTYPE
+        --------------------------------
+        Returns:
+        None
+        '''
+        keys = np.asarray(keys, dtype=KEY_DTYPE)
+        records = np.asarray(records, dtype=DESIGN_DTYPE)
+        keys, unique = np.unique(keys, return_index=True)
+        records = records[unique]
+        pos, found = self._find(keys)
+        self._clock += 1
+        self.records[pos[found]] = records[found]
+        self.used[pos[found]] = self._clock
+        new = ~found
+        keys = np.concatenate([self.keys, keys[new]])
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.records = np.concatenate([self.records, records[new]])[order]
+        self.used = np.concatenate([self.used, np.full(int(new.sum()), self._clock)])[order]
+        excess = len(self.keys) - self.max_entries
+        if excess > 0:
+            keep = np.sort(np.argsort(self.used, kind='stable')[excess:])
+            self.keys, self.records, self.used = self.keys[keep], self.records[keep], self.used[keep]
+
+    def save(self):
+        '''
+        Writes the cache to its file, replacing it only once complete
+        '''
+        tmp = self.path + ".%i.tmp" % os.getpid()
+        with open(tmp, 'wb') as f:
+            np.savez(f, keys=self.keys, records=self.records, used=self.used)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        self.keys = self.keys[:0]
+        self.records = self.records[:0]
+        self.used = self.used[:0]
+
+    def close(self):
+        self.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def matchedDesigns(N, a, ZL, C, CJ=None, model='INRIM', Z0=50., flux_quanta=0.,
+                   bounds=(0.0025, 5), xatol=1e-10, cache=None, cls=SQUID_ImpedanceMatching):
+    '''
+    Matched junction area and derived quantities of design points, computing
+    only the ones missing from the cache. The area is matched at flux_quanta.
+    --------------------------------
+    Parameters:
+    N, a, ZL, C        : float or array Number of SQUIDs, distance between neighbouring
+                         SQUIDs in m, load impedance in ohm, lineic capacitance in pF/m
+    CJ                 : float or array SQUID capacitance in F/um^2, default the one of the model
+    model              : str or JunctionModel
+    Z0, flux_quanta, bounds, xatol : as in SQUID_ImpedanceMatching.matchedArea
+    cache              : DesignCache or None to always compute
+    cls                : SQUID_ImpedanceMatching or child class
+    --------------------------------
+    Returns:
+    res : record array with DESIGN_DTYPE and the broadcast shape of the design points
+    '''
+    model = getModel(model)
+    CJ = model.cj if CJ is None else CJ
+    N, a, ZL, C, CJ, flux_quanta = np.broadcast_arrays(
+        *[np.asarray(x, dtype=float) for x in (N, a, ZL, C, CJ, flux_quanta)])
+    shape = N.shape
+    N, a, ZL, C, CJ, flux_quanta = (x.ravel() for x in (N, a, ZL, C, CJ, flux_quanta))
+    if cache is not None:
+        keys = designKeys(cls, model, N, a, ZL, C, CJ, Z0, flux_quanta, bounds, xatol)
+        found, res = cache.get(keys)
+    else:
+        found, res = np.zeros(len(N), dtype=bool), np.zeros(len(N), dtype=DESIGN_DTYPE)
+    todo = ~found
+    if np.any(todo):
+        match = cls.matchedArea(ZL[todo], a[todo], C[todo], CJ[todo], Z0=Z0, flux_quanta=flux_quanta[todo],
+                                bounds=bounds, xatol=xatol, model=model)
+        q = cls.batch(ZL[todo], N[todo]*a[todo], a[todo], CJ[todo], match['A'], C[todo], Z0=Z0,
+                      flux_quanta=flux_quanta[todo], model=model)
+        new = np.empty(int(todo.sum()), dtype=DESIGN_DTYPE)
+        new['A'] = match['A']
+        for name in QUANTITIES:
+            new[name] = q[name]
+        new['goodness'] = match['goodness']
+        new['success'] = match['goodness'] < GOODNESS_THRESHOLD
+        res[todo] = new
+        if cache is not None:
+            cache.put(keys[todo], new)
+    return res.reshape(shape)
+
+
+
+if __name__== "__main__":
+    import tempfile
+    import time
+
+    # The matching of models without analytic inverse is a bisection: these
+    # are the sweeps the cache pays off for
+    class Bisected(SQUID_ImpedanceMatching):
+        def _criticalCurrent(self, A):
+            return self.model.Ic(A, self.flux_quanta)
+
+    path = os.path.join(tempfile.mkdtemp(), 'designs.npz')
+    d = np.arange(1, 20.5, 0.05)*1e-6
+    N = np.arange(10, 1001, 10)[:, None]
+    with DesignCache(path) as cache:
+        start = time.perf_counter()
+        matchedDesigns(N, d, 100e3, 84.3, model='Lotkhov', cache=cache, cls=Bisected)
+        print("First sweep of %i designs: %.3f s" % (N.size*d.size, time.perf_counter() - start))
+        start = time.perf_counter()
+        N = np.arange(10, 1101, 10)[:, None]
+        matchedDesigns(N, d, 100e3, 84.3, model='Lotkhov', cache=cache, cls=Bisected)
+        print("Sweep extended by 10%%: %.3f s, %i hits, %i misses" % (time.perf_counter() - start, cache.hits, cache.misses))
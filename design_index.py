@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 14:02:15 2026
+
+@author: feynman
+"""
+
+import hashlib
+import json
+import numpy as np
+from RFSET_Matching_Optimization import SQUID_ImpedanceMatching
+from junction_models import getModel
+
+# Inverse design: which geometries (A, a, N) give a resonance frequency in
+# [f1, f2] while staying matched?
+#
+# With l = N*a, Zres only depends on (A, a) and fn*N only depends on (A, a), so
+# the index stores, for every junction model, Zres and fn*N on a grid of
+# distances a and (log spaced) junction areas A. Both are monotonic in A, so a
+# query finds for every (a, N) the interval of areas fulfilling both conditions
+# by interpolating the grid in log scale, without evaluating the model again.
+
+QUERY_DTYPE = np.dtype([('model', 'U32'), ('a', 'f8'), ('N', 'i8'), ('A_min', 'f8'), ('A_max', 'f8'),
+                        ('A', 'f8'), ('fn', 'f8'), ('goodness', 'f8')])
+
+def _fingerprint(model, params):
+    '''
+    Hash of the junction model parameters and of the grid, used to rebuild
+    only the blocks of the index that changed
+    '''
+    state = {'class': type(model).__name__,
+             'model': {k: repr(v) for k, v in sorted(vars(model).items())},
+             'params': params}
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+def _crossing(x, y, target):
+    '''
+    Interpolates, row by row, the x where the increasing rows of y reach target
+    --------------------------------
+    Parameters:
+    x      : array (n,) increasing
+    y      : array (rows, n) increasing along the rows
+    target : array (rows, k) values to reach
+    --------------------------------
+    Returns:
+    x_cross : array (rows, k), clipped to the ends of x
+    '''
+    j = np.empty(target.shape, dtype=np.int64)
+    for i in range(y.shape[0]):
+        j[i] = np.searchsorted(y[i], target[i])
+    j = np.clip(j, 1, len(x) - 1)
+    rows = np.arange(y.shape[0])[:, None]
+    y0, y1 = y[rows, j - 1], y[rows, j]
+    t = np.clip((target - y0)/(y1 - y0), 0, 1)
+    return x[j - 1] + t*(x[j] - x[j - 1])
+
+def _interp(x, y, rows, xq):
+    '''
+    Linear interpolation of the rows of y, all sampled at the same x
+    --------------------------------
+    Parameters:
+    x    : array (n,) increasing
+    y    : array (rows, n)
+    rows : int array Row of y of every query point
+    xq   : array Query points, same shape as rows
+    --------------------------------
+    Returns:
+    yq : array, same shape as xq
+    '''
+    j = np.clip(np.searchsorted(x, xq), 1, len(x) - 1)
+    t = (xq - x[j - 1])/(x[j] - x[j - 1])
+    return y[rows, j - 1]*(1 - t) + y[rows, j]*t
+
+class DesignIndex:
+    '''
+    Precomputed index of the design space of one or more junction models,
+    answering "all (A, a, N) with fn in [f1, f2] and goodness < x" queries.
+    '''
+
+    def __init__(self, models=('INRIM', 'Lotkhov'), a=np.arange(1, 20.5, 0.5)*1e-6,
+                 A=np.geomspace(0.0025, 5, 2048), N=np.arange(1, 1001), ZL=100e3, C=84.3, Z0=50.):
+        self.models = [getModel(m).name for m in models]
+        self.a = np.asarray(a, dtype=float)      # Distance between neighbouring SQUIDs in m
+        self.A = np.asarray(A, dtype=float)      # Junction areas in um^2, increasing
+        self.N = np.asarray(N, dtype=np.int64)   # Numbers of SQUIDs
+        self.ZL = ZL
+        self.C = C
+        self.Z0 = Z0
+        self.blocks = {} # model name -> dict with fingerprint, log Zres and log fn*N grids
+
+    def _params(self):
+        return {'a': self.a.tolist(), 'A': self.A.tolist(), 'ZL': self.ZL, 'C': self.C, 'Z0': self.Z0}
+
+    def build(self):
+        '''
+        Computes the blocks of the models whose parameters or grid changed
+        since the last build and keeps the others
+        --------------------------------
+        Parameters:
+        None
+        --------------------------------
+        Returns:
+        rebuilt : list of the names of the models that have been recomputed
+        '''
+        params = self._params()
+        rebuilt = []
+        for name in self.models:
+            model = getModel(name)
+            fingerprint = _fingerprint(model, params)
+            block = self.blocks.get(name)
+            if block is not None and block['fingerprint'] == fingerprint:
+                continue
+            # l = a so that fn is the resonance frequency of a single SQUID, fn*N
+            res = SQUID_ImpedanceMatching.batch(self.ZL, self.a[:, None], self.a[:, None], model.cj,
+                                                self.A[None, :], self.C, Z0=self.Z0, model=model)
+            self.blocks[name] = {'fingerprint': fingerprint,
+                                 'th_Zres': float(res['th_Zres'].flat[0]),
+                                 'logZres': np.log(res['Zres']),
+                                 'logfN': np.log(res['fn'])}
+            rebuilt.append(name)
+        for name in list(self.blocks):
+            if name not in self.models:
+                del self.blocks[name]
+        return rebuilt
+
+    def query(self, f1, f2, max_goodness=0.035, models=None, N=None):
+        '''
+        Finds all the geometries with first resonance frequency in [f1, f2]
+        and matching goodness below max_goodness
+        --------------------------------
+        Parameters:
+        f1, f2       : float Resonance frequency band in Hz
+        max_goodness : float Largest |Zres - th_Zres|/th_Zres in %
+        models       : list of model names, default all the models of the index
+        N            : list of numbers of SQUIDs, default the ones of the index
+        --------------------------------
+        Returns:
+        res : record array with QUERY_DTYPE, one record for every (model, a, N)
+              with its interval of junction areas [A_min, A_max], the area A
+              closest to the matching inside the interval and fn and goodness at A
+        '''
+        N = self.N if N is None else np.atleast_1d(np.asarray(N, dtype=np.int64))
+        logA = np.log(self.A)
+        out = []
+        for name in models or self.models:
+            block = self.blocks[name]
+            th = block['th_Zres']
+            # Zres decreases with A: the matched interval is where -log(Zres) is
+            # between -log(th*(1 + x)) and -log(th*(1 - x))
+            x = max_goodness/100
+            g_lo, g_hi = np.log(th*(1 + x)), np.log(th*max(1 - x, 1e-300))
+            target = -np.array([g_lo, g_hi])
+            matched = _crossing(logA, -block['logZres'], np.broadcast_to(target, (len(self.a), 2)))
+            best = _crossing(logA, -block['logZres'], np.full((len(self.a), 1), -np.log(th)))[:, 0]
+            # fn*N increases with A
+            target = np.log(np.concatenate([f1*N, f2*N]))
+            band = _crossing(logA, block['logfN'], np.broadcast_to(target, (len(self.a), 2*len(N))))
+            lo = np.maximum(matched[:, :1], band[:, :len(N)])
+            hi = np.minimum(matched[:, 1:], band[:, len(N):])
+            # The crossings are clipped to the grid: check the end points really
+            # fulfill both conditions
+            rows = np.broadcast_to(np.arange(len(self.a))[:, None], lo.shape)
+            eps = 1e-9
+            ok = ((lo <= hi)
+                  & (_interp(logA, block['logfN'], rows, lo) >= np.log(f1*N) - eps)
+                  & (_interp(logA, block['logfN'], rows, hi) <= np.log(f2*N) + eps)
+                  & (_interp(logA, block['logZres'], rows, lo) <= g_lo + eps)
+                  & (_interp(logA, block['logZres'], rows, hi) >= g_hi - eps))
+            i, k = np.nonzero(ok)
+            logA_best = np.clip(best[i], lo[i, k], hi[i, k])
+            rec = np.empty(len(i), dtype=QUERY_DTYPE)
+            rec['model'] = name
+            rec['a'] = self.a[i]
+            rec['N'] = N[k]
+            rec['A_min'] = np.exp(lo[i, k])
+            rec['A_max'] = np.exp(hi[i, k])
+            rec['A'] = np.exp(logA_best)
+            rec['fn'] = np.exp(_interp(logA, block['logfN'], i, logA_best))/N[k]
+            rec['goodness'] = abs(np.exp(_interp(logA, block['logZres'], i, logA_best)) - th)/th*100
+            out.append(rec)
+        return np.concatenate(out) if out else np.empty(0, dtype=QUERY_DTYPE)
+
+    def save(self, path):
+        '''
+        Saves the index in a .npz file
+        '''
+        arrays = {'a': self.a, 'A': self.A, 'N': self.N}
+        header = {'models': self.models, 'ZL': self.ZL, 'C': self.C, 'Z0': self.Z0, 'blocks': {}}
+        for i, (name, block) in enumerate(self.blocks.items()):
+            header['blocks'][name] = {'fingerprint': block['fingerprint'], 'th_Zres': block['th_Zres'], 'key': i}
+            arrays['logZres_%i' % i] = block['logZres']
+            arrays['logfN_%i' % i] = block['logfN']
+        np.savez(path, header=json.dumps(header), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Loads an index saved by save. Call build() afterwards to recompute the
+        blocks of the models whose parameters changed in the meantime.
+        '''
+        with np.load(path) as data:
+            header = json.loads(str(data['header']))
+            index = cls(header['models'], data['a'], data['A'], data['N'], header['ZL'], header['C'], header['Z0'])
+            for name, block in header['blocks'].items():
+                index.blocks[name] = {'fingerprint': block['fingerprint'], 'th_Zres': block['th_Zres'],
+                                      'logZres': data['logZres_%i' % block['key']],
+                                      'logfN': data['logfN_%i' % block['key']]}
+        return index
+
+
+
+if __name__== "__main__":
+    import time
+
+    index = DesignIndex()
+    start = time.perf_counter()
+    index.build()
+    print("Index built in", time.perf_counter() - start, "s")
+
+    start = time.perf_counter()
+    res = index.query(5.9e9, 6.1e9, max_goodness=0.035)
+    print(len(res), "geometries with 5.9 GHz < fn < 6.1 GHz found in", time.perf_counter() - start, "s")
+    print(res[:10])
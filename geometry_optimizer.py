@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 14:48:30 2026
+
+@author: feynman
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from RFSET_Matching_Optimization import SQUID_ImpedanceMatching
+from junction_models import getModel
+
+# Joint optimization of the geometry of the SQUID array: junction area A,
+# distance between neighbouring SQUIDs a, number of SQUIDs N (integer) and,
+# optionally, the flux bias. The objectives, all minimized, are
+#   goodness : |Zres - th_Zres|/th_Zres in %
+#   fn_error : |fn - f_target|/f_target
+#   shortfall: max(0, min_margin - fp/fn)/min_margin, how much the margin
+#              between plasma and resonance frequency misses its target
+# A population is evolved with a non-dominated sorting genetic algorithm
+# (NSGA-II); every generation is evaluated in one vectorized call to the model.
+
+PARETO_DTYPE = np.dtype([('A', 'f8'), ('a', 'f8'), ('N', 'i8'), ('flux', 'f8'), ('fn', 'f8'), ('fp', 'f8'),
+                         ('Zres', 'f8'), ('goodness', 'f8'), ('fn_error', 'f8'), ('margin', 'f8')])
+
+def evaluate(A, a, N, flux, f_target, min_margin=5., model='INRIM', ZL=100e3, C=84.3, Z0=50.):
+    '''
+    Evaluates the objectives of a population
+    --------------------------------
+    Parameters:
+    A, a, N, flux : arrays Junction area in um^2, distance between neighbouring
+                    SQUIDs in m, number of SQUIDs and cosine argument in the Ic equation
+    f_target      : float Desired first resonance frequency in Hz
+    min_margin    : float Desired minimum of fp/fn
+    model         : str or JunctionModel
+    ZL, C, Z0     : float Load impedance in ohm, lineic capacitance in pF/m and
+                    characteristic impedance in ohm
+    --------------------------------
+    Returns:
+    objectives : array (len(A), 3) goodness, fn_error and margin shortfall
+    res        : dict of arrays with the derived quantities
+    '''
+    model = getModel(model)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        res = SQUID_ImpedanceMatching.batch(ZL, N*a, a, model.cj, A, C, Z0=Z0, flux_quanta=flux, model=model)
+        goodness = abs(res['Zres'] - res['th_Zres'])/res['th_Zres']*100
+        fn_error = abs(res['fn'] - f_target)/f_target
+        shortfall = np.maximum(min_margin - res['fp']/res['fn'], 0)/min_margin
+    objectives = np.stack([goodness, fn_error, shortfall], axis=-1)
+    return np.nan_to_num(objectives, nan=np.inf), res
+
+def _evaluateChunk(args):
+    return evaluate(*args)[0]
+
+BLOCK_ELEMENTS = 2**22 # booleans of one block of comparisons in nonDominatedRanks
+
+def nonDominatedRanks(F):
+    '''
+    Pareto rank of every point, 0 for the non-dominated front
+    --------------------------------
+    Parameters:
+    F : array (P, M) objectives to minimize
+    --------------------------------
+    Returns:
+    rank : int array (P,)
+    '''
+    # The P x P dominance matrix is built row block by row block, so the
+    # comparisons never take more than block_size x P x M booleans
+    P = len(F)
+    block_size = max(1, BLOCK_ELEMENTS//max(1, P*F.shape[-1]))
+    dominates = np.empty((P, P), dtype=bool)   # dominates[i, j]: i dominates j
+    for start in range(0, P, block_size):
+        block = F[start:start + block_size, None, :]
+        dominates[start:start + block_size] = (np.all(block <= F[None, :, :], axis=-1)
+                                               & np.any(block < F[None, :, :], axis=-1))
+    count = dominates.sum(axis=0)           # number of points dominating j
+    rank = np.full(len(F), -1)
+    current = 0
+    front = count == 0
+    while np.any(front):
+        rank[front] = current
+        count = count - dominates[front].sum(axis=0)
+        count[rank >= 0] = -1
+        front = count == 0
+        current += 1
+    return rank
+
+def crowdingDistance(F, rank):
+    '''
+    Crowding distance of every point inside its front
+    --------------------------------
+    Parameters:
+    F    : array (P, M) objectives
+    rank : int array (P,) Pareto ranks
+    --------------------------------
+    Returns:
+    distance : array (P,), inf at the ends of the fronts
+    '''
+    distance = np.zeros(len(F))
+    for r in np.unique(rank):
+        idx = np.nonzero(rank == r)[0]
+        if len(idx) <= 2:
+            distance[idx] = np.inf
+            continue
+        f = F[idx]
+        order = np.argsort(f, axis=0)
+        fs = np.take_along_axis(f, order, axis=0)
+        span = fs[-1] - fs[0]
+        span[~(span > 0) | ~np.isfinite(span)] = 1.
+        gap = np.zeros_like(fs)
+        gap[1:-1] = (fs[2:] - fs[:-2])/span
+        gap[0] = gap[-1] = np.inf
+        d = np.zeros_like(fs)
+        np.put_along_axis(d, order, gap, axis=0)
+        distance[idx] = d.sum(axis=1)
+    return distance
+
+class GeometryOptimizer:
+    '''
+    Population based multi-objective optimizer of the SQUID array geometry.
+    Bounds are (min, max) tuples; flux=None keeps the array unbiased. With
+    processes > 1 every generation is split over a process pool.
+    '''
+
+    def __init__(self, f_target, min_margin=5., model='INRIM', A=(0.0025, 5), a=(1e-6, 20e-6), N=(10, 1000),
+                 flux=None, ZL=100e3, C=84.3, Z0=50., population=200, seed=None, processes=1):
+        self.f_target = f_target
+        self.min_margin = min_margin
+        self.model = getModel(model)
+        self.bounds = np.array([np.log(A), a, (N[0] - 0.5, N[1] + 0.4999), flux or (0., 0.)], dtype=float)
+        self.ZL = ZL
+        self.C = C
+        self.Z0 = Z0
+        self.population = population
+        self.rng = np.random.default_rng(seed)
+        self.processes = processes
+
+    def _decode(self, X):
+        # X in [0, 1]^4 -> A, a, N, flux
+        lo, hi = self.bounds[:, 0], self.bounds[:, 1]
+        P = lo + X*(hi - lo)
+        return np.exp(P[:, 0]), P[:, 1], np.rint(P[:, 2]).astype(np.int64), P[:, 3]
+
+    def _objectives(self, X):
+        A, a, N, flux = self._decode(X)
+        if self.processes <= 1:
+            return evaluate(A, a, N, flux, self.f_target, self.min_margin, self.model, self.ZL, self.C, self.Z0)[0]
+        chunks = np.array_split(np.arange(len(X)), self.processes)
+        args = [(A[c], a[c], N[c], flux[c], self.f_target, self.min_margin, self.model, self.ZL, self.C, self.Z0) for c in chunks]
+        return np.concatenate(list(self._pool.map(_evaluateChunk, args)))
+
+    def _offspring(self, X, rank, crowd):
+        P = len(X)
+        # Binary tournament on (rank, crowding distance)
+        i, j = self.rng.integers(P, size=(2, P))
+        better = (rank[i] < rank[j]) | ((rank[i] == rank[j]) & (crowd[i] > crowd[j]))
+        parents = np.where(better, i, j)
+        p1, p2 = X[parents], X[np.roll(parents, 1)]
+        # Simulated binary crossover and polynomial mutation in the normalized space
+        eta_c, eta_m = 15., 20.
+        u = self.rng.random(p1.shape)
+        beta = np.where(u <= 0.5, (2*u)**(1/(eta_c + 1)), (1/(2*(1 - u)))**(1/(eta_c + 1)))
+        swap = self.rng.random(p1.shape) < 0.5
+        child = 0.5*((1 + beta)*p1 + (1 - beta)*p2)
+        child = np.where(swap, 0.5*((1 - beta)*p1 + (1 + beta)*p2), child)
+        u = self.rng.random(child.shape)
+        delta = np.where(u < 0.5, (2*u)**(1/(eta_m + 1)) - 1, 1 - (2*(1 - u))**(1/(eta_m + 1)))
+        mutate = self.rng.random(child.shape) < 1/X.shape[1]
+        child = child + mutate*delta
+        return np.clip(child, 0, 1)
+
+    def run(self, generations=100):
+        '''
+        Evolves the population
+        --------------------------------
+        Parameters:
+        generations : int Number of generations
+        --------------------------------
+        Returns:
+        front : record array with PARETO_DTYPE, the non-dominated designs
+                sorted by goodness
+        '''
+        self._pool = ProcessPoolExecutor(self.processes) if self.processes > 1 else None
+        try:
+            X = self.rng.random((self.population, 4))
+            F = self._objectives(X)
+            for g in range(generations):
+                rank = nonDominatedRanks(F)
+                crowd = crowdingDistance(F, rank)
+                Y = self._offspring(X, rank, crowd)
+                X = np.concatenate([X, Y])
+                F = np.concatenate([F, self._objectives(Y)])
+                # Elitist selection: best fronts, then the least crowded points
+                rank = nonDominatedRanks(F)
+                crowd = crowdingDistance(F, rank)
+                keep = np.lexsort((-crowd, rank))[:self.population]
+                X, F = X[keep], F[keep]
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+        front = nonDominatedRanks(F) == 0
+        A, a, N, flux = self._decode(X[front])
+        F, res = evaluate(A, a, N, flux, self.f_target, self.min_margin, self.model, self.ZL, self.C, self.Z0)
+        rec = np.empty(len(A), dtype=PARETO_DTYPE)
+        rec['A'], rec['a'], rec['N'], rec['flux'] = A, a, N, flux
+        rec['fn'], rec['fp'], rec['Zres'] = res['fn'], res['fp'], res['Zres']
+        rec['goodness'], rec['fn_error'] = F[:, 0], F[:, 1]
+        rec['margin'] = res['fp']/res['fn']
+        _, unique = np.unique(rec[['A', 'a', 'N', 'flux']], return_index=True)
+        rec = rec[unique]
+        return rec[np.argsort(rec['goodness'])]
+
+
+
+if __name__== "__main__":
+    import time
+
+    start = time.perf_counter()
+    optimizer = GeometryOptimizer(6e9, min_margin=10., model='Lotkhov', N=(10, 200), population=200, seed=1)
+    front = optimizer.run(generations=100)
+    print(len(front), "Pareto optimal designs in", time.perf_counter() - start, "s")
+    print("Matched designs closest to the target frequency:")
+    matched = front[front['goodness'] < 1.]
+    print(matched[np.argsort(matched['fn_error'])][:10])
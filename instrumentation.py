@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 12:02:37 2026
+
+@author: feynman
+"""
+
+import contextlib
+import json
+import time
+
+class Instrumentation:
+    '''
+    Opt-in recorder of call counts, wall time per stage and events of the
+    calculation. It is disabled by default: count() and event() return at once
+    and stage() returns a shared do-nothing context manager, so the
+    instrumented code runs at full speed unless enable() is called.
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.counters = {}  # name -> number of calls
+        self.stages = {}    # name -> [calls, total, min, max] wall time in s
+        self.events = []    # structured log, one dict per event
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def count(self, name, n=1):
+        '''
+        Increments the counter name by n
+        '''
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def event(self, name, **fields):
+        '''
+        Adds an event with arbitrary JSON serializable fields to the log
+        '''
+        if self.enabled:
+            self.events.append(dict(fields, event=name, time=time.time()))
+
+    def stage(self, name):
+        '''
+        Context manager timing the enclosed block as stage name
+        '''
+        if not self.enabled:
+            return _NULL
+        return self._stage(name)
+
+    @contextlib.contextmanager
+    def _stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            s = self.stages.setdefault(name, [0, 0., float('inf'), 0.])
+            s[0] += 1
+            s[1] += elapsed
+            s[2] = min(s[2], elapsed)
+            s[3] = max(s[3], elapsed)
+            self.events.append({'event': 'stage', 'stage': name, 'seconds': elapsed, 'time': time.time()})
+
+    def summary(self):
+        '''
+        Human readable report of counters and stage timings
+        --------------------------------
+        Parameters:
+        None
+        --------------------------------
+        Returns:
+        report : str
+        '''
+        lines = ["%-24s %10s %12s %12s %12s %12s" % ("Stage", "calls", "total / s", "mean / s", "min / s", "max / s")]
+        for name, (calls, total, tmin, tmax) in self.stages.items():
+            lines.append("%-24s %10i %12.6f %12.3e %12.3e %12.3e" % (name, calls, total, total/calls, tmin, tmax))
+        lines.append("")
+        lines.append("%-24s %10s" % ("Counter", "calls"))
+        for name, n in self.counters.items():
+            lines.append("%-24s %10i" % (name, n))
+        return "\n".join(lines)
+
+    def writeLog(self, path):
+        '''
+        Writes the events as JSON lines, followed by a last line with the
+        counters and the stage totals
+        --------------------------------
+        Parameters:
+        path : str File name
+        --------------------------------
+        Returns:
+        None
+        '''
+        with open(path, 'w') as f:
+            for e in self.events:
+                f.write(json.dumps(e, default=float) + "\n")
+            f.write(json.dumps({'event': 'summary', 'counters': self.counters,
+                                'stages': {name: dict(zip(('calls', 'total', 'min', 'max'), s))
+                                           for name, s in self.stages.items()}}) + "\n")
+
+_NULL = contextlib.nullcontext()
+
+# Recorder shared by all the modules of the project
+instrumentation = Instrumentation()
@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 13:10:44 2026
+
+@author: feynman
+"""
+
+import math
+import numpy as np
+
+e = 1.602176634e-19 # Elementary charge in Coulomb
+kB = 8.617333262e-5 # Boltzmann constant in eV/K
+EULER_GAMMA = 0.5772156649015329
+
+# Temperature dependence of the critical current. The gap Delta(T) follows the
+# weak coupling BCS gap equation, which with Delta0 = pi*exp(-gamma)*kB*Tc and
+# E = Delta*cosh(u) reads
+#
+#   ln(Delta0/Delta) = 2*int_0^inf du/(exp(Delta*cosh(u)/(kB*T)) + 1)
+#
+# It is solved once for GAP_TABLE_POINTS reduced temperatures t = T/Tc and
+# then interpolated, so the critical current of whole sweeps over temperatures
+# and designs costs one np.interp. The critical current scales as in the
+# Ambegaokar-Baratoff formula: Ic(T)/Ic(0) = Delta(T)/Delta0*tanh(Delta(T)/(2*kB*T)).
+
+GAP_TABLE_POINTS = 1025
+
+_gapTable = {}
+
+def gapTable(points=GAP_TABLE_POINTS, nodes=128, iterations=8):
+    '''
+    Table of the BCS gap vs reduced temperature, computed on first use by
+    vectorized Newton iterations on the gap equation. The reduced temperatures
+    are t = 1 - (1 - s)^2 with s evenly spaced, so that the gap, which goes
+    as sqrt(1 - t) close to Tc, is linear in s
+    --------------------------------
+    Parameters:
+    points     : int Number of reduced temperatures
+    nodes      : int Quadrature nodes of the gap equation integral
+    iterations : int Newton iterations
+    --------------------------------
+    Returns:
+    s     : array (points,) Table coordinate, t = 1 - (1 - s)^2
+    delta : array (points,) Delta(T)/Delta0
+    '''
+    key = (points, nodes, iterations)
+    if key not in _gapTable:
+        s = np.linspace(0, 1, points)
+        t = 1 - (1 - s[1:-1])**2
+        tau = (t*np.exp(EULER_GAMMA)/np.pi)[:, None] # kB*T/Delta0
+        delta = np.minimum(1., 1.74*np.sqrt(1 - t))[:, None] # Ginzburg-Landau limit as first guess
+        x = np.linspace(0, 1, nodes)
+        for i in range(iterations):
+            # the integrand is below exp(-60) beyond cosh(u) = 60*tau/delta
+            u = x*np.arccosh(np.maximum(60*tau/delta, 1.))
+            c = np.cosh(u)/tau
+            with np.errstate(over='ignore'):
+                f = 1/(np.exp(delta*c) + 1)
+            g = -np.log(delta[:, 0]) - 2*np.trapezoid(f, u, axis=1)
+            dg = -1/delta[:, 0] + 2*np.trapezoid(c*f*(1 - f), u, axis=1)
+            delta = np.clip(delta[:, 0] - g/dg, 1e-12, 1.)[:, None]
+        _gapTable[key] = (s, np.concatenate([[1.], delta[:, 0], [0.]]))
+    return _gapTable[key]
+
+def reducedGap(t):
+    '''
+    BCS gap Delta(T)/Delta0 at reduced temperature t = T/Tc, zero above Tc
+    '''
+    s, delta = gapTable()
+    t = np.clip(np.asarray(t, dtype=float), 0., 1.)
+    return np.interp(1 - np.sqrt(1 - t), s, delta)
+
+def _isZero(temperature):
+    # scalar fast path: np.any costs microseconds on a float, more than the
+    # whole critical current of a single design
+    if isinstance(temperature, (int, float)):
+        return temperature == 0
+    return not np.any(temperature)
+
+def criticalTemperature(Delta):
+    '''
+    BCS critical temperature in K of a superconductor with zero temperature gap Delta in eV
+    '''
+    return Delta*np.exp(EULER_GAMMA)/(np.pi*kB)
+
+class JunctionModel:
+    '''
+    Josephson junction physics of a fabrication process (oxidation): SQUID
+    critical current, junction capacitance and normal resistance as functions
+    of the single junction area. The critical current is linear in the area,
+    Ic = jc*A*m(flux) with m the SQUID modulation |cos(flux_quanta)|.
+    jc is the critical current density at zero temperature: at temperature T
+    the critical current is reduced by the BCS factor of temperatureFactor,
+    computed with the zero temperature gap Delta of the electrodes.
+    All the kernels accept numpy arrays.
+    '''
+
+    invertible = True # Ic(A) can be inverted analytically by junctionArea
+    resistive = False # Ic does not depend on the normal resistance
+    Delta = 180e-6    # Zero temperature superconducting gap of aluminium in eV
+
+    def __init__(self, name, jc, cj, coeff_R_N, reference=""):
+        self.name = name
+        self.jc = jc               # SQUID critical current density in uA/um^2
+        self.cj = cj               # SQUID capacitance in F/um^2
+        self.coeff_R_N = coeff_R_N # Room temperature tunnel resistance coefficient in ohm*um^2
+        self.reference = reference
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.name)
+
+    def description(self):
+        '''
+        Human readable critical current law, stored with the results
+        '''
+        return "%g*A uA with junctin area A in um^2" % self.jc
+
+    def fluxModulation(self, flux_quanta):
+        '''
+        Calculates the critical current of the SQUID normalized to the one of
+        its two junctions in parallel without applied flux
+        --------------------------------
+        Parameters:
+        flux_quanta : float or array Cosine argument in the Ic equation
+        --------------------------------
+        Returns:
+        m : float or array Critical current modulation
+        '''
+        if isinstance(flux_quanta, (int, float)):
+            # scalar fast path, np.cos costs about ten times math.cos on a float
+            return np.float64(abs(math.cos(flux_quanta)))
+        m = abs(np.cos(flux_quanta))
+        return m
+
+    def fluxModulationDerivative(self, flux_quanta):
+        '''
+        Derivative of fluxModulation with respect to the cosine argument
+        '''
+        return -np.sin(flux_quanta)*np.sign(np.cos(flux_quanta))
+
+    def gap(self, temperature=0.):
+        '''
+        BCS superconducting gap in eV of the electrodes at temperature in K
+        '''
+        return self.Delta*reducedGap(np.asarray(temperature)/criticalTemperature(self.Delta))
+
+    def temperatureFactor(self, temperature=0.):
+        '''
+        Critical current at temperature normalized to the one at zero temperature,
+        Delta(T)/Delta0*tanh(Delta(T)/(2*kB*T)) according to Ambegaokar-Baratoff
+        --------------------------------
+        Parameters:
+        temperature : float or array Temperature in K
+        --------------------------------
+        Returns:
+        r : float or array Critical current ratio, 1 at zero temperature and 0 above Tc
+        '''
+        temperature = np.asarray(temperature, dtype=float)
+        Delta = self.gap(temperature)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = Delta/self.Delta*np.tanh(Delta/(2*kB*temperature))
+        return np.where(temperature > 0, r, 1.)
+
+    def Ic(self, A, flux_quanta=0., temperature=0.):
+        '''
+        Calculates the critical current of the SQUID
+        --------------------------------
+        Parameters:
+        A           : float or array SQUID junction area in um^2
+        flux_quanta : float or array Cosine argument in the Ic equation
+        temperature : float or array Temperature in K
+        --------------------------------
+        Returns:
+        Ic : float or array Critical current in A
+        '''
+        Ic = self.jc*A*1e-6*self.fluxModulation(flux_quanta)
+        if not _isZero(temperature):
+            Ic = Ic*self.temperatureFactor(temperature)
+        return Ic
+
+    def IcDerivatives(self, A, flux_quanta=0., temperature=0.):
+        '''
+        Derivatives of the critical current. Ic is linear in the area and
+        proportional to the flux modulation; models with a different law
+        override this method together with Ic
+        --------------------------------
+        Parameters:
+        A           : float or array SQUID junction area in um^2
+        flux_quanta : float or array Cosine argument in the Ic equation
+        temperature : float or array Temperature in K
+        --------------------------------
+        Returns:
+        dIc_dA    : float or array in A/um^2
+        dIc_dflux : float or array in A/rad
+        '''
+        dIc_dA = self.Ic(A, flux_quanta, temperature)/A
+        dIc_dflux = (self.Ic(A, 0., temperature)*self.fluxModulationDerivative(flux_quanta)
+                     /self.fluxModulation(0.))
+        return dIc_dA, dIc_dflux
+
+    def junctionArea(self, Ic, flux_quanta=0., temperature=0.):
+        '''
+        Inverse of Ic: junction area giving the critical current Ic
+        --------------------------------
+        Parameters:
+        Ic          : float or array Critical current in A
+        flux_quanta : float or array Cosine argument in the Ic equation
+        temperature : float or array Temperature in K
+        --------------------------------
+        Returns:
+        A : float or array SQUID junction area in um^2
+        '''
+        A = Ic/(self.jc*1e-6*self.fluxModulation(flux_quanta))
+        if not _isZero(temperature):
+            A = A/self.temperatureFactor(temperature)
+        return A
+
+    def CJ(self, A):
+        '''
+        Calculates the junction capacitance in F of a junction of area A in um^2
+        '''
+        return self.cj*A
+
+    def RN_Tamb(self, A):
+        '''
+        Calculates the room temperature tunnel resistance in ohm of a junction
+        of area A in um^2
+        '''
+        return self.coeff_R_N/A
+
+    def RN(self, A):
+        '''
+        Calculates the 15 mK tunnel resistance in ohm of a junction of area A in um^2
+        '''
+        R_N = self.RN_Tamb(A)
+        return R_N + R_N*17/100
+
+class AmbegaokarBaratoffModel(JunctionModel):
+    '''
+    Junction model whose critical current follows from the 15 mK normal
+    resistance and the superconducting gap according to V. Ambegaokar and
+    A. Baratoff, "Tunneling Between Superconductors", 1963, as done in
+    RFSET_Matching.py: Ic = pi*Delta*m(flux)/(e*RN)
+    '''
+
+    resistive = True # Ic is inversely proportional to the normal resistance
+
+    def __init__(self, name, cj, coeff_R_N, Delta=180e-6, reference=""):
+        self.name = name
+        self.cj = cj               # SQUID capacitance in F/um^2
+        self.coeff_R_N = coeff_R_N # Room temperature tunnel resistance coefficient in ohm*um^2
+        self.Delta = Delta         # Superconducting gap in eV
+        self.reference = reference
+
+    @property
+    def jc(self):
+        # RN*A is constant, so Ic is still linear in A: jc in uA/um^2
+        return np.pi*self.Delta/(self.coeff_R_N*117/100)*1e6
+
+    def description(self):
+        return "pi*Delta/(e*RN) with Delta = %g eV, RN = %g/A ohm at 15 mK" % (self.Delta, self.coeff_R_N*117/100)
+
+    def Ic(self, A, flux_quanta=0., temperature=0.):
+        Delta = self.Delta * e  # Convert Delta from eV to joule
+        Ic = np.pi*Delta*self.fluxModulation(flux_quanta)/(e*self.RN(A))
+        if not _isZero(temperature):
+            Ic = Ic*self.temperatureFactor(temperature)
+        return Ic
+
+# Asymmetric SQUID with loop inductance. The two junctions have critical
+# currents I0*(1 + d) and I0*(1 - d) and the loop has screening parameter
+# beta_L = 2*L*I0/Phi0. With phases (u + v, u - v) and cosine argument
+# x = pi*Phi/Phi0 the supercurrent is 2*I0*(sin(u)*cos(v) + d*cos(u)*sin(v))
+# and the fluxoid quantization reads
+#
+#   x = v + k*(cos(u)*sin(v) + d*sin(u)*cos(v)),   k = pi*beta_L/2
+#
+# Ic(x) is the maximum of the supercurrent over u. For beta_L < 2/pi, x is
+# increasing in v, so for every u and x there is a single v, found by Newton
+# steps. The modulation is solved once on MODULATION_TABLE_POINTS points of
+# the period [0, pi] and then interpolated with cubic Hermite polynomials,
+# the tabulated slopes coming from the envelope theorem at the maximum over u,
+# located by Newton steps on the total derivative of the supercurrent.
+
+MODULATION_TABLE_POINTS = 2049
+
+_modulationTables = {}
+
+def _fluxoidPhase(x, cu, su, d, k, iterations):
+    v = x + 0*cu
+    for i in range(iterations):
+        sv, cv = np.sin(v), np.cos(v)
+        v = v - (v + k*(cu*sv + d*su*cv) - x)/(1 + k*(cu*cv - d*su*sv))
+    return v
+
+def _supercurrentSlope(x, u, d, k, iterations):
+    # total derivative over u of the supercurrent, v following the fluxoid quantization
+    cu, su = np.cos(u), np.sin(u)
+    v = _fluxoidPhase(x, cu, su, d, k, iterations)
+    sv, cv = np.sin(v), np.cos(v)
+    di_dv = -su*sv + d*cu*cv
+    return cu*cv - d*su*sv - k*di_dv*di_dv/(1 + k*(cu*cv - d*su*sv))
+
+def modulationTable(asymmetry, beta_L, points=MODULATION_TABLE_POINTS, nodes=256, iterations=8):
+    '''
+    Table of the critical current modulation of an asymmetric SQUID with loop
+    inductance over one period of the cosine argument, computed on first use
+    --------------------------------
+    Parameters:
+    asymmetry  : float Junction asymmetry d = (I1 - I2)/(I1 + I2), |d| < 1
+    beta_L     : float Screening parameter 2*L*I0/Phi0, below 2/pi
+    points     : int Number of cosine arguments in [0, pi]
+    nodes      : int Grid of the phase u on which the maximum is bracketed
+    iterations : int Newton iterations of the fluxoid quantization
+    --------------------------------
+    Returns:
+    x  : array (points,) Cosine arguments
+    m  : array (points,) Ic(x)/(I1 + I2)
+    dm : array (points,) Derivative of m with respect to x
+    '''
+    d, beta_L = float(asymmetry), float(beta_L)
+    if not abs(d) < 1:
+        raise ValueError("The asymmetry must be in (-1, 1), got %g" % d)
+    if not 0 <= beta_L < 2/np.pi:
+        raise ValueError("beta_L must be in [0, 2/pi) for a single valued Ic(flux), got %g" % beta_L)
+    key = (d, beta_L, points, nodes, iterations)
+    if key not in _modulationTables:
+        k = np.pi*beta_L/2
+        x = np.linspace(0, np.pi, points)
+        # maximum over the phase grid, refined by a parabola and then by
+        # Newton steps on di/du, since the envelope theorem needs the exact maximum
+        u = np.linspace(-np.pi, np.pi, nodes, endpoint=False)
+        du = 2*np.pi/nodes
+        cu, su = np.cos(u), np.sin(u)
+        v = _fluxoidPhase(x[:, None], cu, su, d, k, iterations)
+        i = su*np.cos(v) + d*cu*np.sin(v)
+        j = np.argmax(i, axis=1)
+        rows = np.arange(points)
+        y0, y1, y2 = i[rows, j - 1], i[rows, j], i[rows, (j + 1) % nodes]
+        u = u[j] + 0.5*(y0 - y2)/(y0 - 2*y1 + y2)*du
+        eps = 1e-5
+        for n in range(4):
+            g = _supercurrentSlope(x, u, d, k, iterations)
+            curvature = (_supercurrentSlope(x, u + eps, d, k, iterations)
+                         - _supercurrentSlope(x, u - eps, d, k, iterations))/(2*eps)
+            step = np.where(curvature < 0, -g/np.where(curvature < 0, curvature, -1.), 0.)
+            u = u + np.clip(step, -du, du)
+        cu, su = np.cos(u), np.sin(u)
+        v = _fluxoidPhase(x, cu, su, d, k, iterations)
+        sv, cv = np.sin(v), np.cos(v)
+        m = su*cv + d*cu*sv
+        dm = (-su*sv + d*cu*cv)/(1 + k*(cu*cv - d*su*sv))
+        _modulationTables[key] = (x, m, dm)
+    return _modulationTables[key]
+
+class AsymmetricSQUIDModel(JunctionModel):
+    '''
+    Junction model of a SQUID with asymmetric junctions and non negligible
+    loop inductance: Ic = jc*A*m(flux) with the modulation m of
+    modulationTable, which stays above |d| at the nodes instead of going to
+    zero. The screening parameter is a constant of the model.
+    '''
+
+    def __init__(self, name, jc, cj, coeff_R_N, asymmetry=0., beta_L=0., reference=""):
+        JunctionModel.__init__(self, name, jc, cj, coeff_R_N, reference)
+        self.asymmetry = asymmetry # d = (I1 - I2)/(I1 + I2)
+        self.beta_L = beta_L       # 2*L*I0/Phi0
+        modulationTable(asymmetry, beta_L) # validates the parameters
+
+    @classmethod
+    def fromModel(cls, model, asymmetry, beta_L, name=None):
+        '''
+        Asymmetric SQUID with the junction parameters of another model
+        --------------------------------
+        Parameters:
+        model     : str or JunctionModel
+        asymmetry : float Junction asymmetry d
+        beta_L    : float Screening parameter
+        name      : str Default "<model name>-d<asymmetry>-bL<beta_L>"
+        --------------------------------
+        Returns:
+        model : AsymmetricSQUIDModel
+        '''
+        model = getModel(model)
+        if name is None:
+            name = "%s-d%g-bL%g" % (model.name, asymmetry, beta_L)
+        new = cls(name, model.jc, model.cj, model.coeff_R_N, asymmetry, beta_L, model.reference)
+        new.Delta = model.Delta
+        return new
+
+    def description(self):
+        return ("%g*A*m(flux) uA with junctin area A in um^2, asymmetric SQUID with d = %g and beta_L = %g"
+                % (self.jc, self.asymmetry, self.beta_L))
+
+    def _interpolate(self, flux_quanta):
+        # cell of the table and position t in [0, 1] inside it. The table is
+        # interpolated with cubic Hermite polynomials, linearly in the cells
+        # next to the cusps of Ic(flux), where the tabulated slopes are one sided
+        x, m, dm = modulationTable(self.asymmetry, self.beta_L)
+        h = x[1] - x[0]
+        t = np.mod(np.asarray(flux_quanta, dtype=float), np.pi)/h
+        j = np.minimum(t.astype(np.int64), len(x) - 2)
+        t = t - j
+        m0, m1, d0, d1 = m[j], m[j + 1], h*dm[j], h*dm[j + 1]
+        smooth = (abs(d0 - (m1 - m0)) < 0.05*h) & (abs(d1 - (m1 - m0)) < 0.05*h)
+        return m0, m1, d0, d1, h, t, smooth
+
+    def fluxModulation(self, flux_quanta):
+        m0, m1, d0, d1, h, t, smooth = self._interpolate(flux_quanta)
+        t2, t3 = t*t, t*t*t
+        hermite = (2*t3 - 3*t2 + 1)*m0 + (t3 - 2*t2 + t)*d0 + (-2*t3 + 3*t2)*m1 + (t3 - t2)*d1
+        linear = (1 - t)*m0 + t*m1
+        return np.where(smooth, hermite, linear)
+
+    def fluxModulationDerivative(self, flux_quanta):
+        # derivative of the same piece fluxModulation evaluates
+        m0, m1, d0, d1, h, t, smooth = self._interpolate(flux_quanta)
+        t2 = t*t
+        hermite = (6*t2 - 6*t)*(m0 - m1) + (3*t2 - 4*t + 1)*d0 + (3*t2 - 2*t)*d1
+        return np.where(smooth, hermite, m1 - m0)/h
+
+#----------------------------------------------------------------------------------------------------------
+
+MODELS = {} # name -> JunctionModel
+
+def register(model):
+    '''
+    Adds a junction model to the registry, replacing any model with the same name
+    --------------------------------
+    Parameters:
+    model : JunctionModel
+    --------------------------------
+    Returns:
+    model : JunctionModel
+    '''
+    MODELS[model.name] = model
+    return model
+
+def getModel(model):
+    '''
+    Looks up a junction model by name; JunctionModel instances are returned as they are
+    --------------------------------
+    Parameters:
+    model : str or JunctionModel
+    --------------------------------
+    Returns:
+    model : JunctionModel
+    '''
+    if isinstance(model, JunctionModel):
+        return model
+    try:
+        return MODELS[model]
+    except KeyError:
+        raise ValueError("Unknown junction model %r, available: %s" % (model, list(MODELS))) from None
+
+register(JunctionModel('INRIM', 8.47475, 4.46741e-14, 33.81,
+                       reference="Ic: INRIM experimental law; CJ: L. Wang, \"Fabrication stability of Josephson "
+                                 "junctions for superconducting qubits\", TU Munchen, 2015; RN: V. Ambegaokar and "
+                                 "A. Baratoff, \"Tunneling Between Superconductors\", 1963"))
+register(JunctionModel('Lotkhov', 10., 7.5e-14, 22.0,
+                       reference="S. V. Lotkhov, E. M. Tolkacheva, D. V. Balashov, M. I. Khabipov, F.-I. Buchholz "
+                                 "and A. B. Zorin, \"Low hysteretic behavior of Al/AlOx/Al Josephson junctions\", "
+                                 "Applied Physics Letters, 89, 132115 (2006)"))
+register(AmbegaokarBaratoffModel('AB-INRIM', 4.46741e-14, 33.81,
+                                 reference="Ic: V. Ambegaokar and A. Baratoff, \"Tunneling Between Superconductors\", "
+                                           "1963, with the INRIM normal resistance"))
+register(AmbegaokarBaratoffModel('AB-Lotkhov', 7.5e-14, 22.0,
+                                 reference="Ic: V. Ambegaokar and A. Baratoff, \"Tunneling Between Superconductors\", "
+                                           "1963, with the Lotkhov et al. normal resistance"))
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 16:10:52 2026
+
+@author: feynman
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from RFSET_Matching_Optimization import SQUID_ImpedanceMatching, GOODNESS_THRESHOLD
+from junction_models import getModel
+from results import ResultWriter
+
+# Fabrication spread: in a realization of the array every one of the N SQUIDs
+# gets its own junction area A*(1 + sigma_A*x), junction capacitance
+# CJ*(1 + sigma_CJ*x) and normal resistance RN(A)*(1 + sigma_RN*x), with x
+# standard normal draws; relative factors are clipped to MIN_FACTOR so that
+# no SQUID gets a negative area. The normal resistance only changes the
+# critical current of resistive junction models (Ambegaokar-Baratoff).
+#
+# The SQUIDs are in series, so the array behaves as a uniform array with the
+# mean SQUID inductance: Zres scales as sqrt(<LJ>/LJ) and fn as
+# sqrt(LJ/<LJ>) with respect to the nominal design. The plasma frequency of
+# the realization is the lowest one of its SQUIDs.
+
+MIN_FACTOR = 1e-3
+
+REALIZATION_DTYPE = np.dtype([('fn', 'f8'), ('Zres', 'f8'), ('fp_min', 'f8'), ('goodness', 'f8'), ('success', '?')])
+
+STATISTICS = ('fn', 'Zres', 'fp_min', 'goodness')
+
+class MonteCarloYield:
+    '''
+    Monte Carlo analysis of the fabrication spread of one design. The
+    realizations are drawn in chunks, chunk k always using the k-th child of
+    the seed sequence, so the results do not depend on the number of worker
+    processes. A realization is successful when its goodness is below
+    GOODNESS_THRESHOLD and, if f_band is given, its fn is inside f_band.
+    '''
+
+    def __init__(self, ZL, a, N, A, C, model='INRIM', CJ=None, flux_quanta=0., Z0=50.,
+                 sigma_A=0.05, sigma_CJ=0., sigma_RN=0., f_band=None, seed=None):
+        self.model = getModel(model)
+        self.ZL = ZL
+        self.a = a                   # Distance between neighbouring SQUIDs in m
+        self.N = int(N)              # Number of SQUIDs
+        self.A = A                   # Nominal junction area in um^2
+        self.C = C                   # Lineic capacitance in pF/m
+        self.CJ = self.model.cj if CJ is None else CJ
+        self.flux_quanta = flux_quanta
+        self.Z0 = Z0
+        self.sigma_A = sigma_A       # Relative standard deviations
+        self.sigma_CJ = sigma_CJ
+        self.sigma_RN = sigma_RN
+        self.f_band = f_band         # (f1, f2) in Hz or None
+        self.seed = np.random.SeedSequence(seed)
+        self.nominal = SQUID_ImpedanceMatching.batch(ZL, N*a, a, self.CJ, A, C, Z0=Z0,
+                                                     flux_quanta=flux_quanta, model=self.model)
+
+    def _factors(self, rng, sigma, shape):
+        if not sigma:
+            return 1.
+        return np.maximum(1 + sigma*rng.standard_normal(shape), MIN_FACTOR)
+
+    def realizations(self, chunk, size):
+        '''
+        Draws and evaluates the realizations of a chunk
+        --------------------------------
+        Parameters:
+        chunk : int Chunk index, selects the random stream
+        size  : int Number of realizations
+        --------------------------------
+        Returns:
+        rec : record array with REALIZATION_DTYPE
+        '''
+        rng = np.random.default_rng(_childSeed(self.seed, chunk))
+        shape = (size, self.N)
+        A = self.A*self._factors(rng, self.sigma_A, shape)
+        CJ = self.CJ*self._factors(rng, self.sigma_CJ, shape)
+        squid = SQUID_ImpedanceMatching.batch(self.ZL, self.a, self.a, CJ, A, self.C, Z0=self.Z0,
+                                              flux_quanta=self.flux_quanta, model=self.model)
+        LJ, fp = squid['LJ'], squid['fp']
+        if self.sigma_RN and self.model.resistive:
+            r = self._factors(rng, self.sigma_RN, shape)
+            LJ, fp = LJ*r, fp/np.sqrt(r)
+        ratio = LJ.mean(axis=1)/self.nominal['LJ']
+        rec = np.empty(size, dtype=REALIZATION_DTYPE)
+        rec['Zres'] = self.nominal['Zres']*np.sqrt(ratio)
+        rec['fn'] = self.nominal['fn']/np.sqrt(ratio)
+        rec['fp_min'] = fp.min(axis=1)
+        th_Zres = self.nominal['th_Zres']
+        with np.errstate(invalid='ignore'):
+            rec['goodness'] = abs(rec['Zres'] - th_Zres)/th_Zres*100
+        rec['success'] = rec['goodness'] < GOODNESS_THRESHOLD
+        if self.f_band is not None:
+            rec['success'] &= (rec['fn'] >= self.f_band[0]) & (rec['fn'] <= self.f_band[1])
+        return rec
+
+    def run(self, realizations, processes=None, chunk_size=None, path=None, keep=False, prefetch=2):
+        '''
+        Draws the realizations chunk by chunk over a process pool and reduces
+        every chunk to running statistics, with at most prefetch chunks per
+        worker in flight, so memory does not grow with the number of realizations
+        --------------------------------
+        Parameters:
+        realizations : int Total number of realizations
+        processes    : int Number of worker processes, default os.cpu_count().
+                       With 1 process the chunks are evaluated inline
+        chunk_size   : int Realizations per chunk, default about 2^20 SQUIDs per chunk
+        path         : str If given, every realization is streamed to this .npy
+                       file with REALIZATION_DTYPE (see results.ResultWriter)
+        keep         : bool Also return all the realizations in memory
+        prefetch     : int Chunks in flight per worker process
+        --------------------------------
+        Returns:
+        res : dict with 'realizations', 'successes', 'yield', its binomial
+              standard error 'yield_error' and, for each name in STATISTICS,
+              a dict with 'mean', 'std', 'min' and 'max'; with keep=True also
+              'records'
+        '''
+        if chunk_size is None:
+            chunk_size = max(1, 2**20//self.N)
+        sizes = [min(chunk_size, realizations - start) for start in range(0, realizations, chunk_size)]
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = min(processes, len(sizes))
+        stats = _Statistics()
+        kept = []
+        writer = ResultWriter(path, REALIZATION_DTYPE, self._metadata()) if path is not None else None
+        pool = ProcessPoolExecutor(processes) if processes > 1 else None
+        try:
+            for rec in self._chunks(sizes, pool, processes*prefetch):
+                stats.update(rec)
+                if writer is not None:
+                    writer.append(rec)
+                if keep:
+                    kept.append(rec)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            if writer is not None:
+                writer.close()
+        res = stats.result()
+        if keep:
+            res['records'] = np.concatenate(kept) if kept else np.empty(0, dtype=REALIZATION_DTYPE)
+        return res
+
+    def _chunks(self, sizes, pool, window):
+        # realizations chunk by chunk in order, submitting a chunk to the pool
+        # only when fewer than window are in flight
+        if pool is None:
+            for k, n in enumerate(sizes):
+                yield self.realizations(k, n)
+            return
+        pending = deque()
+        for k, n in enumerate(sizes):
+            pending.append(pool.submit(_realizationsChunk, (self, k, n)))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def _metadata(self):
+        return {'model': self.model.name, 'ZL': self.ZL, 'a': self.a, 'N': self.N, 'A': self.A, 'C': self.C,
+                'CJ': self.CJ, 'flux_quanta': self.flux_quanta, 'Z0': self.Z0, 'sigma_A': self.sigma_A,
+                'sigma_CJ': self.sigma_CJ, 'sigma_RN': self.sigma_RN, 'f_band': self.f_band,
+                'entropy': self.seed.entropy,
+                'columns': {'fn': 'Resoance Frequency / Hz', 'Zres': 'Actual Zres / ohm',
+                            'fp_min': 'Lowest SQUID Plasma Frequency / Hz', 'goodness': 'Matching godness / %',
+                            'success': 'Matched (and fn inside f_band)'}}
+
+def _childSeed(seed, k):
+    # k-th child of the seed sequence, as seed.spawn would create it, without
+    # spawning the k - 1 previous ones
+    return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (k,), pool_size=seed.pool_size)
+
+def _realizationsChunk(args):
+    mc, chunk, size = args
+    return mc.realizations(chunk, size)
+
+class _Statistics:
+    '''
+    Running count, mean, sum of squared deviations from the mean (M2),
+    minimum and maximum of the columns in STATISTICS. Every chunk is reduced
+    on its own and merged with the pairwise update of Chan et al., which keeps
+    the spread accurate when it is many orders of magnitude below the mean
+    '''
+
+    def __init__(self):
+        self.n = 0
+        self.successes = 0
+        self.moments = {q: np.array([0., 0., np.inf, -np.inf]) for q in STATISTICS} # mean, M2, min, max
+
+    def update(self, rec):
+        nb = len(rec)
+        if not nb:
+            return
+        na = self.n
+        self.n += nb
+        self.successes += int(np.count_nonzero(rec['success']))
+        for q in STATISTICS:
+            x = rec[q]
+            mb = x.mean()
+            s = self.moments[q]
+            delta = mb - s[0]
+            s[0] += delta*nb/self.n
+            s[1] += ((x - mb)**2).sum() + delta**2*na*nb/self.n
+            s[2] = min(s[2], x.min())
+            s[3] = max(s[3], x.max())
+
+    def result(self):
+        n = max(self.n, 1)
+        p = self.successes/n
+        res = {'realizations': self.n, 'successes': self.successes, 'yield': p,
+               'yield_error': np.sqrt(p*(1 - p)/n)}
+        for q, (mean, m2, xmin, xmax) in self.moments.items():
+            res[q] = {'mean': mean, 'std': np.sqrt(m2/n), 'min': xmin, 'max': xmax}
+        return res
+
+
+
+if __name__== "__main__":
+    import time
+
+    ZL, a, N, C = 100e3, 5e-6, 100, 84.3
+    A = SQUID_ImpedanceMatching.matchedArea(ZL, a, C, model='Lotkhov')['A']
+    for sigma in (0.01, 0.05):
+        mc = MonteCarloYield(ZL, a, N, A, C, model='Lotkhov', sigma_A=sigma, seed=42)
+        start = time.perf_counter()
+        res = mc.run(10**6)
+        print("sigma_A = %g: yield %.4f +- %.4f over %i realizations in %.2f s" % (
+              sigma, res['yield'], res['yield_error'], res['realizations'], time.perf_counter() - start))
+        print("    fn = %.6g +- %.3g Hz, goodness = %.3g +- %.3g %%" % (
+              res['fn']['mean'], res['fn']['std'], res['goodness']['mean'], res['goodness']['std']))
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 19:02:36 2026
+
+@author: feynman
+"""
+
+import functools
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sweep import SWEEP_DTYPE, AXES
+from results import ResultWriter
+
+# Streaming evaluation of very large sweeps:
+#
+#   grid chunks -> batched model evaluation -> filters -> chunked writer
+#
+# The grid is never materialized: chunks are generated as flat index ranges,
+# evaluated by SweepGrid.evaluate, reduced to the design points passing every
+# filter and appended to a .npy file by results.ResultWriter. The chunks are
+# evaluated over a process pool with at most prefetch chunks per worker in
+# flight and the filters run inside the workers, so only the kept designs
+# travel back and the memory is bounded by the chunk size whatever the grid
+# size. Filters are picklable callables taking a record array with
+# SWEEP_DTYPE and returning a boolean mask, e.g. successful or
+# band('fn', 4e9, 6e9).
+
+def successful(rec):
+    '''
+    Mask of the matched design points
+    '''
+    return rec['success']
+
+def _inBand(column, low, high, rec):
+    x = rec[column]
+    return (x >= low) & (x <= high)
+
+def band(column, low=-np.inf, high=np.inf):
+    '''
+    Filter keeping the design points with column in [low, high]
+    --------------------------------
+    Parameters:
+    column    : str Field of SWEEP_DTYPE, e.g. 'fn', 'Zres' or 'goodness'
+    low, high : float Band edges, in the unit of the column
+    --------------------------------
+    Returns:
+    filter : callable taking a record array and returning a boolean mask
+    '''
+    if column not in SWEEP_DTYPE.names:
+        raise ValueError("Unknown column %r" % column)
+    return functools.partial(_inBand, column, low, high)
+
+class Pipeline:
+    '''
+    Streams a SweepGrid chunk by chunk through the model and the filters.
+    stream() yields the kept design points of every chunk in grid order and
+    run() writes them to a .npy file; in both cases only a few chunks are in
+    memory at any time.
+    '''
+
+    def __init__(self, grid, filters=(), chunk_size=65536):
+        self.grid = grid
+        self.filters = tuple(filters)
+        self.chunk_size = int(chunk_size)
+
+    def chunks(self):
+        '''
+        Generates the flat index ranges (start, stop) of the chunks
+        '''
+        for start in range(0, self.grid.size, self.chunk_size):
+            yield start, min(start + self.chunk_size, self.grid.size)
+
+    def evaluate(self, start, stop):
+        '''
+        Evaluates a chunk and applies the filters
+        --------------------------------
+        Parameters:
+        start, stop : int Flat index range
+        --------------------------------
+        Returns:
+        rec : record array with SWEEP_DTYPE of the design points passing all filters
+        '''
+        rec = np.empty(stop - start, dtype=SWEEP_DTYPE)
+        self.grid.evaluate(start, stop, rec)
+        if not self.filters:
+            return rec
+        keep = np.ones(len(rec), dtype=bool)
+        for f in self.filters:
+            keep &= f(rec)
+        return rec[keep]
+
+    def stream(self, processes=None, prefetch=2):
+        '''
+        Generates the kept design points chunk by chunk, in grid order
+        --------------------------------
+        Parameters:
+        processes : int Number of worker processes, default os.cpu_count().
+                    With 1 process the chunks are evaluated inline
+        prefetch  : int Chunks in flight per worker process
+        --------------------------------
+        Returns:
+        generator of (start, stop, rec), rec a record array with SWEEP_DTYPE
+        '''
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = max(1, min(processes, -(-self.grid.size//self.chunk_size)))
+        if processes <= 1:
+            for start, stop in self.chunks():
+                yield start, stop, self.evaluate(start, stop)
+            return
+        window = deque()
+        with ProcessPoolExecutor(processes, initializer=_attach, initargs=(self,)) as pool:
+            for start, stop in self.chunks():
+                window.append((start, stop, pool.submit(_evaluateChunk, start, stop)))
+                if len(window) >= processes*prefetch:
+                    start, stop, future = window.popleft()
+                    yield start, stop, future.result()
+            while window:
+                start, stop, future = window.popleft()
+                yield start, stop, future.result()
+
+    def run(self, path, processes=None, metadata=None, log=None):
+        '''
+        Streams the kept design points to a .npy file, see results.loadResults
+        --------------------------------
+        Parameters:
+        path      : str .npy file name
+        processes : int Number of worker processes, default os.cpu_count()
+        metadata  : dict JSON serializable run parameters, added to the grid ones
+        log       : callable taking a progress message, None for silence
+        --------------------------------
+        Returns:
+        res : dict with the number of 'evaluated' and 'kept' design points and the 'path'
+        '''
+        log = log or (lambda message: None)
+        metadata = dict(metadata or {})
+        metadata.update({ax: self.grid.axes[ax] for ax in AXES if ax != 'model'})
+        metadata['models'] = [m.name for m in self.grid.models]
+        metadata['filters'] = [repr(f) for f in self.filters]
+        evaluated = kept = 0
+        start_time = time.perf_counter()
+        with ResultWriter(path, SWEEP_DTYPE, metadata) as writer:
+            for start, stop, rec in self.stream(processes):
+                writer.append(rec)
+                evaluated += stop - start
+                kept += len(rec)
+                log("%i of %i design points evaluated, %i kept (%.1f s)"
+                    % (evaluated, self.grid.size, kept, time.perf_counter() - start_time))
+        return {'evaluated': evaluated, 'kept': kept, 'path': path}
+
+#----------------------------------------------------------------------------------------------------------
+# Worker side of Pipeline.stream
+
+_worker = {}
+
+def _attach(pipeline):
+    _worker['pipeline'] = pipeline
+
+def _evaluateChunk(start, stop):
+    return _worker['pipeline'].evaluate(start, stop)
+
+
+
+if __name__== "__main__":
+    import tempfile
+    from sweep import SweepGrid
+    from results import loadResults
+
+    # 3*10^7 design points, keeping the matched ones resonating in 4-6 GHz
+    grid = SweepGrid(N=np.arange(10, 1010, 10), a=np.arange(1, 20, 0.05)*1e-6, ZL=np.linspace(20e3, 120e3, 11),
+                     C=[84.3], flux=np.linspace(0, 1.5, 37), model=['INRIM', 'Lotkhov'])
+    pipeline = Pipeline(grid, [successful, band('fn', 4e9, 6e9)], chunk_size=2**18)
+    path = os.path.join(tempfile.mkdtemp(), 'band.npy')
+    start = time.perf_counter()
+    res = pipeline.run(path)
+    print("%i design points in %.1f s, %i kept" % (res['evaluated'], time.perf_counter() - start, res['kept']))
+    rec, metadata = loadResults(path)
+    print("fn of the kept designs / GHz: %.3f - %.3f" % (rec['fn'].min()/1e9, rec['fn'].max()/1e9))
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 16:58:21 2026
+
+@author: feynman
+"""
+
+import os
+
+# Plotting layer of the project. The physics modules never import matplotlib:
+# it is imported by this module, and only when the first figure is requested,
+# so worker processes and batch jobs do not pay its import time.
+#
+# In headless mode (RFSET_HEADLESS=1 in the environment, or headless() called
+# before the first figure) the non interactive Agg backend is used and every
+# figure is written to a file in the figure directory instead of being shown.
+
+_state = {'headless': os.environ.get('RFSET_HEADLESS', '') not in ('', '0'),
+          'directory': os.environ.get('RFSET_FIGURES', 'figures'),
+          'format': 'png',
+          'plt': None}
+
+def headless(directory=None, fmt='png'):
+    '''
+    Renders the figures straight to files. Must be called before the first figure
+    --------------------------------
+    Parameters:
+    directory : str Figure directory, default $RFSET_FIGURES or "figures"
+    fmt       : str File format understood by matplotlib savefig
+    --------------------------------
+    Returns:
+    None
+    '''
+    _state['headless'] = True
+    _state['format'] = fmt
+    if directory is not None:
+        _state['directory'] = directory
+
+def pyplot():
+    '''
+    Imports matplotlib.pyplot on first use, selecting the Agg backend in headless mode
+    '''
+    if _state['plt'] is None:
+        import matplotlib
+        if _state['headless']:
+            matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        _state['plt'] = plt
+    return _state['plt']
+
+def finish(fig, name):
+    '''
+    In headless mode saves the figure as name in the figure directory and
+    closes it, otherwise leaves it open to be shown
+    --------------------------------
+    Parameters:
+    fig  : matplotlib Figure
+    name : str File name without extension
+    --------------------------------
+    Returns:
+    path : str Saved file, None if not headless
+    '''
+    if not _state['headless']:
+        return None
+    os.makedirs(_state['directory'], exist_ok=True)
+    path = os.path.join(_state['directory'], name + '.' + _state['format'])
+    fig.savefig(path)
+    pyplot().close(fig)
+    return path
+
+def matchingCurves(d, junctionArea, squids, firstResonanceFreq, name='matching'):
+    '''
+    Matched junction area and first resonance frequency vs distance between
+    neighbouring SQUIDs, one panel per number of SQUIDs
+    --------------------------------
+    Parameters:
+    d                  : list Distances between neighbouring SQUIDs in um
+    junctionArea       : list Matched junction areas in um^2
+    squids             : list Numbers of SQUIDs
+    firstResonanceFreq : list of lists First resonance frequencies in GHz, one per number of SQUIDs
+    name               : str File name in headless mode
+    --------------------------------
+    Returns:
+    fig : matplotlib Figure
+    '''
+    plt = pyplot()
+    fig, axis = plt.subplots(1, len(squids) + 1, squeeze = True, figsize=(10,5))
+    ax = axis[0]
+    ax.set_ylabel('Junction Area / um^2')
+    ax.plot(d, junctionArea)
+    for i, N in enumerate(squids):
+        ax = axis[i+1]
+        ax.set_title("Number of SQUIDs = %i" %N)
+        ax.set_ylabel('First rersonance Frequency / GHz')
+        if i == 0:
+            ax.set_xlabel('Distance between neighbouring SQUIDs / um')
+        ax.plot(d, firstResonanceFreq[i])
+    fig.tight_layout()
+    finish(fig, name)
+    return fig
+
+def fluxMap(X, Y, Z, name='flux_map'):
+    '''
+    3D plot of the resonance frequency vs distance between neighbouring SQUIDs
+    and cosine argument in the Ic equation
+    --------------------------------
+    Parameters:
+    X, Y : 2D arrays Flux and distance in um, as returned by numpy.meshgrid
+    Z    : 2D array Resonance frequency in GHz
+    name : str File name in headless mode
+    --------------------------------
+    Returns:
+    fig : matplotlib Figure
+    '''
+    plt = pyplot()
+    from mpl_toolkits import mplot3d # registers the 3d projection
+    fig = plt.figure(num=None, figsize=(10, 10), dpi=80, facecolor='w', edgecolor='k')
+    ax = fig.add_subplot(projection='3d')
+    ax.plot_surface(X, Y, Z, rstride=1, cstride=1, cmap='viridis', edgecolor='none')
+    ax.set_ylabel('Distance between neighbouring SQUIDs / um')
+    ax.set_xlabel('Cosine argument in the Ic equation / radians')
+    ax.set_zlabel('Resonance Frequency / GHz')
+    ax.view_init(45, 35)
+    ax.ticklabel_format(axis="z", style="plain", scilimits=(0,0))
+    finish(fig, name)
+    return fig
+
+def fluxSlice(flux, fn, name='flux_slice'):
+    '''
+    Resonance frequency vs cosine argument in the Ic equation at fixed geometry
+    --------------------------------
+    Parameters:
+    flux : array Cosine argument in the Ic equation
+    fn   : array Resonance frequency in GHz
+    name : str File name in headless mode
+    --------------------------------
+    Returns:
+    fig : matplotlib Figure
+    '''
+    plt = pyplot()
+    fig, ax = plt.subplots()
+    ax.plot(flux, fn)
+    ax.set_ylabel('Resonance Frequency / GHz')
+    ax.set_xlabel('Cosine argument in the Ic equation / radians')
+    finish(fig, name)
+    return fig
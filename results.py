@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 10:05:18 2026
+
+@author: feynman
+"""
+
+import json
+import os
+import numpy as np
+
+# Columns written by calculation.py, with their description and unit
+COLUMNS = (('distance', 'f8', 'Distance between neighbouring SQUIDs / um'),
+           ('A', 'f8', 'Junctin area / um^2'),
+           ('Ic', 'f8', 'IC / A'),
+           ('RN_Tamb', 'f8', 'Normal Resistance T amb / ohm'),
+           ('RN_mK', 'f8', 'Normal Resistance at mK / ohm'),
+           ('CJ', 'f8', 'Junction Capacitance / F'),
+           ('LJ', 'f8', 'SQUID Inductance Lj / H'),
+           ('L', 'f8', 'SQUID Array Lineic Inductance / H/m'),
+           ('fp', 'f8', 'Plasma Frequency / Hz'),
+           ('fn', 'f8', 'Resoance Frequency / Hz'),
+           ('Z1', 'f8', 'Z1 / ohm'),
+           ('th_Zres', 'f8', 'Theoretical Zres / ohm'),
+           ('Zres', 'f8', 'Actual Zres / ohm'),
+           ('th_Q', 'f8', 'Theoretical Q'),
+           ('Q', 'f8', 'Actual Q'),
+           ('goodness', 'f8', 'Minimization godness / %'),
+           ('success', '?', 'Minimization success'))
+
+RESULT_DTYPE = np.dtype([(name, fmt) for name, fmt, description in COLUMNS])
+
+# Columns of the compact design records (Design, DesignBatch): the inputs of
+# SQUID_ImpedanceMatching, the quantities that need the junction model (Ic)
+# or that are looked at the most, goodness and success. Z1, LJ, L, th_Zres,
+# th_Q and Q follow from these in a few operations and are not stored
+RECORD_COLUMNS = (('ZL', 'f8', 'Load impedance / ohm'),
+                  ('l', 'f8', 'SQUID array length / m'),
+                  ('a', 'f8', 'Distance between neighbouring SQUIDs / m'),
+                  ('CJ', 'f8', 'SQUID capacitance / F/um^2'),
+                  ('A', 'f8', 'Junctin area / um^2'),
+                  ('C', 'f8', 'SQUID array lineic capacitance / pF/m'),
+                  ('Z0', 'f8', 'Characteristic impedance / ohm'),
+                  ('flux_quanta', 'f8', 'Cosine argument in the Ic equation / rad'),
+                  ('temperature', 'f8', 'Temperature / K'),
+                  ('Ic', 'f8', 'IC / A'),
+                  ('fp', 'f8', 'Plasma Frequency / Hz'),
+                  ('fn', 'f8', 'Resoance Frequency / Hz'),
+                  ('Zres', 'f8', 'Actual Zres / ohm'),
+                  ('goodness', 'f4', 'Matching godness / %'),
+                  ('success', '?', 'Matching success'))
+
+RECORD_DTYPE = np.dtype([(name, fmt) for name, fmt, description in RECORD_COLUMNS])
+
+RECORD_INPUTS = RECORD_DTYPE.names[:9]
+RECORD_QUANTITIES = RECORD_DTYPE.names[9:13]
+
+_MAGIC = b'\x93NUMPY'
+_ALIGN = 64 # npy data start is aligned to 64 bytes
+
+def _metadataPath(path):
+    return os.path.splitext(path)[0] + '.json'
+
+def _jsonDefault(x):
+    # numpy scalars and arrays in the run parameters
+    if isinstance(x, np.generic):
+        return x.item()
+    if isinstance(x, np.ndarray):
+        return x.tolist()
+    raise TypeError("%r is not JSON serializable" % (x,))
+
+class ResultWriter:
+    '''
+    Writes records with a fixed structured dtype to a .npy file, chunk by
+    chunk, so the results never need to be held in memory all together.
+    The header is written with room for the largest possible length and is
+    updated with the actual number of records on close, so the file can be
+    memory-mapped by numpy.load. The run parameters are stored as JSON in a
+    file with the same name and extension .json.
+    '''
+
+    def __init__(self, path, dtype=RESULT_DTYPE, metadata=None):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        metadata = dict(metadata or {})
+        columns = RECORD_COLUMNS if self.dtype == RECORD_DTYPE else COLUMNS
+        metadata.setdefault('columns', {name: description for name, fmt, description in columns
+                                        if name in self.dtype.names})
+        with open(_metadataPath(path), 'w') as f:
+            json.dump(metadata, f, indent=1, default=_jsonDefault)
+        self._file = open(path, 'wb')
+        self._headerSize = len(self._header(np.iinfo(np.int64).max))
+        self._file.write(self._header(0))
+
+    def _header(self, length):
+        '''
+        Builds a npy header for a 1D array of the writer dtype. Its size only
+        depends on the dtype, so the header can be rewritten in place.
+        --------------------------------
+        Parameters:
+        length : int Number of records
+        --------------------------------
+        Returns:
+        header : bytes
+        '''
+        text = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+            np.lib.format.dtype_to_descr(self.dtype), length)
+        text = text.encode('latin1')
+        size = getattr(self, '_headerSize', None)
+        for version, prefix in (((1, 0), 10), ((2, 0), 12)):
+            if size is None:
+                total = -(-(prefix + len(text) + 1)//_ALIGN)*_ALIGN
+            else:
+                total = size
+            hlen = total - prefix
+            if version == (1, 0) and hlen > 0xffff:
+                continue
+            text = text.ljust(hlen - 1) + b'\n'
+            nbytes = 2 if version == (1, 0) else 4
+            return _MAGIC + bytes(version) + hlen.to_bytes(nbytes, 'little') + text
+
+    def append(self, records):
+        '''
+        Appends records to the file
+        --------------------------------
+        Parameters:
+        records : array with the writer dtype, or DesignBatch
+        --------------------------------
+        Returns:
+        None
+        '''
+        records = np.ascontiguousarray(records, dtype=self.dtype).ravel()
+        self._file.write(records.tobytes())
+        self.length += len(records)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(self._header(self.length))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def saveResults(path, records, metadata=None):
+    '''
+    Saves a record array and the run parameters
+    --------------------------------
+    Parameters:
+    path     : str .npy file name
+    records  : structured array, e.g. with RESULT_DTYPE
+    metadata : dict JSON serializable run parameters
+    --------------------------------
+    Returns:
+    None
+    '''
+    records = np.asarray(records)
+    with ResultWriter(path, records.dtype, metadata) as writer:
+        writer.append(records)
+
+def loadResults(path, mmap=True):
+    '''
+    Loads results saved by ResultWriter or saveResults without parsing text
+    --------------------------------
+    Parameters:
+    path : str .npy file name
+    mmap : bool Memory-map the records instead of reading them
+    --------------------------------
+    Returns:
+    records  : structured array (numpy.memmap if mmap is True)
+    metadata : dict run parameters
+    '''
+    records = np.load(path, mmap_mode='r' if mmap else None)
+    metadata = {}
+    if os.path.exists(_metadataPath(path)):
+        with open(_metadataPath(path)) as f:
+            metadata = json.load(f)
+    return records, metadata
+
+class Design:
+    '''
+    Immutable record of a single design: the name of the junction model and
+    the fields of RECORD_DTYPE in slots, without the per-instance dictionary
+    of SQUID_ImpedanceMatching. Designs compare and hash by value.
+    '''
+
+    __slots__ = RECORD_DTYPE.names + ('model',)
+
+    def __init__(self, **fields):
+        missing = set(self.__slots__) - set(fields)
+        if missing:
+            raise TypeError("Missing fields %s" % sorted(missing))
+        for name in RECORD_DTYPE.names:
+            object.__setattr__(self, name, bool(fields[name]) if name == 'success' else float(fields[name]))
+        object.__setattr__(self, 'model', str(fields['model']))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Design records are immutable, use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError("Design records are immutable")
+
+    def __reduce__(self):
+        return (_design, (self.astuple()[:-1], self.model))
+
+    def __repr__(self):
+        return "Design(%s)" % ", ".join("%s=%r" % (name, getattr(self, name)) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, Design):
+            return NotImplemented
+        return self.astuple() == other.astuple()
+
+    def __hash__(self):
+        return hash(self.astuple())
+
+    def astuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def asdict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def replace(self, **changes):
+        '''
+        New record with some fields changed. Derived quantities are not
+        recomputed: use SQUID_ImpedanceMatching.fromDesign to change inputs
+        '''
+        return Design(**dict(self.asdict(), **changes))
+
+    def record(self):
+        '''
+        The design as a numpy record with RECORD_DTYPE, without the model
+        '''
+        return np.array(self.astuple()[:-1], dtype=RECORD_DTYPE)[()]
+
+    @classmethod
+    def fromRecord(cls, record, model):
+        '''
+        Design of a numpy record with RECORD_DTYPE and the name of the
+        junction model it comes from
+        '''
+        return _design(record.item(), model)
+
+def _design(values, model):
+    design = Design.__new__(Design)
+    for name, value in zip(RECORD_DTYPE.names, values):
+        object.__setattr__(design, name, value)
+    object.__setattr__(design, 'model', model)
+    return design
+
+def _modelName(models):
+    models = set(models)
+    if len(models) != 1:
+        raise ValueError("Designs of different junction models %s can not be batched" % sorted(models))
+    return models.pop()
+
+class DesignBatch:
+    '''
+    Container of many designs of one junction model. Every field is a column,
+    read as an attribute (batch.fn) without copying; the columns are views of
+    a single record array with RECORD_DTYPE, so numpy.asarray(batch) and
+    ResultWriter.append(batch) also take the designs without copying them.
+    Indexing with an integer gives a Design, with a slice, mask or index
+    array a DesignBatch.
+    '''
+
+    __slots__ = ('records', 'model')
+
+    def __init__(self, records, model):
+        records = np.asarray(records)
+        if records.dtype != RECORD_DTYPE:
+            raise TypeError("DesignBatch needs records with RECORD_DTYPE, got %s" % records.dtype)
+        object.__setattr__(self, 'records', records.reshape(-1))
+        object.__setattr__(self, 'model', str(model))
+
+    @classmethod
+    def empty(cls, size, model):
+        return cls(np.zeros(size, dtype=RECORD_DTYPE), model)
+
+    @classmethod
+    def fromColumns(cls, model, **columns):
+        '''
+        Packs columns, broadcast against each other, in a batch
+        --------------------------------
+        Parameters:
+        model   : str Name of the junction model of the designs
+        columns : float or array for every name of RECORD_DTYPE
+        --------------------------------
+        Returns:
+        batch : DesignBatch of the flattened broadcast shape
+        '''
+        missing = set(RECORD_DTYPE.names) - set(columns)
+        if missing:
+            raise TypeError("Missing columns %s" % sorted(missing))
+        shape = np.broadcast_shapes(*[np.shape(columns[name]) for name in RECORD_DTYPE.names])
+        records = np.empty(int(np.prod(shape)), dtype=RECORD_DTYPE)
+        for name in RECORD_DTYPE.names:
+            records[name] = np.broadcast_to(columns[name], shape).ravel()
+        return cls(records, model)
+
+    @classmethod
+    def fromDesigns(cls, designs):
+        designs = list(designs)
+        return cls(np.array([d.astuple()[:-1] for d in designs], dtype=RECORD_DTYPE),
+                   _modelName(d.model for d in designs))
+
+    @classmethod
+    def concatenate(cls, batches):
+        batches = list(batches)
+        return cls(np.concatenate([b.records for b in batches]), _modelName(b.model for b in batches))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getattr__(self, name):
+        if name in RECORD_DTYPE.names:
+            return self.records[name]
+        raise AttributeError("DesignBatch has no field %r" % name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Write the columns in place, e.g. batch.fn[:] = values")
+
+    def __reduce__(self):
+        return (DesignBatch, (self.records, self.model))
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Design.fromRecord(self.records[index], self.model)
+        return DesignBatch(self.records[index], self.model)
+
+    def __iter__(self):
+        for record in self.records.tolist():
+            yield _design(record, self.model)
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return self.records.astype(dtype or RECORD_DTYPE)
+        if dtype is not None and np.dtype(dtype) != RECORD_DTYPE:
+            raise ValueError("A DesignBatch can only be viewed with RECORD_DTYPE")
+        return self.records
+
+    def __repr__(self):
+        return "DesignBatch(%i designs, model %r)" % (len(self), self.model)
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 17:30:14 2026
+
+@author: feynman
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from sweep import SweepGrid, SWEEP_DTYPE, AXES
+from RFSET_Matching_Optimization import SQUID_ImpedanceMatching
+from results import ResultWriter
+
+# Batch runner of the sweeps described by a JSON job file, e.g.
+#
+#   {"N": [20, 100], "a": {"arange": [3e-6, 11e-6, 1e-6]}, "ZL": [100e3],
+#    "C": [84.3], "flux": {"linspace": [0, 6.25, 26]}, "model": ["INRIM", "Lotkhov"],
+#    "output": "run1", "chunk_size": 4096}
+#
+# Axes are lists of values or {"arange": [start, stop, step]} or
+# {"linspace": [start, stop, num]}; missing axes take the SweepGrid defaults.
+# Every chunk of the grid is written to the output directory as soon as it is
+# done, so a run killed at any time is resumed by launching the same job
+# again: the finished chunks are skipped. At the end the chunks are merged
+# in results.npy (with results.json), to be read by results.loadResults.
+
+GRID_KEYS = AXES + ('Z0', 'bounds', 'xatol')
+
+def _axis(value):
+    if isinstance(value, dict):
+        (kind, args), = value.items()
+        if kind == 'arange':
+            return np.arange(*args).tolist()
+        if kind == 'linspace':
+            return np.linspace(args[0], args[1], int(args[2])).tolist()
+        raise ValueError("Unknown axis specification %r" % kind)
+    return value
+
+def loadJob(path):
+    '''
+    Reads a job file
+    --------------------------------
+    Parameters:
+    path : str JSON job file
+    --------------------------------
+    Returns:
+    job : dict with the expanded grid parameters, 'output' and 'chunk_size'
+    '''
+    with open(path) as f:
+        job = json.load(f)
+    unknown = set(job) - set(GRID_KEYS) - {'output', 'chunk_size'}
+    if unknown:
+        raise ValueError("Unknown keys in %s: %s" % (path, sorted(unknown)))
+    for ax in AXES:
+        if ax in job:
+            job[ax] = _axis(job[ax])
+    job.setdefault('output', os.path.splitext(path)[0])
+    job.setdefault('chunk_size', 4096)
+    return job
+
+def fingerprint(job):
+    '''
+    Hash of everything that determines the content of the chunks: the job,
+    the class and every parameter of the junction models, so checkpoints of a
+    model whose coefficients changed, or of a name registered again, are not
+    reused
+    '''
+    state = {k: job[k] for k in GRID_KEYS + ('chunk_size',) if k in job}
+    state['class'] = SQUID_ImpedanceMatching.__name__
+    state['models'] = [{'model': type(model).__name__,
+                        'parameters': {k: repr(v) for k, v in sorted(vars(model).items())}}
+                       for model in SweepGrid(**{k: job[k] for k in GRID_KEYS if k in job}).models]
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+class BatchRunner:
+    '''
+    Evaluates a SweepGrid chunk by chunk, checkpointing every finished chunk
+    in the output directory as chunk_<index>.npy. A chunk file only appears
+    once it is complete (it is written under a temporary name and renamed),
+    so after a crash the existing chunk files can be trusted.
+    '''
+
+    def __init__(self, job):
+        self.job = job
+        self.grid = SweepGrid(**{k: job[k] for k in GRID_KEYS if k in job})
+        self.output = job['output']
+        self.chunks = self.grid.chunks(job['chunk_size'])
+
+    def chunkPath(self, index):
+        return os.path.join(self.output, "chunk_%06d.npy" % index)
+
+    def pending(self):
+        '''
+        Indices of the chunks without checkpoint
+        '''
+        return [i for i in range(len(self.chunks)) if not os.path.exists(self.chunkPath(i))]
+
+    def _prepare(self, restart):
+        # The checkpoints are only reused if they were computed for the same job
+        os.makedirs(self.output, exist_ok=True)
+        path = os.path.join(self.output, 'job.json')
+        key = fingerprint(self.job)
+        if os.path.exists(path) and not restart:
+            with open(path) as f:
+                previous = json.load(f)
+            if previous.get('fingerprint') != key:
+                raise RuntimeError("%s holds checkpoints of a different job, use --restart to discard them"
+                                   % self.output)
+            return
+        for name in os.listdir(self.output):
+            if name.startswith('chunk_') and name.endswith('.npy'):
+                os.remove(os.path.join(self.output, name))
+        with open(path, 'w') as f:
+            json.dump(dict(self.job, fingerprint=key), f, indent=1)
+
+    def run(self, processes=None, restart=False, log=print):
+        '''
+        Evaluates the missing chunks and merges all of them
+        --------------------------------
+        Parameters:
+        processes : int Number of worker processes, default os.cpu_count()
+        restart   : bool Discard the existing checkpoints
+        log       : callable taking a progress message, None for silence
+        --------------------------------
+        Returns:
+        path : str Merged results file
+        '''
+        log = log or (lambda message: None)
+        self._prepare(restart)
+        todo = self.pending()
+        log("%i of %i chunks to evaluate" % (len(todo), len(self.chunks)))
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = min(processes, len(todo))
+        start = time.perf_counter()
+        if processes <= 1:
+            for n, i in enumerate(todo):
+                self.evaluateChunk(i)
+                log("chunk %i done (%i/%i, %.1f s)" % (i, n + 1, len(todo), time.perf_counter() - start))
+        elif todo:
+            with ProcessPoolExecutor(processes, initializer=_attach, initargs=(self,)) as pool:
+                futures = [pool.submit(_evaluateChunk, i) for i in todo]
+                for n, future in enumerate(as_completed(futures)):
+                    i = future.result()
+                    log("chunk %i done (%i/%i, %.1f s)" % (i, n + 1, len(todo), time.perf_counter() - start))
+        return self.merge()
+
+    def evaluateChunk(self, index):
+        '''
+        Evaluates one chunk and writes its checkpoint
+        --------------------------------
+        Parameters:
+        index : int Chunk index
+        --------------------------------
+        Returns:
+        index : int
+        '''
+        start, stop = self.chunks[index]
+        rec = np.empty(stop - start, dtype=SWEEP_DTYPE)
+        self.grid.evaluate(start, stop, rec)
+        path = self.chunkPath(index)
+        tmp = path + ".%i.tmp" % os.getpid()
+        with open(tmp, 'wb') as f:
+            np.save(f, rec)
+        os.replace(tmp, path)
+        return index
+
+    def merge(self):
+        '''
+        Concatenates the chunks, in grid order, in results.npy
+        --------------------------------
+        Parameters:
+        None
+        --------------------------------
+        Returns:
+        path : str Merged results file
+        '''
+        missing = self.pending()
+        if missing:
+            raise RuntimeError("%i chunks of %s are not done yet" % (len(missing), self.output))
+        path = os.path.join(self.output, 'results.npy')
+        metadata = {k: self.job[k] for k in GRID_KEYS if k in self.job}
+        metadata['shape'] = self.grid.shape
+        metadata['axes'] = AXES
+        metadata['models'] = [m.name for m in self.grid.models]
+        with ResultWriter(path, SWEEP_DTYPE, metadata) as writer:
+            for i in range(len(self.chunks)):
+                writer.append(np.load(self.chunkPath(i)))
+        return path
+
+#----------------------------------------------------------------------------------------------------------
+# Worker side of BatchRunner.run
+
+_worker = {}
+
+def _attach(runner):
+    _worker['runner'] = runner
+
+def _evaluateChunk(index):
+    return _worker['runner'].evaluateChunk(index)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the sweep of a JSON job file with checkpointing and resume")
+    parser.add_argument('job', help="JSON job file")
+    parser.add_argument('--processes', type=int, default=None, help="Number of worker processes")
+    parser.add_argument('--output', default=None, help="Checkpoint and results directory, overrides the job file")
+    parser.add_argument('--restart', action='store_true', help="Discard the checkpoints of a previous run")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    job = loadJob(args.job)
+    if args.output is not None:
+        job['output'] = args.output
+    runner = BatchRunner(job)
+    try:
+        path = runner.run(args.processes, args.restart, log=None if args.quiet else print)
+    except RuntimeError as error:
+        print(error, file=sys.stderr)
+        return 1
+    if not args.quiet:
+        print("Results of %i design points written to %s" % (runner.grid.size, path))
+    return 0
+
+
+
+if __name__== "__main__":
+    sys.exit(main())
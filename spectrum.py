@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 15:36:05 2026
+
+@author: feynman
+"""
+
+import numpy as np
+from scipy.linalg import eigh_tridiagonal, eigvalsh_tridiagonal
+
+# Frequency resolved response of the SQUID array line. Every SQUID is a cell
+# made of a series element, the SQUID inductance LJ in parallel with the
+# capacitance CJ*2A of its two junctions, followed by the capacitance to
+# ground C*a of its stretch of line:
+#
+#   ---[LJ || CJ*2A]---+---
+#                      |
+#                    C*a
+#                      |
+#   -------------------+---
+#
+# The array is the cascade of N equal cells, i.e. the N-th power of the cell
+# ABCD matrix, terminated by the load ZL. Frequencies and designs are stacked
+# along the leading axes of the 2x2 matrices, so whole spectra are computed
+# with a few batched matrix products and no loop over SQUIDs or frequencies.
+
+def cellMatrix(f, LJ, CJ, Cg):
+    '''
+    ABCD matrix of a single SQUID cell
+    --------------------------------
+    Parameters:
+    f  : float or array Frequency in Hz
+    LJ : float or array SQUID inductance in H
+    CJ : float or array Capacitance of the SQUID (both junctions) in F
+    Cg : float or array Capacitance to ground of the cell in F
+    --------------------------------
+    Returns:
+    M : complex array (..., 2, 2) with the broadcast shape of the parameters
+    '''
+    w = 2*np.pi*np.asarray(f, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Zs = 1j*w*LJ/(1 - w**2*LJ*CJ) # diverges at the plasma frequency of the SQUID
+    Y = 1j*w*Cg
+    Zs, Y = np.broadcast_arrays(Zs, Y)
+    M = np.empty(Zs.shape + (2, 2), dtype=complex)
+    M[..., 0, 0] = 1 + Zs*Y
+    M[..., 0, 1] = Zs
+    M[..., 1, 0] = Y
+    M[..., 1, 1] = 1
+    return M
+
+def chainMatrix(M, N):
+    '''
+    N-th power of stacked 2x2 matrices by repeated squaring, with a different
+    power for every matrix if N is an array. Above the cut-off frequency of
+    the array the entries grow exponentially with N, so the products are
+    rescaled at every step: the result is only defined up to a factor, which
+    cancels in the input impedance.
+    --------------------------------
+    Parameters:
+    M : complex array (..., 2, 2)
+    N : int or int array broadcastable to M.shape[:-2]
+    --------------------------------
+    Returns:
+    P : complex array (..., 2, 2), M^N up to a factor for every matrix
+    '''
+    N = np.asarray(N, dtype=np.int64)
+    shape = np.broadcast_shapes(M.shape[:-2], N.shape)
+    base = np.broadcast_to(M, shape + (2, 2)).copy()
+    n = np.broadcast_to(N, shape).copy()
+    P = np.zeros(shape + (2, 2), dtype=complex)
+    P[..., 0, 0] = P[..., 1, 1] = 1
+    while np.any(n > 0):
+        odd = (n & 1).astype(bool)[..., None, None]
+        P = np.where(odd, _normalized(P @ base), P)
+        n >>= 1
+        if np.any(n > 0):
+            base = _normalized(base @ base)
+    return P
+
+def _normalized(M):
+    # Rescale every matrix so that its largest entry has modulus 1
+    scale = np.max(abs(M), axis=(-2, -1), keepdims=True)
+    return M/np.where(scale > 0, scale, 1.)
+
+def inputImpedance(f, LJ, CJ, Cg, N, ZL):
+    '''
+    Input impedance of the SQUID array terminated by ZL
+    --------------------------------
+    Parameters:
+    f          : array Frequencies in Hz, added as last axis of the results
+    LJ, CJ, Cg : float or array Cell parameters as in cellMatrix, one value per design
+    N          : int or int array Number of SQUIDs of every design
+    ZL         : float or array Load impedance in ohm
+    --------------------------------
+    Returns:
+    Zin : complex array, design shape + f.shape
+    '''
+    f = np.asarray(f, dtype=float)
+    def design(x):
+        # design parameters broadcast against the frequency grid
+        return np.asarray(x)[(...,) + (None,)*f.ndim]
+    P = chainMatrix(cellMatrix(f, design(LJ), design(CJ), design(Cg)), design(N))
+    ZL = design(ZL)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Zin = (P[..., 0, 0]*ZL + P[..., 0, 1])/(P[..., 1, 0]*ZL + P[..., 1, 1])
+    return Zin
+
+def reflection(f, LJ, CJ, Cg, N, ZL, Z0=50.):
+    '''
+    Reflection coefficient seen from the Z0 line
+    --------------------------------
+    Parameters:
+    f, LJ, CJ, Cg, N, ZL : as in inputImpedance
+    Z0                   : float Characteristic impedance, default 50 ohm
+    --------------------------------
+    Returns:
+    S11 : complex array, design shape + f.shape
+    Zin : complex array, design shape + f.shape
+    '''
+    Zin = inputImpedance(f, LJ, CJ, Cg, N, ZL)
+    S11 = (Zin - Z0)/(Zin + Z0)
+    return S11, Zin
+
+def designSpectrum(tuner, f):
+    '''
+    Reflection spectrum of a SQUID_ImpedanceMatching (or child class)
+    instance, whose parameters can be arrays of designs. The number of SQUIDs
+    is round(l/a).
+    --------------------------------
+    Parameters:
+    tuner : SQUID_ImpedanceMatching
+    f     : array Frequencies in Hz
+    --------------------------------
+    Returns:
+    res : dict of arrays 'f', 'S11', 'Zin' and the number of SQUIDs 'N'
+    '''
+    N = np.rint(np.asarray(tuner.l)/np.asarray(tuner.a)).astype(np.int64)
+    S11, Zin = reflection(f, tuner.LJ, tuner.CJ*2*np.asarray(tuner.A), tuner.C*1e-12*np.asarray(tuner.a),
+                          N, tuner.ZL, tuner.Z0)
+    return {'f': np.asarray(f), 'S11': S11, 'Zin': Zin, 'N': N}
+
+#----------------------------------------------------------------------------------------------------------
+# Eigenmodes of the chain. Node 0 is the end towards the Z0 line, nearly a
+# short for the high impedance array, and node N the open end at ZL; node j
+# has capacitance Cg_j to ground and SQUID j joins nodes j-1 and j. With node
+# fluxes v the chain obeys K v = w^2 (Cg + K/wp^2) v, where K is the
+# tridiagonal inverse inductance matrix. LJ_j*CJ_j = 1/wp^2 is the same for
+# every SQUID (CJ and 1/LJ are both proportional to the area), so with
+# W^2 = w^2/(1 - w^2/wp^2) the problem becomes K v = W^2 Cg v, i.e. the
+# symmetric tridiagonal eigenproblem of Cg^(-1/2) K Cg^(-1/2). All the modes
+# lie below the plasma frequency, to which they accumulate.
+#
+# The mode impedance is the one of the parallel LC resonator equivalent to
+# the mode as seen from ZL: with the mode normalized to v^T (Cg + K/wp^2) v = 1,
+# Z_m = v_N^2/w_m; for the fundamental of a long array it tends to 4*Zres/pi.
+
+FEW_MODES = 64 # Up to this number of modes the eigenvectors are computed
+
+def chainModes(LJ, Cg, fp, N=None, modes=None):
+    '''
+    Mode frequencies and mode impedances of SQUID chains
+    --------------------------------
+    Parameters:
+    LJ    : float or array SQUID inductance in H. Arrays with a last axis of
+            length N give the inductance of every SQUID of a non uniform chain
+    Cg    : float or array Capacitance to ground of the cells in F, same layout as LJ
+    fp    : float or array Plasma frequency of the SQUIDs in Hz, one per chain
+    N     : int or int array Number of SQUIDs, needed for uniform chains only
+    modes : int Number of lowest modes to compute, default all of them
+    --------------------------------
+    Returns:
+    res : dict of arrays with the mode frequencies 'f' in Hz and the mode
+          impedances 'Z' in ohm, shape design shape + (modes,), increasing
+          frequency. For uniform chains with different N the missing modes are NaN
+    '''
+    wp2 = (2*np.pi*np.asarray(fp, dtype=float))**2
+    if N is not None:
+        return _uniformModes(LJ, Cg, wp2, N, modes)
+    LJ, Cg = np.broadcast_arrays(np.asarray(LJ, dtype=float), np.asarray(Cg, dtype=float))
+    n = LJ.shape[-1]
+    modes = n if modes is None else min(modes, n)
+    design = np.broadcast_shapes(LJ.shape[:-1], np.shape(wp2))
+    LJ, Cg = np.broadcast_to(LJ, design + (n,)), np.broadcast_to(Cg, design + (n,))
+    wp2 = np.broadcast_to(wp2, design)
+    f = np.empty(design + (modes,))
+    Z = np.empty(design + (modes,))
+    for i in np.ndindex(design):
+        # K: diagonal 1/LJ_j + 1/LJ_{j+1}, 1/LJ_N at the open end, off diagonal -1/LJ_{j+1}
+        y = 1/LJ[i]
+        d = y + np.append(y[1:], 0.)
+        e = -y[1:]
+        s = 1/np.sqrt(Cg[i])
+        W2, vN2 = _lastComponents(d*s*s, e*s[:-1]*s[1:], modes)
+        w2 = W2/(1 + W2/wp2[i])
+        f[i] = np.sqrt(w2)/(2*np.pi)
+        Z[i] = vN2*s[-1]**2/(1 + W2/wp2[i])/np.sqrt(w2)
+    return {'f': f, 'Z': Z}
+
+def _lastComponents(d, e, modes, chunk=256):
+    '''
+    Lowest eigenvalues of a symmetric tridiagonal matrix and the squared last
+    components of their normalized eigenvectors. A few modes are computed
+    with their eigenvectors by bisection and inverse iteration; many modes
+    from the eigenvalues of the matrix and of its leading submatrix,
+    v_N^2 = prod(l - mu_k)/prod(l - l_j), so that no eigenvector is stored:
+    O(N) memory and O(N*modes) work after the O(N^2) eigenvalues
+    --------------------------------
+    Parameters:
+    d, e  : arrays Diagonal and off diagonal
+    modes : int Number of lowest eigenvalues
+    chunk : int Eigenvalues processed together
+    --------------------------------
+    Returns:
+    lam : array (modes,) eigenvalues, increasing
+    vN2 : array (modes,) squared last components
+    '''
+    if len(d) == 1:
+        return d.copy(), np.ones(1)
+    if modes <= FEW_MODES:
+        lam, v = eigh_tridiagonal(d, e, select='i', select_range=(0, modes - 1))
+        return lam, v[-1]**2
+    lam = eigvalsh_tridiagonal(d, e, lapack_driver='sterf')
+    mu = eigvalsh_tridiagonal(d[:-1], e[:-1], lapack_driver='sterf')
+    vN2 = np.empty(modes)
+    with np.errstate(divide='ignore'):
+        for start in range(0, modes, chunk):
+            i = np.arange(start, min(start + chunk, modes))
+            gap = abs(lam[i, None] - lam[None, :])
+            gap[np.arange(len(i)), i] = 1.
+            vN2[i] = np.exp(np.log(abs(lam[i, None] - mu[None, :])).sum(axis=1) - np.log(gap).sum(axis=1))
+    return lam[:modes], vN2
+
+def _uniformModes(LJ, Cg, wp2, N, modes):
+    # Closed form of the eigenproblem of a uniform chain: K = (1/LJ) times the
+    # path Laplacian grounded at node 0, with eigenvalues 4 sin^2(k/2) and
+    # eigenvectors sin(j k), k = (2m - 1) pi/(2N + 1)
+    N = np.asarray(N, dtype=np.int64)
+    M = int(N.max()) if modes is None else int(modes)
+    m = np.arange(1, M + 1)
+    LJ, Cg, wp2, N = (np.asarray(x)[..., None] for x in (LJ, Cg, wp2, N))
+    k = (2*m - 1)*np.pi/(2*N + 1)
+    W2 = 4*np.sin(k/2)**2/(LJ*Cg)
+    w2 = W2/(1 + W2/wp2)
+    vN2 = 4*np.sin(N*k)**2/(2*N + 1)/Cg/(1 + W2/wp2)
+    with np.errstate(invalid='ignore'):
+        f = np.where(m <= N, np.sqrt(w2)/(2*np.pi), np.nan)
+        Z = np.where(m <= N, vN2/np.sqrt(w2), np.nan)
+    return {'f': f, 'Z': Z}
+
+def designModes(tuner, modes=None):
+    '''
+    Eigenmodes of a SQUID_ImpedanceMatching (or child class) instance,
+    whose parameters can be arrays of designs. The number of SQUIDs is round(l/a).
+    --------------------------------
+    Parameters:
+    tuner : SQUID_ImpedanceMatching
+    modes : int Number of lowest modes, default all of them
+    --------------------------------
+    Returns:
+    res : dict of arrays as chainModes, plus the plasma frequency 'fp' and 'N'
+    '''
+    N = np.rint(np.asarray(tuner.l)/np.asarray(tuner.a)).astype(np.int64)
+    res = chainModes(tuner.LJ, tuner.C*1e-12*np.asarray(tuner.a), tuner.fp, N, modes)
+    res['fp'] = tuner.fp
+    res['N'] = N
+    return res
+
+
+
+if __name__== "__main__":
+    import time
+    from RFSET_Matching_Optimization import SQUID_ImpedanceMatching
+
+    ZL, a, C, N = 100e3, 5e-6, 84.3, 200
+    A = SQUID_ImpedanceMatching.matchedArea(ZL, a, C, 7.5e-14, model='Lotkhov')['A']
+    tuner = SQUID_ImpedanceMatching(ZL, N*a, a, None, None, 7.5e-14, A, C, model='Lotkhov')
+    f = np.linspace(1e6, 3*tuner.fn, 100000)
+
+    start = time.perf_counter()
+    res = designSpectrum(tuner, f)
+    print(len(f), "frequencies in", time.perf_counter() - start, "s")
+    dB = 20*np.log10(abs(res['S11']))
+    print("Lumped fn = %g Hz, deepest reflection dip at %g Hz (%.1f dB)" % (tuner.fn, f[np.argmin(dB)], dB.min()))
+
+    start = time.perf_counter()
+    modes = designModes(tuner)
+    print(len(modes['f']), "modes in", time.perf_counter() - start, "s")
+    print("First modes / Hz:", modes['f'][:3], "plasma frequency / Hz:", tuner.fp)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 09:12:40 2026
+
+@author: feynman
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from RFSET_Matching_Optimization import SQUID_ImpedanceMatching, QUANTITIES, GOODNESS_THRESHOLD
+from junction_models import getModel
+
+# Grid axes in nesting order: number of SQUIDs, distance between neighbouring
+# SQUIDs in m, load impedance in ohm, cpw lineic capacitance in pF/m,
+# cosine argument in the Ic equation, temperature in K and junction model. In
+# the results the junction model is stored as its index in the model axis of
+# the grid
+AXES = ('N', 'a', 'ZL', 'C', 'flux', 'T', 'model')
+
+SWEEP_DTYPE = np.dtype([('N', 'i8'), ('a', 'f8'), ('ZL', 'f8'), ('C', 'f8'), ('flux', 'f8'), ('T', 'f8'),
+                        ('model', 'i8'),
+                        ('A', 'f8'), ('RN_Tamb', 'f8'), ('RN_mK', 'f8'), ('CJ', 'f8')]
+                       + [(q, 'f8') for q in QUANTITIES]
+                       + [('goodness', 'f8'), ('success', '?')])
+
+class SweepGrid:
+    '''
+    Declarative grid over the design parameters. Every axis is a list of
+    values and the grid is their cartesian product, nested in the order of AXES.
+    For every (N, a, ZL, C, model) the junction area is matched at zero
+    flux and zero temperature, then the design is evaluated at each flux and
+    temperature of the grid, so the goodness tells how well the biased array
+    in the fridge at temperature T is still matched. Junction
+    models are names in the registry of junction_models, e.g. the two
+    oxidations 'INRIM' and 'Lotkhov', evaluated side by side.
+    '''
+
+    def __init__(self, N=(20,), a=(5e-6,), ZL=(100e3,), C=(84.3,), flux=(0.,), T=(0.,), model=('INRIM',),
+                 Z0=50., bounds=(0.0025, 5), xatol=1e-10):
+        if isinstance(model, str):
+            model = [model]
+        self.models = [getModel(m) for m in model]
+        self.axes = {'N': np.atleast_1d(np.asarray(N, dtype=np.int64)),
+                     'a': np.atleast_1d(np.asarray(a, dtype=float)),
+                     'ZL': np.atleast_1d(np.asarray(ZL, dtype=float)),
+                     'C': np.atleast_1d(np.asarray(C, dtype=float)),
+                     'flux': np.atleast_1d(np.asarray(flux, dtype=float)),
+                     'T': np.atleast_1d(np.asarray(T, dtype=float)),
+                     'model': np.arange(len(self.models))}
+        self.Z0 = Z0
+        self.bounds = bounds
+        self.xatol = xatol
+
+    @property
+    def shape(self):
+        return tuple(len(self.axes[ax]) for ax in AXES)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def chunks(self, chunk_size):
+        '''
+        Splits the flattened grid in contiguous chunks
+        --------------------------------
+        Parameters:
+        chunk_size : int Number of design points per chunk
+        --------------------------------
+        Returns:
+        chunks : list of (start, stop) flat index ranges
+        '''
+        return [(start, min(start + chunk_size, self.size)) for start in range(0, self.size, chunk_size)]
+
+    def points(self, start, stop):
+        '''
+        Parameter values of the design points with flat index in [start, stop)
+        --------------------------------
+        Parameters:
+        start, stop : int Flat index range
+        --------------------------------
+        Returns:
+        points : dict of arrays, one for each name in AXES
+        '''
+        index = np.unravel_index(np.arange(start, stop), self.shape)
+        return {ax: self.axes[ax][i] for ax, i in zip(AXES, index)}
+
+    def evaluate(self, start, stop, out):
+        '''
+        Evaluates the design points with flat index in [start, stop) and
+        stores them in out, a record array with SWEEP_DTYPE
+        --------------------------------
+        Parameters:
+        start, stop : int Flat index range
+        out         : array with SWEEP_DTYPE and length stop - start
+        --------------------------------
+        Returns:
+        None
+        '''
+        p = self.points(start, stop)
+        for ax in AXES:
+            out[ax] = p[ax]
+        for index in np.unique(p['model']):
+            model = self.models[index]
+            sel = p['model'] == index
+            N, a, ZL, C, flux, T = (p[ax][sel] for ax in ('N', 'a', 'ZL', 'C', 'flux', 'T'))
+            A = SQUID_ImpedanceMatching.matchedArea(ZL, a, C, model.cj, Z0=self.Z0, bounds=self.bounds,
+                                                    xatol=self.xatol, model=model)['A']
+            res = SQUID_ImpedanceMatching.batch(ZL, N*a, a, model.cj, A, C, Z0=self.Z0, flux_quanta=flux, model=model,
+                                                temperature=T)
+            rec = out[sel]
+            rec['A'] = A
+            rec['RN_Tamb'] = model.RN_Tamb(A)
+            rec['RN_mK'] = model.RN(A)
+            rec['CJ'] = model.CJ(A)
+            for q in QUANTITIES:
+                rec[q] = res[q]
+            with np.errstate(invalid='ignore'):
+                rec['goodness'] = abs(res['Zres'] - res['th_Zres'])/res['th_Zres']*100
+            rec['success'] = rec['goodness'] < GOODNESS_THRESHOLD
+            out[sel] = rec
+
+    def run(self, processes=None, chunk_size=65536):
+        '''
+        Evaluates the whole grid. Chunks are distributed over a process pool
+        and every worker writes its results directly in a shared memory
+        record array, so no per-point object is pickled.
+        --------------------------------
+        Parameters:
+        processes  : int Number of worker processes, default os.cpu_count().
+                     With 1 process, or a single chunk, the grid is evaluated inline
+        chunk_size : int Number of design points per chunk
+        --------------------------------
+        Returns:
+        res : record array with SWEEP_DTYPE and shape self.shape
+        '''
+        chunks = self.chunks(chunk_size)
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = min(processes, len(chunks))
+        if processes <= 1:
+            res = np.empty(self.size, dtype=SWEEP_DTYPE)
+            for start, stop in chunks:
+                self.evaluate(start, stop, res[start:stop])
+            return res.reshape(self.shape)
+
+        shm = shared_memory.SharedMemory(create=True, size=max(self.size*SWEEP_DTYPE.itemsize, 1))
+        try:
+            with ProcessPoolExecutor(processes, initializer=_attach, initargs=(shm.name, self)) as pool:
+                for done in pool.map(_evaluateChunk, chunks):
+                    pass
+            res = np.ndarray(self.size, dtype=SWEEP_DTYPE, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+        return res.reshape(self.shape)
+
+#----------------------------------------------------------------------------------------------------------
+# Worker side of SweepGrid.run: every process attaches once to the shared
+# result array and then evaluates the chunks it receives
+
+_worker = {}
+
+def _attach(name, grid):
+    shm = shared_memory.SharedMemory(name=name)
+    _worker['shm'] = shm # keep a reference, the buffer lives as long as the process
+    _worker['grid'] = grid
+    _worker['out'] = np.ndarray(grid.size, dtype=SWEEP_DTYPE, buffer=shm.buf)
+
+def _evaluateChunk(chunk):
+    start, stop = chunk
+    _worker['grid'].evaluate(start, stop, _worker['out'][start:stop])
+    return stop - start
+
+
+
+if __name__== "__main__":
+    import time
+
+    d = np.arange(3, 11, 1)*1e-6                    # Distance between neighbouring SQUIDs in m
+    n_flux_quanta = [x * 0.25 for x in range(0, 26)] # it's the cosine argument in the Ic equation
+    grid = SweepGrid(N=[20, 100], a=d, ZL=[25.8e3, 100e3], C=[84.3], flux=n_flux_quanta, model=['INRIM', 'Lotkhov'])
+
+    start = time.perf_counter()
+    res = grid.run()
+    print(grid.size, "design points in", time.perf_counter() - start, "s")
+    print("Matched junction areas (N = 20, ZL = 100 kohm, zero flux, Lotkhov) / um^2:")
+    print(res['A'][0, :, 1, 0, 0, 0, 1])
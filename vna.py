@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 19:41:09 2026
+
+@author: feynman
+"""
+
+import os
+import re
+import numpy as np
+from RFSET_Matching_Optimization import SQUID_ImpedanceMatching
+from junction_models import getModel
+
+# Ingestion of measured VNA traces and fit of the model to the measured
+# resonance vs flux curves of a cooled device.
+#
+# Touchstone 1.x files (.s1p, .s2p, ...) are bulk parsed: comments and the
+# option line are stripped and the numbers are read in one numpy call. Raw
+# sweeps, with the traces of a whole cooldown stored back to back as complex
+# numbers, are memory-mapped. The resonance of every trace is the minimum of
+# |S|, refined by a parabola through the three samples around it.
+#
+# The fit is a Levenberg-Marquardt on log(fn) batched over all the curves:
+# the model is fn(flux_scale*(flux - flux_offset)) of a SQUID array with
+# critical current Ic_scale*Ic, where flux is the measured bias (e.g. coil
+# current) and the derivatives come from SQUID_ImpedanceMatching.batchJacobian.
+# fn only depends on Ic/C, so Ic_scale and C cannot be fitted together: one of
+# them is free and the other is held at its given value.
+
+FREQUENCY_UNITS = {'hz': 1., 'khz': 1e3, 'mhz': 1e6, 'ghz': 1e9}
+
+FIT_PARAMETERS = ('Ic_scale', 'C', 'flux_offset', 'flux_scale')
+
+FIT_DTYPE = np.dtype([(p, 'f8') for p in FIT_PARAMETERS]
+                     + [('rms', 'f8'), ('points', 'i8'), ('iterations', 'i8'), ('success', '?')])
+
+def _ports(path):
+    match = re.search(r'\.s(\d+)p$', path, re.I)
+    if match is None:
+        raise ValueError("%s is not a Touchstone file (.sNp)" % path)
+    return int(match.group(1))
+
+def loadTouchstone(path):
+    '''
+    Reads a Touchstone 1.x file
+    --------------------------------
+    Parameters:
+    path : str .sNp file
+    --------------------------------
+    Returns:
+    f  : array (nf,) Frequencies in Hz
+    S  : complex array (nf, n, n) Network parameters, S[:, i, j] = Sij
+    z0 : float Reference impedance in ohm
+    '''
+    n = _ports(path)
+    with open(path) as fp:
+        text = fp.read()
+    text = re.sub(r'!.*', '', text)
+    options = re.search(r'^\s*#(.*)$', text, re.M)
+    unit, fmt, z0 = 'ghz', 'ma', 50.
+    if options is not None:
+        tokens = options.group(1).lower().split()
+        for i, token in enumerate(tokens):
+            if token in FREQUENCY_UNITS:
+                unit = token
+            elif token in ('ma', 'db', 'ri'):
+                fmt = token
+            elif token == 'r':
+                z0 = float(tokens[i + 1])
+            elif token not in ('s', 'y', 'z', 'h', 'g') and tokens[i - 1] != 'r':
+                raise ValueError("Unknown option %r in %s" % (token, path))
+        text = text[:options.start()] + text[options.end():]
+    if '[' in text:
+        raise ValueError("%s: Touchstone 2 keywords are not supported" % path)
+    data = np.fromstring(text, sep=' ')
+    width = 1 + 2*n*n
+    if data.size % width:
+        raise ValueError("%s: %i numbers do not make rows of %i" % (path, data.size, width))
+    data = data.reshape(-1, width)
+    f = data[:, 0]*FREQUENCY_UNITS[unit]
+    a, b = data[:, 1::2], data[:, 2::2]
+    if fmt == 'ri':
+        S = a + 1j*b
+    else:
+        magnitude = 10**(a/20) if fmt == 'db' else a
+        S = magnitude*np.exp(1j*np.deg2rad(b))
+    S = S.reshape(-1, n, n)
+    if n == 2:
+        S = S.transpose(0, 2, 1) # two-port files list S11 S21 S12 S22
+    return f, S, z0
+
+def saveTouchstone(path, f, S, z0=50.):
+    '''
+    Writes a one or two port Touchstone 1.x file in Hz and RI format
+    --------------------------------
+    Parameters:
+    path : str .s1p or .s2p file
+    f    : array (nf,) Frequencies in Hz
+    S    : complex array (nf,) for one port or (nf, n, n)
+    z0   : float Reference impedance in ohm
+    --------------------------------
+    Returns:
+    None
+    '''
+    n = _ports(path)
+    S = np.asarray(S).reshape(len(f), n, n)
+    if n == 2:
+        S = S.transpose(0, 2, 1)
+    S = S.reshape(len(f), -1)
+    data = np.empty((len(f), 1 + 2*n*n))
+    data[:, 0] = f
+    data[:, 1::2], data[:, 2::2] = S.real, S.imag
+    np.savetxt(path, data, fmt='%.12g', header="# Hz S RI R %g" % z0, comments='')
+
+def loadTouchstoneSet(paths, parameter=(0, 0)):
+    '''
+    Reads one network parameter from many Touchstone files sharing the
+    same frequencies, e.g. one file per flux point
+    --------------------------------
+    Parameters:
+    paths     : list of str .sNp files
+    parameter : (i, j) zero based indices of the parameter, default S11
+    --------------------------------
+    Returns:
+    f : array (nf,) Frequencies in Hz
+    S : complex array (len(paths), nf)
+    '''
+    i, j = parameter
+    f = S = None
+    for k, path in enumerate(paths):
+        fk, Sk, z0 = loadTouchstone(path)
+        if S is None:
+            f = fk
+            S = np.empty((len(paths), len(f)), dtype=complex)
+        elif len(fk) != len(f) or np.any(fk != f):
+            raise ValueError("%s has different frequencies than %s" % (path, paths[0]))
+        S[k] = Sk[:, i, j]
+    return f, S
+
+def loadRawTraces(path, points, dtype='<c8', offset=0):
+    '''
+    Memory-maps a raw sweep file holding traces back to back
+    --------------------------------
+    Parameters:
+    path   : str File name
+    points : int Frequency points per trace
+    dtype  : complex dtype of the samples, e.g. '<c8' or '<c16'
+    offset : int Bytes of header before the first trace
+    --------------------------------
+    Returns:
+    S : read-only numpy.memmap (traces, points)
+    '''
+    dtype = np.dtype(dtype)
+    traces = (os.path.getsize(path) - offset)//(dtype.itemsize*points)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(traces, points))
+
+def resonanceFrequencies(f, S, band=None, chunk_size=4096):
+    '''
+    Resonance frequency of every trace: the minimum of |S| in band, refined
+    by parabolic interpolation of |S|^2. Minima at the edges of the band are
+    not resonances and are returned as NaN
+    --------------------------------
+    Parameters:
+    f          : array (nf,) Frequencies in Hz, increasing and evenly spaced
+    S          : complex array (..., nf), e.g. from loadTouchstoneSet or loadRawTraces
+    band       : (f1, f2) in Hz or None for all frequencies
+    chunk_size : int Traces read at a time, so memory-mapped files are streamed
+    --------------------------------
+    Returns:
+    fr : array (...) Resonance frequencies in Hz
+    '''
+    f = np.asarray(f, dtype=float)
+    lo, hi = 0, len(f)
+    if band is not None:
+        lo, hi = np.searchsorted(f, band[0]), np.searchsorted(f, band[1], side='right')
+    f = f[lo:hi]
+    shape = S.shape[:-1]
+    S = S.reshape(-1, S.shape[-1])
+    fr = np.empty(len(S))
+    for start in range(0, len(S), chunk_size):
+        y = np.abs(np.asarray(S[start:start + chunk_size, lo:hi]))**2
+        i = np.argmin(y, axis=-1)
+        edge = (i == 0) | (i == len(f) - 1)
+        i = np.clip(i, 1, len(f) - 2)[:, None]
+        y0, y1, y2 = (np.take_along_axis(y, i + k, axis=-1)[:, 0] for k in (-1, 0, 1))
+        curvature = y0 - 2*y1 + y2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shift = np.where(curvature > 0, 0.5*(y0 - y2)/curvature, 0.)
+        res = f[i[:, 0]] + shift*(f[1] - f[0])
+        res[edge] = np.nan
+        fr[start:start + chunk_size] = res
+    return fr.reshape(shape)
+
+def _tuningCurves(flux, params, design, cls):
+    # log(fn) of the model and its derivatives with respect to the fit parameters
+    x = params['flux_scale'][:, None]*(flux - params['flux_offset'][:, None])
+    ZL, N, a, A, CJ, model, Z0 = design
+    C = params['C'][:, None]
+    res, jac = cls.batchJacobian(ZL, N*a, a, CJ, A, C, Z0=Z0, flux_quanta=x, model=model)
+    fn = res['fn']
+    dfn = jac['fn']['flux_quanta']/fn
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logfn = np.log(fn) + 0.5*np.log(params['Ic_scale'][:, None])
+        derivatives = {'Ic_scale': np.full(fn.shape, 0.5),            # with respect to log(Ic_scale)
+                       'C': C*jac['fn']['C']/fn,                        # with respect to log(C)
+                       'flux_offset': -params['flux_scale'][:, None]*dfn,
+                       'flux_scale': (flux - params['flux_offset'][:, None])*dfn}
+    return logfn, derivatives
+
+def fitTuningCurves(flux, fn, ZL, N, a, A, C, CJ=None, model='INRIM', Z0=50., free=('Ic_scale', 'flux_offset'),
+                    Ic_scale=1., flux_offset=None, flux_scale=1., maxiter=100, tolerance=1e-10,
+                    cls=SQUID_ImpedanceMatching):
+    '''
+    Least-squares fit of the model to measured resonance vs flux curves, all
+    the curves in one vectorized pass
+    --------------------------------
+    Parameters:
+    flux, fn       : arrays (K, M) Bias and resonance frequency in Hz of K curves;
+                     NaN marks the missing points of shorter curves
+    ZL, N, a, A, C : float or (K,) arrays Nominal design of the device of each curve:
+                     load impedance in ohm, number of SQUIDs, distance between
+                     neighbouring SQUIDs in m, junction area in um^2, lineic
+                     capacitance in pF/m
+    CJ             : float SQUID capacitance in F/um^2, default the one of the model
+    model          : str or JunctionModel
+    Z0             : float Impedance of the line in ohm
+    free           : names in FIT_PARAMETERS to fit, the others are held; at most
+                     one of 'Ic_scale' and 'C'
+    Ic_scale       : float or (K,) Factor on the critical current of the model
+    flux_offset    : float or (K,) Bias of zero flux, default the bias of the highest fn
+    flux_scale     : float or (K,) Cosine argument per unit of bias
+    maxiter        : int Maximum number of iterations
+    tolerance      : float Relative change of the cost at which a curve has converged
+    cls            : SQUID_ImpedanceMatching or child class
+    --------------------------------
+    Returns:
+    res : record array (K,) with FIT_DTYPE: fitted and held parameters, rms of
+          the relative residual of fn, number of points, iterations and success
+    '''
+    free = tuple(free)
+    unknown = set(free) - set(FIT_PARAMETERS)
+    if unknown:
+        raise ValueError("Unknown fit parameters %s" % sorted(unknown))
+    if 'Ic_scale' in free and 'C' in free:
+        raise ValueError("fn only depends on Ic/C: Ic_scale and C cannot be fitted together")
+    model = getModel(model)
+    CJ = model.cj if CJ is None else CJ
+    flux = np.atleast_2d(np.asarray(flux, dtype=float))
+    fn = np.atleast_2d(np.asarray(fn, dtype=float))
+    flux, fn = np.broadcast_arrays(flux, fn)
+    K = len(fn)
+    valid = np.isfinite(flux) & np.isfinite(fn) & (fn > 0)
+    flux = np.where(valid, flux, 0.)
+    logfm = np.log(np.where(valid, fn, 1.))
+    if flux_offset is None:
+        flux_offset = flux[np.arange(K), np.argmax(np.where(valid, fn, -np.inf), axis=1)]
+    params = {p: np.array(np.broadcast_to(np.asarray(v, dtype=float), (K,)))
+              for p, v in zip(FIT_PARAMETERS, (Ic_scale, C, flux_offset, flux_scale))}
+    design = tuple(np.asarray(x, dtype=float).reshape(-1, 1) if np.ndim(x) else x for x in (ZL, N, a, A, CJ)) + (model, Z0)
+
+    def cost(params):
+        logfn, derivatives = _tuningCurves(flux, params, design, cls)
+        r = np.where(valid, logfm - logfn, 0.)
+        c = (r*r).sum(axis=1)
+        return np.where(np.isfinite(c), c, np.inf), r, derivatives
+
+    def updated(params, step):
+        new = {p: v.copy() for p, v in params.items()}
+        for k, p in enumerate(free):
+            if p in ('Ic_scale', 'C'): # fitted in log scale, so they stay positive
+                new[p] *= np.exp(step[:, k])
+            else:
+                new[p] += step[:, k]
+        return new
+
+    c, r, derivatives = cost(params)
+    damping = np.full(K, 1e-3)
+    active = np.isfinite(c) & (valid.sum(axis=1) >= len(free))
+    iterations = np.zeros(K, dtype=np.int64)
+    converged = np.zeros(K, dtype=bool)
+    for iteration in range(maxiter):
+        if not np.any(active) or not free:
+            break
+        J = np.stack([np.where(valid, derivatives[p], 0.) for p in free], axis=-1)
+        JTJ = np.einsum('kmp,kmq->kpq', J, J)
+        g = np.einsum('kmp,km->kp', J, r)
+        diagonal = np.einsum('kpp->kp', JTJ)
+        system = JTJ + (damping[:, None]*np.maximum(diagonal, 1e-12))[:, :, None]*np.eye(len(free))
+        step = np.linalg.solve(system, g[..., None])[..., 0]
+        step[~active] = 0.
+        trial = updated(params, step)
+        c_trial, r_trial, d_trial = cost(trial)
+        better = active & (c_trial < c)
+        for p in FIT_PARAMETERS:
+            params[p] = np.where(better, trial[p], params[p])
+        done = better & (c - c_trial <= tolerance*np.maximum(c, 1e-300))
+        r = np.where(better[:, None], r_trial, r)
+        derivatives = {p: np.where(better[:, None], d_trial[p], derivatives[p]) for p in derivatives}
+        c = np.where(better, c_trial, c)
+        damping = np.where(better, damping/10, damping*10)
+        iterations += active
+        stuck = active & (damping > 1e12)
+        converged |= done | stuck & np.isfinite(c)
+        active &= ~(done | stuck)
+
+    res = np.empty(K, dtype=FIT_DTYPE)
+    for p in FIT_PARAMETERS:
+        res[p] = params[p]
+    points = valid.sum(axis=1)
+    res['rms'] = np.sqrt(c/np.maximum(points, 1))
+    res['points'] = points
+    res['iterations'] = iterations
+    res['success'] = converged | (not free) & np.isfinite(c)
+    return res
+
+
+
+if __name__== "__main__":
+    import tempfile
+    import time
+
+    # A cooldown of 20 devices, each measured at 201 bias points: synthetic
+    # S11 traces with a Lorentzian dip at the fn of a device with a critical
+    # current 8% below the model, a flux offset and 0.4 rad of cosine
+    # argument per mA of coil current
+    ZL, a, N, C = 100e3, 5e-6, 20, 84.3
+    A = SQUID_ImpedanceMatching.matchedArea(ZL, a, C, model='Lotkhov')['A']
+    rng = np.random.default_rng(1)
+    devices, biases = 20, 201
+    offset = rng.uniform(-0.5, 0.5, devices)
+    current = np.linspace(-3, 3, biases)                       # mA
+    x = 0.4*(current[None, :] - offset[:, None])
+    fn = np.sqrt(0.92)*SQUID_ImpedanceMatching.batch(ZL, N*a, a, getModel('Lotkhov').cj, A, C, flux_quanta=x, model='Lotkhov')['fn']
+    f = np.linspace(0.5*fn.min(), 1.2*fn.max(), 1601)
+    width = 2e6
+    S11 = 1 - 0.9/(1 + 2j*(f - fn[..., None])/width)
+
+    directory = tempfile.mkdtemp()
+    paths = [os.path.join(directory, "trace_%05d.s1p" % k) for k in range(devices*biases)]
+    for path, s in zip(paths, S11.reshape(-1, len(f))):
+        saveTouchstone(path, f, s)
+    start = time.perf_counter()
+    f, S = loadTouchstoneSet(paths)
+    print("%i Touchstone traces read in %.2f s" % (len(paths), time.perf_counter() - start))
+    start = time.perf_counter()
+    fr = resonanceFrequencies(f, S).reshape(devices, biases)
+    res = fitTuningCurves(np.broadcast_to(current, fr.shape), fr, ZL, N, a, A, C, model='Lotkhov',
+                          free=('Ic_scale', 'flux_offset', 'flux_scale'), flux_scale=0.3)
+    print("Resonances extracted and %i curves fitted in %.2f s" % (devices, time.perf_counter() - start))
+    print("Ic_scale = %.4f +- %.4f, flux_scale = %.4f, max offset error %.2e mA, rms %.1e"
+          % (res['Ic_scale'].mean(), res['Ic_scale'].std(), res['flux_scale'].mean(),
+             abs(res['flux_offset'] - offset).max(), res['rms'].max()))